@@ -3,13 +3,19 @@ from collections import OrderedDict
 from django.db.backends.base.base import BaseDatabaseWrapper
 from django.db.backends.base.client import BaseDatabaseClient
 from django.db.backends.base.creation import BaseDatabaseCreation
-from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+from django.core.exceptions import ImproperlyConfigured
 from django.db.utils import Error
+from pymongo.common import validate
+from pymongo.errors import ConfigurationError
 from .introspection import DatabaseIntrospection
 
 from .operations import DatabaseOperations
-from .cursor import Cursor
+from .cursor import AsyncCursor, Cursor
 from .features import DatabaseFeatures
+from .schema import DatabaseSchemaEditor
+from .mongo2sql.buffer import WriteBuffer
+from .mongo2sql.cache import statement_cache
+from .pool import async_client_pool, client_pool
 from . import database as Database
 
 
@@ -67,7 +73,7 @@ class DatabaseWrapper(BaseDatabaseWrapper):
     }
 
     vendor = 'djongo'
-    SchemaEditorClass = BaseDatabaseSchemaEditor
+    SchemaEditorClass = DatabaseSchemaEditor
     Database = Database
 
     client_class = BaseDatabaseClient
@@ -78,7 +84,9 @@ class DatabaseWrapper(BaseDatabaseWrapper):
 
     def __init__(self, *args, **kwargs):
         self.client_conn = None
+        self.write_buffer = None
         super().__init__(*args, **kwargs)
+        self.client_options = self.get_client_options()
 
     def is_usable(self):
         if self.connection is not None:
@@ -107,39 +115,88 @@ class DatabaseWrapper(BaseDatabaseWrapper):
             if setting:
                 connection_params[kwarg] = setting
 
+        connection_params.update(self.client_options)
         return connection_params
 
-
-    def get_new_connection(self, connection_params):
+    def get_client_options(self):
         """
-        This needs to be made more generic to accept
-        other MongoClient parameters.
+        Returns the MongoClient options of OPTIONS. Upper case options
+        configure djongo itself, any other one is handed to MongoClient
+        and validated here so a typo fails at startup, not on connect.
         """
+        client_options = {}
+        for option, value in self.settings_dict.get('OPTIONS', {}).items():
+            if option.isupper():
+                continue
+
+            try:
+                validate(option, value)
+            except (ConfigurationError, TypeError, ValueError) as e:
+                raise ImproperlyConfigured(f'Invalid MongoClient option {option!r}: {e}')
+
+            client_options[option] = value
+
+        return client_options
+
+
+    def get_new_connection(self, connection_params):
+        options = self.settings_dict.get('OPTIONS', {})
+        if 'SQL_CACHE_SIZE' in options:
+            statement_cache.resize(options['SQL_CACHE_SIZE'])
 
         name = connection_params.pop('name')
         connection_params['document_class'] = OrderedDict
-        if self.client_conn is not None:
-            self.client_conn.close()
-
-        self.client_conn = Database.connect(**connection_params)
+        self.client_conn = client_pool.get(
+            warm_up=options.get('POOL_WARM_UP', False), **connection_params)
+        if options.get('WRITE_BUFFER', False):
+            self.write_buffer = WriteBuffer(self.client_conn,
+                                            options.get('WRITE_TRANSACTIONS', False))
         return self.client_conn[name]
 
     def _set_autocommit(self, autocommit):
-        pass
+        if self.write_buffer is None:
+            return
+
+        if autocommit:
+            self.write_buffer.end()
+        else:
+            self.write_buffer.begin()
 
     def init_connection_state(self):
         pass
 
     def create_cursor(self, name=None):
-        return Cursor(self.client_conn, self.connection)
+        return Cursor(self.client_conn, self.connection,
+                      self.settings_dict.get('OPTIONS', {}), self.write_buffer)
+
+    def async_cursor(self):
+        """
+        Returns a cursor sending statements on AsyncMongoClient, for use
+        in async views without a thread per query. Its client is shared
+        by the coroutines of the running event loop. It does not open
+        this connection, and does not join its atomic blocks.
+        """
+        options = self.settings_dict.get('OPTIONS', {})
+        connection_params = self.get_connection_params()
+        name = connection_params.pop('name')
+        connection_params['document_class'] = OrderedDict
+        client = async_client_pool.get(**connection_params)
+        advisor_db = None
+        if options.get('INDEX_ADVISOR', False):
+            # The shared blocking client of the same settings
+            advisor_db = client_pool.get(**connection_params)[name]
+        return AsyncCursor(client, client[name], options, advisor_db)
 
     def _close(self):
-        if self.connection:
-            with self.wrap_database_errors:
-                self.connection.client.close()
+        # The client is shared by every connection of the process, its
+        # pooled sockets outlive this connection
+        pass
 
     def _rollback(self):
-        raise Error
+        # Queued writes are dropped, sent ones cannot be undone
+        if self.write_buffer is None or not self.write_buffer.rollback():
+            raise Error
 
     def _commit(self):
-        pass
+        if self.write_buffer is not None:
+            self.write_buffer.commit()
@@ -1,14 +1,17 @@
 from logging import getLogger
-from .sql2mongo import Result
+from .sql2mongo import AsyncResult, Result
 
 logger = getLogger(__name__)
 
 
 class Cursor:
 
-    def __init__(self, client_conn, db_conn):
+    def __init__(self, client_conn, db_conn, options=None, write_buffer=None):
         self.db_conn = db_conn
         self.client_conn = client_conn
+        self.options = options or {}
+        self.write_buffer = write_buffer
+        self.arraysize = 1
         self.result = None
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -40,18 +43,34 @@ class Cursor:
     def lastrowid(self):
         return self.result.last_row_id
 
-    def execute(self, sql, params=None):
-        self.result = Result(self.client_conn, self.db_conn, sql, params)
-
-    def fetchmany(self, size=1):
-        ret = []
-        for _ in range(size):
-            try:
-                ret.append(self.result.next())
-            except StopIteration:
-                break
+    @property
+    def inserted_ids(self):
+        return self.result.inserted_ids
 
-        return ret
+    def execute(self, sql, params=None):
+        self.result = Result(self.client_conn, self.db_conn, sql, params,
+                             self.options, write_buffer=self.write_buffer)
+
+    def executemany(self, sql, params_list):
+        """
+        Only INSERT statements are supported. Every params set is bound
+        against the parsed statement once and the documents are written
+        with insert_many in batches of OPTIONS['INSERT_BATCH_SIZE'].
+        """
+        self.result = Result(self.client_conn, self.db_conn, sql,
+                             list(params_list), self.options, many=True,
+                             write_buffer=self.write_buffer)
+
+    def explain(self, sql, params=None):
+        """
+        Returns the filter or pipeline a SELECT translates to and the
+        plan MongoDB picks for it, without running the SELECT.
+        """
+        return Result(self.client_conn, self.db_conn, 'EXPLAIN ' + sql, params,
+                      self.options).explain()
+
+    def fetchmany(self, size=None):
+        return self.result.fetchmany(size or self.arraysize)
 
     def fetchone(self):
         try:
@@ -62,3 +81,73 @@ class Cursor:
     def fetchall(self):
         return list(self.result)
 
+
+class AsyncCursor:
+    """
+    The asyncio counterpart of Cursor, returned by
+    `DatabaseWrapper.async_cursor()`. Statements are translated as on
+    Cursor and sent on AsyncMongoClient, so execute, fetch and close are
+    awaited, and rows can also be read with `async for`.
+    """
+
+    def __init__(self, client_conn, db_conn, options=None, advisor_db=None):
+        self.db_conn = db_conn
+        self.client_conn = client_conn
+        self.options = options or {}
+        self.advisor_db = advisor_db
+        self.arraysize = 1
+        self.result = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def __aiter__(self):
+        return self.result.__aiter__()
+
+    async def close(self):
+        if self.result is not None:
+            await self.result.close()
+
+    @property
+    def rowcount(self):
+        if self.result is None:
+            raise RuntimeError
+
+        return self.result.count()
+
+    async def acount(self):
+        return await self.result.acount()
+
+    @property
+    def lastrowid(self):
+        return self.result.last_row_id
+
+    @property
+    def inserted_ids(self):
+        return self.result.inserted_ids
+
+    async def execute(self, sql, params=None):
+        self.result = AsyncResult(self.client_conn, self.db_conn, sql, params,
+                                  self.options, advisor_db=self.advisor_db)
+        await self.result.execute()
+
+    async def executemany(self, sql, params_list):
+        self.result = AsyncResult(self.client_conn, self.db_conn, sql,
+                                  list(params_list), self.options, many=True,
+                                  advisor_db=self.advisor_db)
+        await self.result.execute()
+
+    async def fetchmany(self, size=None):
+        return await self.result.fetchmany(size or self.arraysize)
+
+    async def fetchone(self):
+        try:
+            return await self.result.__aiter__().__anext__()
+        except StopAsyncIteration:
+            return []
+
+    async def fetchall(self):
+        return await self.result.fetchall()
@@ -5,6 +5,14 @@ def connect(**kwargs):
     return MongoClient(**kwargs)
 
 
+def connect_async(**kwargs):
+    try:
+        from pymongo import AsyncMongoClient
+    except ImportError:
+        raise ImportError('The async cursor needs pymongo 4.9 or later')
+    return AsyncMongoClient(**kwargs)
+
+
 class Error(Exception):  # NOQA: StandardError undefined on PY3
     pass
 
@@ -3,5 +3,12 @@ from django.db.backends.base.features import BaseDatabaseFeatures
 
 class DatabaseFeatures(BaseDatabaseFeatures):
     supports_transactions = False
-    # djongo doesn't seem to support this currently
-    has_bulk_insert = False
+    # Nested atomic blocks join the outer one
+    uses_savepoints = False
+    can_use_chunked_reads = True
+    supports_explaining_query_execution = True
+    supports_partial_indexes = True
+    supports_expression_indexes = False
+    has_bulk_insert = True
+    can_return_id_from_insert = True
+    can_return_ids_from_bulk_insert = True
@@ -6,7 +6,8 @@ class DatabaseIntrospection(BaseDatabaseIntrospection):
     #     return sorted(cursor.m_cli_connection.collection_names(False))
 
     def get_table_list(self, cursor):
-        return [TableInfo(c,'t') for c in cursor.db_conn.collection_names(False)]
+        return [TableInfo(c,'t') for c in cursor.db_conn.list_collection_names()
+                if not c.startswith('system.')]
 
     def get_constraints(self, cursor, table_name):
         constraint = {}
@@ -0,0 +1,43 @@
+from bson import json_util
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, Q, QuerySet
+
+from ...models import explain
+
+
+class Command(BaseCommand):
+    help = (
+        'Shows the filter or pipeline a query translates to and the plan '
+        'MongoDB picks for it. The query is a SELECT statement or an ORM '
+        'expression such as "Entry.objects.filter(n_comments__gt=2)".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('query', help='SELECT statement or ORM expression')
+        parser.add_argument(
+            '--database',
+            help='Database to explain the query on, by default the one the query would use'
+        )
+
+    def handle(self, *args, **options):
+        query = options['query'].strip()
+        if query[:7].upper() == 'SELECT ':
+            with connections[options['database'] or DEFAULT_DB_ALIAS].cursor() as cursor:
+                explained = cursor.explain(query)
+        else:
+            namespace = {model.__name__: model for model in apps.get_models()}
+            namespace.update(F=F, Q=Q)
+            try:
+                queryset = eval(query, namespace)
+            except Exception as e:
+                raise CommandError(f'Could not evaluate {query!r}: {e}')
+
+            if not isinstance(queryset, QuerySet):
+                raise CommandError(f'{query!r} is not a QuerySet')
+            if options['database']:
+                queryset = queryset.using(options['database'])
+            explained = explain(queryset)
+
+        self.stdout.write(json_util.dumps(explained, indent=2))
@@ -0,0 +1,112 @@
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, migrations, models
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from ...mongo2sql.advisor import (
+    ADVISOR_COLLECTION, index_advisor, recommend, unused_indexes
+)
+
+
+def format_keys(keys):
+    return ', '.join(f'{field} {"ASC" if order == 1 else "DESC"}' for field, order in keys)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recommends indexes for the query shapes recorded while the '
+        'INDEX_ADVISOR option was set, leaving out those an existing index '
+        'already serves, and lists the indexes no query used.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database to advise on')
+        parser.add_argument('--migrations', action='store_true',
+                            help='Write the recommended indexes as AddIndex migrations')
+        parser.add_argument('--unused', action='store_true',
+                            help='Also list the indexes $indexStats counts no use of')
+        parser.add_argument('--reset', action='store_true',
+                            help='Forget the recorded query shapes')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with connection.cursor() as cursor:
+            db = cursor.db_conn
+            if options['reset']:
+                index_advisor.clear(db)
+                self.stdout.write('Recorded query shapes cleared')
+                return
+
+            shapes = index_advisor.shapes(db)
+            tables = set(connection.introspection.table_names(cursor))
+            existing = {}
+            for collection in {collection for collection, _ in shapes}:
+                if collection not in tables:
+                    continue
+                existing[collection] = [
+                    tuple(zip(info['columns'], (1 if order == 'ASC' else -1
+                                                for order in info['orders'])))
+                    for info in connection.introspection.get_constraints(
+                        cursor, collection).values()
+                ]
+
+            recommendations = recommend(shapes, existing)
+            if not recommendations:
+                self.stdout.write('No missing indexes')
+            for recommendation in recommendations:
+                self.stdout.write(f'{recommendation.collection}: '
+                                  f'({format_keys(recommendation.keys)}) '
+                                  f'serves {recommendation.queries} queries')
+
+            if options['unused']:
+                for index in unused_indexes(db, sorted(tables - {ADVISOR_COLLECTION})):
+                    self.stdout.write(f'Unused {index.collection}.{index.name}: '
+                                      f'({format_keys(index.keys)}) since {index.since}')
+
+        if options['migrations'] and recommendations:
+            self.write_migrations(recommendations)
+
+    def write_migrations(self, recommendations):
+        models_by_table = {model._meta.db_table: model for model in apps.get_models()}
+        operations = {}
+        for recommendation in recommendations:
+            model = models_by_table.get(recommendation.collection)
+            if model is None:
+                self.stderr.write(f'No model for {recommendation.collection}, skipped')
+                continue
+
+            field_names = {field.column: field.name for field in model._meta.concrete_fields}
+            try:
+                fields = [('' if order == 1 else '-') + field_names[column]
+                          for column, order in recommendation.keys]
+            except KeyError as e:
+                self.stderr.write(f'No field of {model.__name__} for column {e}, skipped')
+                continue
+
+            index = models.Index(fields=fields)
+            index.set_name_with_model(model)
+            operations.setdefault(model._meta.app_label, []).append(
+                migrations.AddIndex(model._meta.model_name, index))
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        for app_label, app_operations in operations.items():
+            if app_label not in loader.migrated_apps:
+                raise CommandError(f'App {app_label} has no migrations')
+
+            leaves = loader.graph.leaf_nodes(app_label)
+            number = max((MigrationAutodetector.parse_number(name) or 0
+                          for _, name in leaves), default=0) + 1
+            migration = migrations.Migration(f'{number:04d}_advised_indexes', app_label)
+            migration.dependencies = leaves
+            migration.operations = app_operations
+
+            writer = MigrationWriter(migration)
+            os.makedirs(os.path.dirname(writer.path), exist_ok=True)
+            with open(writer.path, 'w') as f:
+                f.write(writer.as_string())
+            self.stdout.write(f'Wrote {writer.path}')
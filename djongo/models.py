@@ -1,11 +1,13 @@
 from django.db.models import *
 from django import forms
 from django.core.exceptions import ValidationError
-from django.db import connection
+from django.db import connection, connections
 import typing
 
 from django.utils.safestring import mark_safe
 
+from .mongo2sql.routing import read_router
+
 
 def make_mdl(model, model_dict):
     for field_name in model_dict:
@@ -15,12 +17,52 @@ def make_mdl(model, model_dict):
     return model(**model_dict)
 
 
+def explain(queryset):
+    """
+    Returns the filter or pipeline `queryset` translates to and the plan
+    MongoDB picks for it, without fetching any row.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        return cursor.explain(sql, params)
+
+
+class KeysetPage(typing.NamedTuple):
+    objects: list
+    # Sort key of the last object, None on the last page
+    next_key: typing.Optional[tuple]
+
+
+def keyset_filter(ordering: typing.Sequence[str], after: typing.Sequence) -> Q:
+    """
+    Returns the filter keeping the rows sorted by `ordering` after the
+    sort key `after`: (a, b) > (x, y) reads a > x OR (a = x AND b > y).
+    """
+    q = Q()
+    equal = {}
+    for field, value in zip(ordering, after):
+        name = field.lstrip('-')
+        lookup = '__lt' if field.startswith('-') else '__gt'
+        q |= Q(**equal, **{name + lookup: value})
+        equal[name] = value
+    return q
+
+
 def useful_field(field):
     return field.concrete and not (field.is_relation
                                    or isinstance(field, (AutoField, BigAutoField)))
 
 
 class DjongoManager(Manager):
+    # Where the SELECTs of the model are sent to, a mode name or a
+    # pymongo read preference. None keeps the read preference of the client.
+    read_preference = None
+
+    def contribute_to_class(self, model, name):
+        super().contribute_to_class(model, name)
+        if self.read_preference is not None and not model._meta.abstract:
+            read_router.set_table(model._meta.db_table, self.read_preference)
+
     def __getattr__(self, name):
         try:
             return super().__getattr__(name)
@@ -32,6 +74,51 @@ class DjongoManager(Manager):
             m_cli = connection.cursor().db_conn[self.model._meta.db_table]
             return getattr(m_cli, name)
 
+    def keyset_page(self, size: int, ordering: typing.Sequence[str] = ('pk',),
+                    after: typing.Optional[tuple] = None, queryset=None) -> KeysetPage:
+        """
+        Returns the `size` objects of `queryset`, by default all of them,
+        that follow the sort key `after` in `ordering`. Pass the
+        `next_key` of a page as `after` to get the next one. Unlike an
+        OFFSET, which the server walks row by row, the page seeks to its
+        first row, so with an index on the ordering fields deep pages
+        cost the same as the first one. The primary key is appended to
+        `ordering` to break ties. The ordering fields must not be null.
+        """
+        meta = self.model._meta
+        ordering = list(ordering)
+        if not {'pk', meta.pk.name} & {field.lstrip('-') for field in ordering}:
+            ordering.append('pk')
+
+        if queryset is None:
+            queryset = self.get_queryset()
+        queryset = queryset.order_by(*ordering)
+        if after is not None:
+            queryset = queryset.filter(keyset_filter(ordering, after))
+
+        objects = list(queryset[:size])
+        if len(objects) < size:
+            return KeysetPage(objects, None)
+
+        attnames = [name if name == 'pk' else meta.get_field(name).attname
+                    for name in (field.lstrip('-') for field in ordering)]
+        last = objects[-1]
+        return KeysetPage(objects, tuple(getattr(last, attname) for attname in attnames))
+
+    def keyset_iterator(self, size: int, ordering: typing.Sequence[str] = ('pk',),
+                        queryset=None) -> typing.Iterator:
+        """
+        Yields the objects of `queryset` in `ordering`, fetched with
+        keyset_page() `size` at a time.
+        """
+        after = None
+        while True:
+            page = self.keyset_page(size, ordering, after, queryset)
+            yield from page.objects
+            if page.next_key is None:
+                return
+            after = page.next_key
+
 
 class ArrayModelField(Field):
 
@@ -1,20 +1,36 @@
-from itertools import chain
+from itertools import chain, islice
 
 from dataclasses import dataclass
+from bson import ObjectId, decode_all, json_util
 from pymongo.cursor import Cursor as BasicCursor
 from pymongo.command_cursor import CommandCursor
+from functools import lru_cache
 from logging import getLogger
+from operator import itemgetter
+from time import perf_counter
 import typing
-from pymongo import ReturnDocument, ASCENDING, DESCENDING
+from pymongo import (
+    DeleteMany, IndexModel, InsertOne, ReturnDocument, UpdateMany, ASCENDING, DESCENDING
+)
 from pymongo.errors import OperationFailure
-from sqlparse import parse as sqlparse
 from sqlparse import tokens
+from sqlparse.utils import remove_quotes
 from sqlparse.sql import (
     IdentifierList, Identifier, Parenthesis,
-    Where, Comparison, Function, Token,
+    Where, Comparison, Function, Operation, Token,
     Statement)
 from collections import OrderedDict
 
+from .advisor import QueryShape, index_advisor
+from .allocator import id_allocator
+from .buffer import WriteBuffer
+from .cache import statement_cache
+from .explain import plan_summary
+from .hashjoin import HASH_JOIN_BATCH_SIZE, HashJoin, hash_join, join_planner
+from .indexes import index_builds
+from .routing import read_router
+from .timing import timings
+
 logger = getLogger(__name__)
 
 OPERATOR_MAP = {
@@ -25,6 +41,14 @@ OPERATOR_MAP = {
     '<=': '$lte',
 }
 
+ARITHMETIC_OPERATORS = {
+    '+': '$add',
+    '-': '$subtract',
+    '*': '$multiply',
+    '/': '$divide',
+    '%': '$mod',
+}
+
 OPERATOR_PRECEDENCE = {
     'IN': 5,
     'NOT IN': 4,
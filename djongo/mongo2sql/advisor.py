@@ -0,0 +1,229 @@
+import atexit
+import threading
+import typing
+from collections import Counter
+from logging import getLogger
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.database import Database
+from pymongo.errors import PyMongoError
+
+logger = getLogger(__name__)
+
+# (field, direction) pairs, in the order of the index
+IndexKeys = typing.Tuple[typing.Tuple[str, int], ...]
+# equality fields, range fields, sort keys
+ShapeKey = typing.Tuple[typing.Tuple[str, ...], typing.Tuple[str, ...], IndexKeys]
+
+ADVISOR_COLLECTION = '__index_advisor__'
+FLUSH_EVERY = 1000
+
+
+class QueryShape:
+    """
+    The fields a query filters one collection on, by equality and by
+    range, and the keys it sorts it by.
+    """
+
+    def __init__(self):
+        self.equality: typing.List[str] = []
+        self.range: typing.List[str] = []
+        self.sort: typing.List[typing.Tuple[str, int]] = []
+
+    def key(self) -> ShapeKey:
+        equality = set(self.equality)
+        return (tuple(sorted(equality)),
+                tuple(sorted(set(self.range) - equality)),
+                tuple(self.sort))
+
+
+class Recommendation(typing.NamedTuple):
+    collection: str
+    keys: IndexKeys
+    queries: int
+
+
+class UnusedIndex(typing.NamedTuple):
+    collection: str
+    name: str
+    keys: IndexKeys
+    since: typing.Any
+
+
+def esr_index(shape: ShapeKey) -> IndexKeys:
+    """
+    Orders the fields of a query shape by the ESR rule: equality fields
+    first, then the sort keys, then the range fields, so the index both
+    narrows the scan and hands the documents back already sorted.
+    """
+    equality, range_, sort = shape
+    keys = [(field, ASCENDING) for field in equality]
+    keys.extend((field, order) for field, order in sort if field not in equality)
+    seen = {field for field, _ in keys}
+    keys.extend((field, ASCENDING) for field in range_ if field not in seen)
+    return tuple(keys)
+
+
+def covers(index: IndexKeys, shape: ShapeKey) -> bool:
+    """
+    True when `index` serves `shape` as well as its ESR index: the
+    equality fields in any order, then the sort keys in order, all
+    in the same or all in the reverse direction, then the range fields.
+    """
+    equality, range_, sort = shape
+    sort = [(field, order) for field, order in sort if field not in equality]
+    fields = [field for field, _ in index]
+
+    end = len(equality)
+    if set(fields[:end]) != set(equality):
+        return False
+
+    start, end = end, end + len(sort)
+    if len(index) < end:
+        return False
+    if sort:
+        wanted = [order for _, order in sort]
+        got = [order for _, order in index[start:end]]
+        if ([field for field, _ in sort] != fields[start:end]
+                or (got != wanted and got != [-order for order in wanted])):
+            return False
+
+    rest = [field for field in range_ if field not in fields[:end]]
+    return set(fields[end:end + len(rest)]) == set(rest)
+
+
+def recommend(
+        shapes: typing.Mapping[typing.Tuple[str, ShapeKey], int],
+        existing: typing.Mapping[str, typing.List[IndexKeys]]
+) -> typing.List[Recommendation]:
+    """
+    Returns the ESR indexes serving the recorded query shapes that no
+    index in `existing` already serves, most queried first. Shapes an
+    index recommended for another shape also serves are folded into it.
+    """
+    candidates: typing.Dict[str, typing.Set[IndexKeys]] = {}
+    pending = []
+    for (collection, shape), count in shapes.items():
+        index = esr_index(shape)
+        if not index or index == (('_id', ASCENDING),):
+            continue
+        if any(covers(each, shape) for each in existing.get(collection, ())):
+            continue
+        pending.append((collection, shape, count))
+        candidates.setdefault(collection, set()).add(index)
+
+    queries: typing.Dict[typing.Tuple[str, IndexKeys], int] = Counter()
+    for collection, shape, count in pending:
+        # The longest index serving the shape absorbs it
+        serving = [index for index in candidates[collection] if covers(index, shape)]
+        queries[collection, max(serving, key=lambda index: (len(index), index))] += count
+
+    recommendations = [Recommendation(collection, index, count)
+                       for (collection, index), count in queries.items()]
+    recommendations.sort(key=lambda each: (-each.queries, each.collection, each.keys))
+    return recommendations
+
+
+def unused_indexes(db: Database, collections: typing.Iterable[str]) -> typing.List[UnusedIndex]:
+    """
+    Returns the indexes `$indexStats` counts no use of since the server
+    started or the index was built. Unique indexes enforce constraints
+    and are never reported.
+    """
+    unused = []
+    for collection in collections:
+        for stats in db[collection].aggregate([{'$indexStats': {}}]):
+            spec = stats.get('spec', {})
+            if (stats['name'] == '_id_' or spec.get('unique')
+                    or stats['accesses']['ops']):
+                continue
+            unused.append(UnusedIndex(collection, stats['name'],
+                                      tuple(stats['key'].items()),
+                                      stats['accesses'].get('since')))
+    return unused
+
+
+class IndexAdvisor:
+    """
+    Counts the query shapes of translated statements per database. The
+    counts are added up in the ADVISOR_COLLECTION collection of each
+    database every FLUSH_EVERY statements and at exit, so the shapes
+    seen by every process can be compared with the existing indexes.
+    """
+
+    def __init__(self, flush_every: int = FLUSH_EVERY):
+        self.flush_every = flush_every
+        self._pending: typing.Dict[tuple, int] = Counter()
+        self._databases: typing.Dict[str, Database] = {}
+        self._recorded = 0
+        self._lock = threading.Lock()
+
+    def record(self, db: Database, collection: str, shape: QueryShape):
+        key = shape.key()
+        if not any(key):
+            return
+
+        with self._lock:
+            self._databases[db.name] = db
+            self._pending[db.name, collection, key] += 1
+            self._recorded += 1
+            flush = self._recorded >= self.flush_every
+
+        if flush:
+            # Recording must not fail the statement being recorded
+            self.try_flush()
+
+    def try_flush(self):
+        try:
+            self.flush()
+        except PyMongoError as e:
+            logger.warning('Could not save the recorded query shapes: %s', e)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            databases = dict(self._databases)
+            self._recorded = 0
+
+        requests: typing.Dict[str, list] = {}
+        for (db_name, collection, key), count in pending.items():
+            requests.setdefault(db_name, []).append(
+                UpdateOne({'_id': _shape_id(collection, key)},
+                          {'$inc': {'count': count}}, upsert=True))
+
+        for db_name, updates in requests.items():
+            databases[db_name][ADVISOR_COLLECTION].bulk_write(updates, ordered=False)
+
+    def shapes(self, db: Database) -> typing.Dict[typing.Tuple[str, ShapeKey], int]:
+        """
+        Returns the counts of the query shapes recorded against `db` by
+        all processes, keyed by collection and shape.
+        """
+        self.flush()
+        shapes = Counter()
+        for doc in db[ADVISOR_COLLECTION].find():
+            _id = doc['_id']
+            key = (tuple(_id['equality']), tuple(_id['range']),
+                   tuple((field, order) for field, order in _id['sort']))
+            shapes[_id['collection'], key] += doc['count']
+        return shapes
+
+    def clear(self, db: Database):
+        with self._lock:
+            self._pending = Counter(
+                {key: count for key, count in self._pending.items() if key[0] != db.name})
+        db[ADVISOR_COLLECTION].drop()
+
+
+def _shape_id(collection: str, key: ShapeKey) -> dict:
+    equality, range_, sort = key
+    return {
+        'collection': collection,
+        'equality': list(equality),
+        'range': list(range_),
+        'sort': [list(each) for each in sort],
+    }
+
+
+index_advisor = IndexAdvisor()
+atexit.register(index_advisor.try_flush)
@@ -0,0 +1,147 @@
+import os
+import threading
+import typing
+
+from pymongo import ReturnDocument
+from pymongo.database import Database
+
+
+class _Block:
+    __slots__ = ('lock', 'next', 'end', 'field_names')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next = 0
+        self.end = 0
+        self.field_names: typing.List[str] = []
+
+
+def _reservation(collection: str, reserve: int) -> typing.Tuple[dict, dict]:
+    return (
+        {
+            'name': collection,
+            'auto': {
+                '$exists': True
+            }
+        },
+        {'$inc': {'auto.seq': reserve}}
+    )
+
+
+def _refill(block: _Block, auto: dict, reserve: int):
+    block.end = auto['auto']['seq'] + 1
+    block.next = block.end - reserve
+    block.field_names = auto['auto']['field_names']
+
+
+def _take(block: _Block, count: int) -> range:
+    ids = range(block.next, block.next + count)
+    block.next += count
+    return ids
+
+
+class IdAllocator:
+    """
+    Hi/lo allocator for AUTOINCREMENT fields. Every process reserves a
+    block of ids per collection with one atomic $inc on the __schema__
+    sequence and then hands them out locally, so concurrent workers never
+    share an id but only touch __schema__ once per block.
+    """
+
+    def __init__(self):
+        self._blocks: typing.Dict[tuple, _Block] = {}
+        self._lock = threading.Lock()
+
+    def allocate(
+            self,
+            db: Database,
+            collection: str,
+            count: int = 1,
+            block_size: int = 1
+    ) -> typing.Tuple[typing.List[str], typing.Optional[range]]:
+        """
+        Returns the auto field names of `collection` and a range of `count`
+        unused ids, or `([], None)` when the collection has no auto field.
+        """
+        block = self._block(db, collection)
+        with block.lock:
+            if block.next + count > block.end:
+                reserve = max(count, block_size)
+                auto = db['__schema__'].find_one_and_update(
+                    *_reservation(collection, reserve),
+                    return_document=ReturnDocument.AFTER
+                )
+
+                if not auto:
+                    return [], None
+
+                _refill(block, auto, reserve)
+
+            return block.field_names, _take(block, count)
+
+    async def aallocate(
+            self,
+            db,
+            collection: str,
+            count: int = 1,
+            block_size: int = 1
+    ) -> typing.Tuple[typing.List[str], typing.Optional[range]]:
+        """
+        The asyncio counterpart of allocate(), for a database of
+        AsyncMongoClient. The block is not locked while its sequence is
+        incremented, so coroutines running out of ids at the same time
+        each reserve a block, and the ids left in the replaced one are
+        skipped.
+        """
+        block = self._block(db, collection)
+        with block.lock:
+            if block.next + count <= block.end:
+                return block.field_names, _take(block, count)
+
+        reserve = max(count, block_size)
+        auto = await db['__schema__'].find_one_and_update(
+            *_reservation(collection, reserve),
+            return_document=ReturnDocument.AFTER
+        )
+
+        if not auto:
+            return [], None
+
+        with block.lock:
+            _refill(block, auto, reserve)
+            return block.field_names, _take(block, count)
+
+    def _block(self, db, collection: str) -> _Block:
+        key = db, collection
+        with self._lock:
+            try:
+                return self._blocks[key]
+            except KeyError:
+                block = self._blocks[key] = _Block()
+                return block
+
+    def invalidate(self, db_name: str, collection: str = None):
+        """
+        Drops the reserved blocks of `collection`, or of every collection
+        in database `db_name`, after its sequence was reset.
+        """
+        with self._lock:
+            for db, name in list(self._blocks):
+                if db.name == db_name and collection in (None, name):
+                    del self._blocks[db, name]
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+    def _after_fork(self):
+        # Another thread may have held the locks while forking
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+
+id_allocator = IdAllocator()
+
+if hasattr(os, 'register_at_fork'):
+    # A forked worker must not hand out the ids its parent reserved
+    os.register_at_fork(after_in_child=id_allocator._after_fork)
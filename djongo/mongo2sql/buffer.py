@@ -0,0 +1,102 @@
+import typing
+from logging import getLogger
+
+from pymongo import MongoClient
+from pymongo.collection import Collection
+from pymongo.results import BulkWriteResult
+
+logger = getLogger(__name__)
+
+# InsertOne, UpdateMany or DeleteMany
+WriteRequest = typing.Any
+
+
+class WriteBuffer:
+    """
+    Queues the writes of a connection while autocommit is off, as it is
+    inside `transaction.atomic()`. The queue is sent on commit, with one
+    ordered bulk_write per run of writes to the same collection, and
+    dropped on rollback. Statements that must see the queued writes, or
+    report a row count, flush it first. With `transactions` set, each
+    flush runs in a multi-document transaction, which needs a replica
+    set.
+    """
+
+    def __init__(self, client: MongoClient, transactions: bool = False):
+        self.client = client
+        self.transactions = transactions
+        self.active = False
+        self._queue: typing.List[typing.Tuple[Collection, WriteRequest]] = []
+        self._flushed = False
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._queue)
+
+    def begin(self):
+        self.active = True
+        self._flushed = False
+
+    def end(self):
+        if self._queue:
+            self.flush()
+        self.active = False
+
+    def queue(self, collection: Collection, request: WriteRequest):
+        self._queue.append((collection, request))
+
+    def flush(
+            self,
+            collection: typing.Optional[Collection] = None,
+            request: typing.Optional[WriteRequest] = None
+    ) -> typing.Optional[BulkWriteResult]:
+        """
+        Sends the queued writes, followed by `request` on `collection`
+        when given, and returns the result of the bulk_write holding it.
+        """
+        queue, self._queue = self._queue, []
+        if request is not None:
+            queue.append((collection, request))
+        if not queue:
+            return None
+
+        runs: typing.List[typing.Tuple[Collection, list]] = []
+        for each, write in queue:
+            if runs and runs[-1][0] == each:
+                runs[-1][1].append(write)
+            else:
+                runs.append((each, [write]))
+
+        self.sent()
+        logger.debug('flushing %s writes in %s bulk writes', len(queue), len(runs))
+        if not self.transactions:
+            return self._bulk_write(runs)
+
+        with self.client.start_session() as session:
+            return session.with_transaction(lambda s: self._bulk_write(runs, s))
+
+    @staticmethod
+    def _bulk_write(runs, session=None) -> BulkWriteResult:
+        result = None
+        for collection, requests in runs:
+            result = collection.bulk_write(requests, ordered=True, session=session)
+        return result
+
+    def sent(self):
+        """
+        Records that writes of the block went to the server.
+        """
+        if self.active:
+            self._flushed = True
+
+    def commit(self):
+        self.flush()
+
+    def rollback(self) -> bool:
+        """
+        Drops the queued writes. Returns False when writes were already
+        sent since the block began, as those cannot be undone.
+        """
+        self._queue = []
+        flushed, self._flushed = self._flushed, False
+        return not flushed
@@ -0,0 +1,82 @@
+import threading
+import typing
+from collections import OrderedDict
+
+from sqlparse import parse as sqlparse
+from sqlparse.sql import Statement
+
+from .errors import SQLDecodeError
+from .parser import parse as fast_parse
+
+
+class CacheInfo(typing.NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class StatementCache:
+    """
+    Bounded LRU mapping of placeholder normalized SQL to its parsed
+    statement. Django sends the same statement shapes with different
+    params, so a repeated statement skips sqlparse entirely.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._statements: typing.Dict[str, Statement] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def parse(self, sql: str) -> Statement:
+        with self._lock:
+            try:
+                statement = self._statements[sql]
+            except KeyError:
+                self._misses += 1
+            else:
+                self._statements.move_to_end(sql)
+                self._hits += 1
+                return statement
+
+        statement = fast_parse(sql)
+        if statement is None:
+            statement = sqlparse(sql)
+            if len(statement) > 1:
+                raise SQLDecodeError(sql)
+
+            statement = statement[0]
+
+        if self.maxsize > 0:
+            with self._lock:
+                self._statements[sql] = statement
+                self._evict()
+
+        return statement
+
+    def resize(self, maxsize: int):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+            self._hits = self._misses = self._evictions = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions,
+                             self.maxsize, len(self._statements))
+
+    def _evict(self):
+        while len(self._statements) > max(self.maxsize, 0):
+            self._statements.popitem(last=False)
+            self._evictions += 1
+
+
+statement_cache = StatementCache()
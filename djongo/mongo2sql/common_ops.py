@@ -40,6 +40,26 @@ class _Op:
     def to_mongo(self):
         raise NotImplementedError
 
+    def add_to_shape(self, shape: 'QueryShape'):
+        """
+        Records the fields of the left table this op filters on in
+        `shape`. Disjunctions and fields of joined tables are left out,
+        as no single index of the left table serves them.
+        """
+        pass
+
+    def columns(self) -> typing.List[typing.Tuple[str, str]]:
+        """
+        Returns the (table, column) pairs this op reads.
+        """
+        return []
+
+    def conjuncts(self) -> typing.List['_Op']:
+        """
+        Returns the ops this op is the conjunction of.
+        """
+        return [self]
+
 
 class _UnaryOp(_Op):
 
@@ -56,28 +76,39 @@ class _UnaryOp(_Op):
     def to_mongo(self):
         return self.rhs.to_mongo()
 
+    def add_to_shape(self, shape: 'QueryShape'):
+        self.rhs.add_to_shape(shape)
+
+    def columns(self):
+        return self.rhs.columns()
+
 
 class _InNotInOp(_Op):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        identifier = SQLToken(self.token.token_prev(self._token_id)[1], self.query.alias2op)
+        identifier = self._identifier = SQLToken(
+            self.token.token_prev(self._token_id)[1], self.query.alias2op)
 
-        if identifier.table == self.left_table:
+        self._indexable = identifier.table == self.left_table
+        if self._indexable:
             self._field = identifier.column
         else:
             self._field = '{}.{}'.format(identifier.table, identifier.column)
 
     def _fill_in(self, token):
         self._in = []
+        self._nested: typing.Optional[SelectQuery] = None
 
         # Check for nested
         if token[1].ttype == tokens.DML:
-            self.query.nested_query = SelectQuery(
+            self._nested = SelectQuery(
                 self.query._result_ref,
-                sqlparse(token.value[1:-1])[0],
+                statement_cache.parse(token.value[1:-1]),
                 self.params
             )
+            self._lookup_field = f'__in{len(self.query.nested_in)}'
+            self.query.nested_in.append(self)
             return
 
         for index in SQLToken(token, self.query.alias2op):
@@ -89,9 +120,46 @@ class _InNotInOp(_Op):
     def negate(self):
         raise SQLDecodeError('Negating IN/NOT IN not supported')
 
+    def lookup(self):
+        """
+        Compiles the nested SELECT into a $lookup, so the server matches
+        its rows against the field instead of sending them to the client.
+        """
+        return {
+            '$lookup': {
+                'from': self._nested.left_table,
+                'let': {'value': '$' + self._field},
+                'pipeline': self._nested.in_pipeline(),
+                'as': self._lookup_field
+            }
+        }
+
+    def _to_mongo(self, op):
+        if self._nested is None:
+            return {self._field: {op: self._in}}
+
+        # The lookup holds a row when the field is in the nested result
+        return {self._lookup_field: {'$ne' if op == '$in' else '$eq': []}}
+
     def to_mongo(self):
         raise NotImplementedError
 
+    def columns(self):
+        columns = [(self._identifier.table, self._identifier.column)]
+        if self._nested is not None:
+            # The field of the lookup only exists after the $lookup stage
+            columns.append((None, self._lookup_field))
+        return columns
+
+    def _add_to_shape(self, shape: 'QueryShape', equality: bool):
+        # A nested IN matches on the $lookup result, not on an index
+        if self._nested is not None or not self._indexable:
+            return
+        if equality:
+            shape.equality.append(self._field)
+        else:
+            shape.range.append(self._field)
+
 
 class NotInOp(_InNotInOp):
 
@@ -104,10 +172,10 @@ class NotInOp(_InNotInOp):
 
     def to_mongo(self):
         op = '$nin' if not self.is_negated else '$in'
-        if self.query.nested_query_result is not None:
-            return {self._field: {op: self.query.nested_query_result}}
-        else:
-            return {self._field: {op: self._in}}
+        return self._to_mongo(op)
+
+    def add_to_shape(self, shape: 'QueryShape'):
+        self._add_to_shape(shape, self.is_negated)
 
     def negate(self):
         self.is_negated = True
@@ -121,10 +189,10 @@ class InOp(_InNotInOp):
 
     def to_mongo(self):
         op = '$in' if not self.is_negated else '$nin'
-        if self.query.nested_query_result is not None:
-            return {self._field: {op: self.query.nested_query_result}}
-        else:
-            return {self._field: {op: self._in}}
+        return self._to_mongo(op)
+
+    def add_to_shape(self, shape: 'QueryShape'):
+        self._add_to_shape(shape, not self.is_negated)
 
     def negate(self):
         self.is_negated = True
@@ -208,6 +276,19 @@ class _AndOrOp(_Op):
         docs = [itm.to_mongo() for itm in self._acc]
         return {oper: docs}
 
+    def add_to_shape(self, shape: 'QueryShape'):
+        if self.op_type() == AndOp:
+            for itm in self._acc:
+                itm.add_to_shape(shape)
+
+    def columns(self):
+        return [column for itm in self._acc for column in itm.columns()]
+
+    def conjuncts(self):
+        if self.op_type() != AndOp:
+            return [self]
+        return [conjunct for itm in self._acc for conjunct in itm.conjuncts()]
+
 
 class AndOp(_AndOrOp):
 
@@ -239,7 +320,7 @@ class WhereOp(_Op):
         super().__init__(*args, **kwargs)
 
         if not isinstance(self.token[2], Parenthesis):
-            op = ParenthesisOp(0, sqlparse('(' + self.token.value[6:] + ')')[0][0], self.query)
+            op = ParenthesisOp(0, statement_cache.parse('(' + self.token.value[6:] + ')')[0], self.query)
         else:
             op = ParenthesisOp(0, self.token[2], self.query)
         op.evaluate()
@@ -251,12 +332,30 @@ class WhereOp(_Op):
     def to_mongo(self):
         return self._op.to_mongo()
 
+    def add_to_shape(self, shape: 'QueryShape'):
+        self._op.add_to_shape(shape)
+
+    def columns(self):
+        return self._op.columns()
+
+    def conjuncts(self):
+        return self._op.conjuncts()
+
 
 class ParenthesisOp(_Op):
 
     def to_mongo(self):
         return self._op.to_mongo()
 
+    def add_to_shape(self, shape: 'QueryShape'):
+        self._op.add_to_shape(shape)
+
+    def columns(self):
+        return self._op.columns()
+
+    def conjuncts(self):
+        return self._op.conjuncts()
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -335,8 +434,8 @@ class ParenthesisOp(_Op):
             if operator.precedence > ops[i].precedence:
                 ops.insert(i, operator)
                 break
-            else:
-                ops.append(operator)
+        else:
+            ops.append(operator)
 
     def evaluate(self):
         if self._op is not None:
@@ -362,6 +461,12 @@ class CmpOp(_Op):
         super().__init__(*args, **kwargs)
 
         self._identifier = SQLToken(self.token.left, self.query.alias2op)
+        self._field = None
+        if isinstance(self.token.left, Function):
+            if not self.query.in_having:
+                raise SQLDecodeError(f'Function comparison outside HAVING: {self.token}')
+            # HAVING compares the aggregated value
+            self._field = self.query.selected_columns.function(self.token.left)
 
         if isinstance(self.token.right, Identifier):
             raise SQLDecodeError('Join using WHERE not supported')
@@ -375,7 +480,9 @@ class CmpOp(_Op):
         self.is_negated = True
 
     def to_mongo(self):
-        if self._identifier.table == self.left_table:
+        if self._field is not None:
+            field = self._field
+        elif self._identifier.table == self.left_table:
             field = self._identifier.column
         else:
             field = '{}.{}'.format(self._identifier.table, self._identifier.column)
@@ -385,3 +492,26 @@ class CmpOp(_Op):
         else:
             return {field: {'$not': {self._operator: self._constant}}}
 
+    def non_null_column(self) -> typing.Optional[str]:
+        """
+        Returns the column of the left table this comparison only matches
+        non-null values of, if any.
+        """
+        if (self.is_negated or self._field is not None or self._constant is None
+                or self._identifier.table != self.left_table):
+            return None
+        return self._identifier.column
+
+    def add_to_shape(self, shape: 'QueryShape'):
+        if self._field is not None or self._identifier.table != self.left_table:
+            return
+        if self._operator == '$eq' and not self.is_negated:
+            shape.equality.append(self._identifier.column)
+        else:
+            shape.range.append(self._identifier.column)
+
+    def columns(self):
+        if self._field is not None:
+            return []
+        return [(self._identifier.table, self._identifier.column)]
+
@@ -27,6 +27,11 @@ class ColumnSelectConverter(Converter):
         self.num_columns = 0
 
         self.sql_tokens: typing.List[SQLToken] = []
+        # Selected columns and aggregate fields in SELECT order
+        self.selected: typing.List[typing.Union[SQLToken, str]] = []
+        self.aggregates: typing.Dict[str, _AggregateFunc] = OrderedDict()
+        self._function_fields: typing.Dict[str, str] = {}
+        self._alias_fields: typing.Dict[str, str] = {}
         super().__init__(query, begin_id)
 
     def parse(self):
@@ -49,6 +54,9 @@ class ColumnSelectConverter(Converter):
             raise SQLDecodeError
 
         self.end_id = tok_id
+        if (len(self.selected) == 1 and not self.sql_tokens
+                and isinstance(self.aggregates[self.selected[0]], CountWildcardFunc)):
+            self.return_count = True
 
     def _identifier(self, tok):
         if isinstance(tok[0], Parenthesis):
@@ -56,15 +64,53 @@ class ColumnSelectConverter(Converter):
             return
 
         elif isinstance(tok[0], Function):
-            if tok[0][0].value == 'COUNT':
-                self.return_count = True
+            field = self.function(tok[0])
+            self.selected.append(field)
+            alias = tok.get_alias()
+            if alias:
+                self._alias_fields[alias] = field
 
         else:
             sql = SQLToken(tok, self.query.alias2op)
             self.sql_tokens.append(sql)
+            self.selected.append(sql)
             if sql.alias:
                 self.query.alias2op[sql.alias] = sql
 
+    def function(self, tok: Function) -> str:
+        """
+        Registers the aggregate function `tok` and returns the name of
+        the field that holds its value after the $group stage.
+        """
+        try:
+            return self._function_fields[tok.value]
+        except KeyError:
+            pass
+
+        name = tok.get_name().upper()
+        args = [arg for arg in tok[1][1:-1] if not arg.is_whitespace]
+
+        if name == 'COUNT' and len(args) == 1 and args[0].ttype == tokens.Wildcard:
+            func = CountWildcardFunc()
+
+        elif name == 'COUNT' and len(args) == 2 and args[0].match(tokens.Keyword, 'DISTINCT'):
+            sql = SQLToken(args[1], self.query.alias2op)
+            func = CountDistinctFunc(sql.table, sql.column)
+
+        elif name in AGGREGATE_FUNCS and len(args) == 1:
+            sql = SQLToken(args[0], self.query.alias2op)
+            func = AGGREGATE_FUNCS[name](sql.table, sql.column)
+
+        else:
+            raise SQLDecodeError(f'Function not supported: {tok}')
+
+        field = self._function_fields[tok.value] = f'agg{len(self.aggregates)}'
+        self.aggregates[field] = func
+        return field
+
+    def alias_field(self, alias: str) -> typing.Optional[str]:
+        return self._alias_fields.get(alias)
+
     def to_mongo(self):
         if self.query.distinct:
             return {'projection': [self.query.distinct.column]}
@@ -72,6 +118,58 @@ class ColumnSelectConverter(Converter):
         return {'projection': doc}
 
 
+class GroupbyConverter(Converter):
+    def __init__(self, *args):
+        self.sql_tokens: typing.List[SQLToken] = []
+        super().__init__(*args)
+
+    def parse(self):
+        sm = self.query.statement
+        tok_id, tok = sm.token_next(self.begin_id)
+        if not tok.match(tokens.Keyword, 'BY'):
+            raise SQLDecodeError
+
+        tok_id, tok = sm.token_next(tok_id)
+        if isinstance(tok, Identifier):
+            self.sql_tokens.append(SQLToken(tok, self.query.alias2op))
+
+        elif isinstance(tok, IdentifierList):
+            for atok in tok.get_identifiers():
+                self.sql_tokens.append(SQLToken(atok, self.query.alias2op))
+
+        else:
+            raise SQLDecodeError
+
+        self.end_id = tok_id
+
+    def to_mongo(self):
+        keys = OrderedDict()
+        for i, sql in enumerate(self.sql_tokens):
+            keys[f'key{i}'] = '$' + self.query.field_path(sql.table, sql.column)
+
+        return keys
+
+
+class HavingConverter(Converter):
+    op: 'ParenthesisOp' = None
+
+    def parse(self):
+        sm = self.query.statement
+        self.end_id, tok = sm.token_next(self.begin_id)
+        if not isinstance(tok, Parenthesis):
+            tok = statement_cache.parse('(' + tok.value + ')')[0]
+
+        self.query.in_having = True
+        try:
+            self.op = ParenthesisOp(0, tok, self.query, params=self.query.params)
+            self.op.evaluate()
+        finally:
+            self.query.in_having = False
+
+    def to_mongo(self):
+        return {'$match': self.op.to_mongo()}
+
+
 class AggColumnSelectConverter(ColumnSelectConverter):
 
     def to_mongo(self):
@@ -155,32 +253,71 @@ class JoinConverter(Converter):
 
         self.end_id = tok_id
 
-    def _lookup(self):
+    @property
+    def local_field(self) -> str:
         if self.left_table == self.query.left_table:
-            local_field = self.left_column
-        else:
-            local_field = f'{self.left_table}.{self.left_column}'
+            return self.left_column
+        return f'{self.left_table}.{self.left_column}'
+
+    @property
+    def to_one(self) -> bool:
+        """
+        True when a row matches at most one row of the right table.
+        Foreign keys join on the primary key of the right table, which
+        Django names `id` unless told otherwise.
+        """
+        return self.right_column == 'id'
+
+    def _lookup(self, columns: typing.Optional[typing.Set[str]] = None,
+                match: typing.Optional[dict] = None):
+        pipeline = []
+        if match:
+            pipeline.append({'$match': match})
+        if columns is not None:
+            # Only the columns the query reads leave the right collection
+            if columns:
+                project = dict.fromkeys(sorted(columns), True)
+                project.setdefault('_id', False)
+            else:
+                project = {'_id': True}
+            pipeline.append({'$project': project})
+        if not pipeline:
+            return {
+                '$lookup': {
+                    'from': self.right_table,
+                    'localField': self.local_field,
+                    'foreignField': self.right_column,
+                    'as': self.right_table
+                }
+            }
 
-        lookup = {
+        # A pipeline next to localField and foreignField needs MongoDB 5.0,
+        # let and $expr work from 3.6
+        return {
             '$lookup': {
                 'from': self.right_table,
-                'localField': local_field,
-                'foreignField': self.right_column,
+                'let': {'value': '$' + self.local_field},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$' + self.right_column, '$$value']}}},
+                    *pipeline
+                ],
                 'as': self.right_table
             }
         }
 
-        return lookup
+    def to_mongo(self, columns: typing.Optional[typing.Set[str]] = None,
+                 match: typing.Optional[dict] = None):
+        raise NotImplementedError
 
 
 class InnerJoinConverter(JoinConverter):
 
-    def to_mongo(self):
-        lookup = self._lookup()
+    def to_mongo(self, columns=None, match=None):
+        lookup = self._lookup(columns, match)
         pipeline = [
             {
                 '$match': {
-                    self.left_column: {
+                    self.local_field: {
                         '$ne': None,
                         '$exists': True
                     }
@@ -197,8 +334,8 @@ class InnerJoinConverter(JoinConverter):
 
 class OuterJoinConverter(JoinConverter):
 
-    def to_mongo(self):
-        lookup = self._lookup()
+    def to_mongo(self, columns=None, match=None):
+        lookup = self._lookup(columns)
         pipeline = [
             lookup,
             {
@@ -232,6 +369,26 @@ class AggLimitConverter(LimitConverter):
         return {'$limit': self.limit}
 
 
+class OffsetConverter(Converter):
+    def __init__(self, *args):
+        self.offset: int = None
+        super().__init__(*args)
+
+    def parse(self):
+        sm = self.query.statement
+        self.end_id, tok = sm.token_next(self.begin_id)
+        self.offset = int(tok.value)
+
+    def to_mongo(self):
+        return {'skip': self.offset}
+
+
+class AggOffsetConverter(OffsetConverter):
+
+    def to_mongo(self):
+        return {'$skip': self.offset}
+
+
 class OrderConverter(Converter):
     def __init__(self, *args):
         self.columns: typing.List[typing.Tuple[SQLToken, SQLToken]] = []
@@ -254,7 +411,7 @@ class OrderConverter(Converter):
         self.end_id = tok_id
 
     def to_mongo(self):
-        sort = [(tok.table, tok_ord.order) for tok, tok_ord in self.columns]
+        sort = [(tok.column, tok_ord.order) for tok, tok_ord in self.columns]
         return {'sort': sort}
 
 
@@ -262,30 +419,165 @@ class SetConverter(Converter):
 
     def __init__(self, *args):
         self.sql_tokens: typing.List[SQLToken] = []
+        self._values: typing.List[Token] = []
         super().__init__(*args)
 
     def parse(self):
         tok_id, tok = self.query.statement.token_next(self.begin_id)
 
         if isinstance(tok, Comparison):
-            self.sql_tokens.append(SQLToken(tok, self.query.alias2op))
+            assignments = [tok]
 
         elif isinstance(tok, IdentifierList):
-            for atok in tok.get_identifiers():
-                self.sql_tokens.append((SQLToken(atok, self.query.alias2op)))
+            assignments = list(tok.get_identifiers())
 
         else:
             raise SQLDecodeError
 
+        for atok in assignments:
+            if not isinstance(atok, Comparison):
+                raise SQLDecodeError
+            self.sql_tokens.append(SQLToken(atok, self.query.alias2op))
+            self._values.append(atok.right)
+
         self.end_id = tok_id
 
+    def _expression(self, tok: Token):
+        """
+        Translates an SQL value expression into an aggregation expression
+        over the fields of the updated row.
+        """
+        if isinstance(tok, Parenthesis):
+            inner = [atok for atok in tok.tokens[1:-1] if not atok.is_whitespace]
+            if len(inner) != 1:
+                raise SQLDecodeError(f'Unsupported expression: {tok.value}')
+            return self._expression(inner[0])
+
+        if isinstance(tok, Operation):
+            return self._operation(self._operation_items(tok))
+
+        if isinstance(tok, Identifier):
+            return '$' + SQLToken(tok, self.query.alias2op).column
+
+        if tok.ttype == tokens.Name.Placeholder:
+            # Parameters are values, never field paths or operators
+            return {'$literal': self.query.params[SQLToken.placeholder_index(tok)]}
+
+        if tok.match(tokens.Keyword, 'NULL'):
+            return None
+
+        if tok.ttype in tokens.Number.Integer:
+            return int(tok.value)
+
+        if tok.ttype in tokens.Number.Float:
+            return float(tok.value)
+
+        raise SQLDecodeError(f'Unsupported expression: {tok.value}')
+
+    def _operation_items(self, tok: Operation) -> typing.List[Token]:
+        # sqlparse nests operations left to right, whatever their precedence
+        items = []
+        for atok in tok.tokens:
+            if isinstance(atok, Operation):
+                items.extend(self._operation_items(atok))
+            elif not atok.is_whitespace:
+                items.append(atok)
+        return items
+
+    def _operation(self, items: typing.List[Token]):
+        if len(items) % 2 == 0:
+            raise SQLDecodeError(f'Unsupported expression: {"".join(map(str, items))}')
+
+        # Multiplications are folded into terms first, terms are then added
+        terms = [self._expression(items[0])]
+        additions = []
+        for operator, operand in zip(items[1::2], items[2::2]):
+            name = ARITHMETIC_OPERATORS.get(operator.value)
+            if operator.ttype not in tokens.Operator or name is None:
+                raise SQLDecodeError(f'Unsupported operator: {operator.value}')
+            if operator.value in ('+', '-'):
+                additions.append(name)
+                terms.append(self._expression(operand))
+            else:
+                terms[-1] = {name: [terms[-1], self._expression(operand)]}
+
+        expression = terms[0]
+        for name, term in zip(additions, terms[1:]):
+            expression = {name: [expression, term]}
+        return expression
+
+    @staticmethod
+    def _operator_update(column: str, expression) -> typing.Optional[typing.Tuple[str, typing.Any]]:
+        """
+        Returns the update operator and value setting `column` to
+        `expression`, when one exists.
+        """
+        if expression is None:
+            return '$set', None
+        if not isinstance(expression, dict) or len(expression) != 1:
+            return None
+
+        (name, args), = expression.items()
+        if name == '$literal':
+            return '$set', args
+        if name not in ('$add', '$subtract', '$multiply'):
+            return None
+
+        field = '$' + column
+        if args[0] == field:
+            constant = args[1]
+        elif name != '$subtract' and args[1] == field:
+            constant = args[0]
+        else:
+            return None
+
+        if not isinstance(constant, dict) or list(constant) != ['$literal']:
+            return None
+        value = constant['$literal']
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+
+        if name == '$add':
+            return '$inc', value
+        if name == '$subtract':
+            return '$inc', -value
+        return '$mul', value
+
+    def to_mongo(self, non_null: typing.Optional[typing.Collection[str]] = ()):
+        """
+        Constants are $set, and `col + n`, `col - n` and `col * n` of the
+        assigned column become $inc and $mul when `col` is in `non_null`,
+        or for every column when `non_null` is None. $inc and $mul fail
+        on a null field, where SQL leaves it NULL. Any other expression
+        turns the update into a pipeline, where the server computes every
+        new value from the old row like SQL does.
+        """
+        expressions = OrderedDict(
+            (sql.lhs_column, self._expression(value))
+            for sql, value in zip(self.sql_tokens, self._values)
+        )
+
+        update = {}
+        for column, expression in expressions.items():
+            operator_update = self._operator_update(column, expression)
+            if operator_update is None:
+                return {'update': [{'$set': expressions}]}
+            operator, value = operator_update
+            if operator != '$set' and non_null is not None and column not in non_null:
+                return {'update': [{'$set': expressions}]}
+            update.setdefault(operator, {})[column] = value
+
+        return {'update': update}
+
+
+class GroupOrderConverter(OrderConverter):
+
     def to_mongo(self):
-        return {
-            'update': {
-                '$set': {
-                    sql.lhs_column: self.query.params[sql.rhs_indexes] for sql in self.sql_tokens}
-            }
-        }
+        sort = OrderedDict()
+        for tok, tok_ord in self.columns:
+            sort[self.query.group_field(tok)] = tok_ord.order
+
+        return {'$sort': sort}
 
 
 class AggOrderConverter(OrderConverter):
@@ -10,19 +10,83 @@ class TableColumnOp:
 
 
 @dataclass
-class CountFunc:
-    table_name: str
-    column_name: str
+class _AggregateFunc:
+    table_name: str = None
+    column_name: str = None
     alias_name: str = None
 
+    # $group accumulator operator
+    operator = None
+    # Value of the function over zero rows
+    empty = None
+
+    def accumulator(self, field: typing.Optional[str]):
+        return {self.operator: '$' + field}
+
+    def project(self, name: str):
+        return '$' + name
+
 
 @dataclass
-class CountDistinctFunc:
-    table_name: str
-    column_name: str
-    alias_name: str = None
+class CountFunc(_AggregateFunc):
+    empty = 0
+
+    def accumulator(self, field):
+        # NULLs are not counted
+        return {
+            '$sum': {
+                '$cond': [{'$eq': [{'$ifNull': ['$' + field, None]}, None]}, 0, 1]
+            }
+        }
 
 
 @dataclass
-class CountWildcardFunc:
-    alias_name: str = None
+class CountDistinctFunc(_AggregateFunc):
+    empty = 0
+
+    def accumulator(self, field):
+        return {'$addToSet': '$' + field}
+
+    def project(self, name):
+        return {
+            '$size': {
+                '$filter': {'input': '$' + name, 'cond': {'$ne': ['$$this', None]}}
+            }
+        }
+
+
+@dataclass
+class CountWildcardFunc(_AggregateFunc):
+    empty = 0
+
+    def accumulator(self, field):
+        return {'$sum': 1}
+
+
+@dataclass
+class SumFunc(_AggregateFunc):
+    operator = '$sum'
+
+
+@dataclass
+class AvgFunc(_AggregateFunc):
+    operator = '$avg'
+
+
+@dataclass
+class MinFunc(_AggregateFunc):
+    operator = '$min'
+
+
+@dataclass
+class MaxFunc(_AggregateFunc):
+    operator = '$max'
+
+
+AGGREGATE_FUNCS = {
+    'COUNT': CountFunc,
+    'SUM': SumFunc,
+    'AVG': AvgFunc,
+    'MIN': MinFunc,
+    'MAX': MaxFunc
+}
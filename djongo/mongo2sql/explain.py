@@ -0,0 +1,65 @@
+import typing
+
+# Keys holding the child stages of a plan stage
+_CHILD_KEYS = ('inputStage', 'inputStages', 'innerStage', 'outerStage')
+
+
+def _find(doc, key: str):
+    """
+    Returns the first value of `key` in the nested explain document. Where
+    it sits depends on the server version and on whether the query was a
+    find or an aggregate.
+    """
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+
+    for child in children:
+        value = _find(child, key)
+        if value is not None:
+            return value
+
+
+def _walk(stage: dict, stages: typing.List[str], indexes: typing.List[str]):
+    stages.append(stage.get('stage'))
+    if 'indexName' in stage:
+        indexes.append(stage['indexName'])
+
+    for key in _CHILD_KEYS:
+        child = stage.get(key)
+        if isinstance(child, dict):
+            _walk(child, stages, indexes)
+        elif isinstance(child, list):
+            for each in child:
+                _walk(each, stages, indexes)
+
+
+def plan_summary(explain: dict) -> dict:
+    """
+    Picks out of MongoDB's explain output the winning plan stages, the
+    indexes it uses, and how many keys and documents it examined to
+    return how many. A COLLSCAN stage, or many more documents examined
+    than returned, points at a missing index.
+    """
+    stages = []
+    indexes = []
+    planner = _find(explain, 'queryPlanner') or {}
+    plan = planner.get('winningPlan') or {}
+    # The slot based engine nests the classic plan
+    plan = plan.get('queryPlan', plan)
+    if plan:
+        _walk(plan, stages, indexes)
+
+    stats = _find(explain, 'executionStats') or {}
+    return {
+        'winning_plan': stages,
+        'indexes': indexes,
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_examined': stats.get('totalDocsExamined'),
+        'returned': stats.get('nReturned'),
+    }
@@ -0,0 +1,171 @@
+import threading
+import time
+import typing
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+
+from pymongo.collection import Collection
+
+STRATEGIES = ('lookup', 'hash', 'auto')
+HASH_JOIN_BATCH_SIZE = 1000
+# $lookup scans of smaller collections are cheap enough
+HASH_JOIN_MIN_ROWS = 1000
+STATS_TTL = 60
+
+
+class HashJoin(typing.NamedTuple):
+    """
+    One join of `hash_join()`: each document whose `local_field` equals
+    the `foreign_field` of rows of `collection` is repeated once per row,
+    holding the row in `as_field`.
+    """
+    collection: Collection
+    local_field: str
+    foreign_field: str
+    as_field: str
+    outer: bool
+    match: typing.Optional[dict] = None
+    projection: typing.Optional[dict] = None
+
+
+def _key(doc: dict, path: str):
+    """
+    Returns the value at the dotted `path` of `doc`, or None when it is
+    missing, null or cannot be hashed.
+    """
+    value = doc
+    for name in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    if isinstance(value, (list, dict)):
+        return None
+    return value
+
+
+def _join_batch(batch: typing.List[dict], join: HashJoin) -> typing.List[dict]:
+    keys = dict.fromkeys(key for key in (_key(doc, join.local_field) for doc in batch)
+                         if key is not None)
+    rows = defaultdict(list)
+    if keys:
+        filter_ = {join.foreign_field: {'$in': list(keys)}}
+        if join.match:
+            filter_ = {'$and': [filter_, join.match]}
+        for row in join.collection.find(filter_, join.projection):
+            rows[_key(row, join.foreign_field)].append(row)
+
+    joined = []
+    for doc in batch:
+        matched = rows.get(_key(doc, join.local_field))
+        if not matched:
+            # Like $unwind with preserveNullAndEmptyArrays, the field is left out
+            if join.outer:
+                joined.append(doc)
+            continue
+
+        for row in matched[:-1]:
+            joined.append({**doc, join.as_field: row})
+        doc[join.as_field] = matched[-1]
+        joined.append(doc)
+
+    return joined
+
+
+def hash_join(
+        docs: typing.Iterable[dict],
+        joins: typing.Sequence[HashJoin],
+        batch_size: int = HASH_JOIN_BATCH_SIZE
+) -> typing.Iterator[dict]:
+    """
+    Joins `docs` with each of `joins` in turn, `batch_size` documents at
+    a time. The rows matching a batch are fetched with one `$in` query
+    per join and matched through a hash table, so each joined collection
+    is queried once per batch instead of once per document. Documents
+    keep their order, and their matching rows the order of the server.
+    """
+    docs = iter(docs)
+    while True:
+        batch = list(islice(docs, batch_size))
+        if not batch:
+            return
+        for join in joins:
+            batch = _join_batch(batch, join)
+        yield from batch
+
+
+class JoinPlanner:
+    """
+    Picks how the joins of a SELECT run. `lookup` sends one aggregation
+    whose $lookup stages query the joined collections once per document.
+    `hash` runs the joins with `hash_join()`. `auto` picks `hash` when a
+    joined collection of at least HASH_JOIN_MIN_ROWS documents has no
+    index led by the joined field, since every $lookup would scan it.
+    A `join_strategy()` block overrides the JOIN_STRATEGY option.
+    Collection sizes and indexes are cached for `ttl` seconds.
+    """
+
+    def __init__(self, ttl: float = STATS_TTL):
+        self.ttl = ttl
+        self._stats: typing.Dict[typing.Tuple[str, str],
+                                 typing.Tuple[float, int, typing.FrozenSet[str]]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def join_strategy(self, strategy: str):
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown join strategy: {strategy}')
+
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(strategy)
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def strategy(self, default: str) -> str:
+        stack = self._local.__dict__.get('stack')
+        if stack:
+            return stack[-1]
+        if default not in STRATEGIES:
+            raise ValueError(f'Unknown join strategy: {default}')
+        return default
+
+    def _collection_stats(self, collection: Collection) -> typing.Tuple[int, typing.FrozenSet[str]]:
+        key = (collection.database.name, collection.name)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._stats.get(key)
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1], cached[2]
+
+        count = collection.estimated_document_count()
+        leading = frozenset(info['key'][0][0]
+                            for info in collection.index_information().values())
+        with self._lock:
+            self._stats[key] = (now, count, leading)
+        return count, leading
+
+    def hash_join_pays(self, joins: typing.Iterable[typing.Tuple[Collection, str]]) -> bool:
+        """
+        True when one of the (collection, field) joins would scan a large
+        collection on every $lookup.
+        """
+        for collection, field in joins:
+            count, leading = self._collection_stats(collection)
+            if count >= HASH_JOIN_MIN_ROWS and field not in leading:
+                return True
+        return False
+
+    def clear(self):
+        """
+        Forgets the cached collection stats. Open `join_strategy()`
+        blocks are left alone.
+        """
+        with self._lock:
+            self._stats.clear()
+
+
+join_planner = JoinPlanner()
+join_strategy = join_planner.join_strategy
@@ -0,0 +1,70 @@
+import threading
+import typing
+from contextlib import contextmanager
+
+from pymongo import IndexModel
+from pymongo.collection import Collection
+
+
+class IndexBuilds:
+    """
+    Builds the indexes of CREATE INDEX statements. Inside a `batch()`
+    block they are queued and sent with one create_indexes call per
+    collection when the block exits, so a collection is scanned once for
+    all its new indexes instead of once per index. Outside a block each
+    index is built right away.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @contextmanager
+    def batch(self):
+        if getattr(self._local, 'pending', None) is not None:
+            # Nested blocks join the outer batch
+            yield
+            return
+
+        pending = self._local.pending = {}
+        try:
+            yield
+        finally:
+            self._local.pending = None
+
+        # Not reached when the block raised, the queued indexes are dropped
+        for collection, indexes in pending.values():
+            if indexes:
+                collection.create_indexes(indexes)
+
+    def create(self, collection: Collection, indexes: typing.List[IndexModel]):
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            collection.create_indexes(indexes)
+            return
+
+        key = (collection.database.name, collection.name)
+        pending.setdefault(key, (collection, []))[1].extend(indexes)
+
+    def queued(self, db_name: str, name: str) -> typing.Optional[str]:
+        """
+        Returns the collection of the queued index `name`, if any.
+        """
+        pending = getattr(self._local, 'pending', None) or {}
+        for (each_db, collection), (_, indexes) in pending.items():
+            if each_db == db_name and any(index.document['name'] == name for index in indexes):
+                return collection
+
+    def drop(self, collection: Collection, name: str):
+        pending = getattr(self._local, 'pending', None) or {}
+        queued = pending.get((collection.database.name, collection.name))
+        if queued is not None:
+            indexes = queued[1]
+            for index in indexes:
+                if index.document['name'] == name:
+                    indexes.remove(index)
+                    return
+
+        collection.drop_index(name)
+
+
+index_builds = IndexBuilds()
@@ -0,0 +1,461 @@
+"""
+Single pass tokenizer and grouper for the SQL dialect emitted by the
+Django compiler.
+
+It builds the same ``sqlparse.sql`` token tree that ``sqlparse.parse``
+(0.2.x) builds, so the converters can consume either one, but replaces
+the generic regex lexer and the multi pass grouping engine with one
+compiled scanner and a trimmed down set of grouping rules. Anything
+outside the dialect makes ``parse`` return ``None`` and the caller falls
+back to sqlparse.
+"""
+import re
+import typing
+
+import sqlparse
+from sqlparse import sql
+from sqlparse import tokens as T
+
+try:
+    from sqlparse.keywords import is_keyword
+except ImportError:
+    is_keyword = None
+
+# The grouping rules below mirror sqlparse 0.2, which is also the token
+# layout the converters are written against.
+ENABLED = is_keyword is not None and sqlparse.__version__.startswith('0.2.')
+
+_LETTER = 'A-ZÀ-Ü'
+
+_TOKEN_RULES = [
+    ('newline', r'\r\n|\r|\n', T.Newline),
+    ('ws', r'\s+', T.Whitespace),
+    ('wildcard', r'\*', T.Wildcard),
+    ('placeholder', r'%(?:\(\w+\))?s', T.Name.Placeholder),
+    ('in', r'(?:CASE|IN|VALUES|USING)\b', T.Keyword),
+    ('name', rf'[{_LETTER}]\w*(?=\s*\.)|(?<=\.)[{_LETTER}]\w*|[{_LETTER}]\w*(?=\()', T.Name),
+    ('hex', r'-?0x[\dA-F]+', T.Number.Hexadecimal),
+    ('float', r'-?\d*(?:\.\d+)?E-?\d+|-?(?:\d+(?:\.\d*)|\.\d+)', T.Number.Float),
+    ('int', rf'-?\d+(?![_{_LETTER}])', T.Number.Integer),
+    ('string', r"'(?:''|\\\\|\\'|[^'])*'", T.String.Single),
+    ('symbol', r'""|".*?[^\\]"', T.String.Symbol),
+    ('join', r'(?:(?:LEFT\s+|RIGHT\s+|FULL\s+)?(?:INNER\s+|OUTER\s+|STRAIGHT\s+)?'
+             r'|(?:CROSS\s+|NATURAL\s+)?)?JOIN\b', T.Keyword),
+    ('notnull', r'NOT\s+NULL\b', T.Keyword),
+    ('word', rf'[0-9_{_LETTER}][_$#\w]*', None),
+    ('punct', r'[(),.]', T.Punctuation),
+    ('cmp', r'[<>=~!]+', T.Operator.Comparison),
+    ('op', r'[+/%^&|-]+', T.Operator),
+]
+
+_TOKEN_RE = re.compile(
+    '|'.join(f'(?P<{name}>{rx})' for name, rx, _ in _TOKEN_RULES),
+    re.IGNORECASE | re.UNICODE
+)
+_TTYPES = {name: ttype for name, _, ttype in _TOKEN_RULES}
+
+# Comments, hints, casts, brackets, sqlite/pg style params and statement
+# separators are never emitted by the Django compiler.
+_UNSUPPORTED = re.compile(r"--|/\*|[#:`´$?@\[\];]")
+
+# Keywords that open block constructs or multi word keywords sqlparse
+# lexes as one token.
+_UNSUPPORTED_KEYWORDS = {
+    'CASE', 'IF', 'FOR', 'FOREACH', 'BEGIN', 'END', 'UNION', 'CREATE', 'DOUBLE'
+}
+
+_STATEMENTS = {'SELECT', 'INSERT', 'UPDATE', 'DELETE'}
+
+_WHERE_CLOSE = {
+    'ORDER', 'GROUP', 'LIMIT', 'UNION', 'UNION ALL', 'EXCEPT',
+    'HAVING', 'RETURNING', 'INTO'
+}
+
+_T_NUMERICAL = (T.Number, T.Number.Integer, T.Number.Float)
+_T_STRING = (T.String, T.String.Single, T.String.Symbol)
+_T_NAME = (T.Name, T.Name.Placeholder)
+
+
+class _Group:
+    """
+    Mutable stand-in for a ``sqlparse.sql.TokenList`` while grouping.
+    Values and parent links are only computed once, in ``_build``.
+    """
+    __slots__ = ('cls', 'tokens')
+
+    is_group = True
+    is_whitespace = False
+    is_keyword = False
+    ttype = None
+    normalized = None
+
+    def __init__(self, cls, tokens):
+        self.cls = cls
+        self.tokens = tokens
+
+    def match(self, ttype, values):
+        return False
+
+
+def parse(sql_str: str) -> typing.Optional[sql.Statement]:
+    if not ENABLED or _UNSUPPORTED.search(sql_str):
+        return None
+
+    toks = _tokenize(sql_str)
+    if toks is None:
+        return None
+
+    for tok in toks:
+        if not tok.is_whitespace:
+            if not (tok.match(T.DML, _STATEMENTS) or tok.match(T.Punctuation, '(')):
+                return None
+            break
+
+    stmt = _group_parenthesis(toks)
+    if stmt is None:
+        return None
+
+    _group_functions(stmt)
+    _group_where(stmt)
+    _group(stmt, sql.Identifier, _match_period, _valid_prev_period,
+           _valid_any, _post_period)
+    _group_identifier(stmt)
+    _group_order(stmt)
+    _group(stmt, sql.Operation, _match_operator, _valid_operand,
+           _valid_operand, _post_operator, extend=False)
+    _group(stmt, sql.Comparison, _match_comparison, _valid_compared,
+           _valid_compared, _post_span, extend=False)
+    _group(stmt, sql.Identifier, _match_as, _valid_prev_as,
+           _valid_next_as, _post_span)
+    _group_aliased(stmt)
+    _group(stmt, sql.IdentifierList, _match_comma, _valid_listed,
+           _valid_listed, _post_span)
+
+    return _build(stmt)
+
+
+def _tokenize(sql_str):
+    toks = []
+    match = _TOKEN_RE.match
+    pos = 0
+    end = len(sql_str)
+    while pos < end:
+        m = match(sql_str, pos)
+        if m is None:
+            return None
+
+        value = m.group()
+        ttype = _TTYPES[m.lastgroup]
+        if ttype is None:
+            ttype, value = is_keyword(value)
+
+        tok = _leaf(ttype, value)
+        if tok.is_keyword and tok.normalized in _UNSUPPORTED_KEYWORDS:
+            return None
+
+        toks.append(tok)
+        pos = m.end()
+
+    return toks
+
+
+def _group_parenthesis(toks):
+    stack = [[]]
+    for tok in toks:
+        if tok.ttype is T.Punctuation:
+            if tok.value == '(':
+                stack.append([tok])
+                continue
+            elif tok.value == ')':
+                if len(stack) == 1:
+                    return None
+                group = stack.pop()
+                group.append(tok)
+                stack[-1].append(_Group(sql.Parenthesis, group))
+                continue
+
+        stack[-1].append(tok)
+
+    if len(stack) != 1:
+        return None
+
+    return _Group(sql.Statement, stack[0])
+
+
+_FLAGS: typing.Dict[typing.Any, typing.Tuple[bool, bool]] = {}
+
+
+def _leaf(ttype, value):
+    # Same attributes as sql.Token.__init__, with the token type
+    # hierarchy checks done once per type instead of once per token.
+    try:
+        is_kw, is_ws = _FLAGS[ttype]
+    except KeyError:
+        is_kw, is_ws = _FLAGS[ttype] = ttype in T.Keyword, ttype in T.Whitespace
+
+    tok = _new_token(sql.Token)
+    tok.value = value
+    tok.ttype = ttype
+    tok.parent = None
+    tok.is_group = False
+    tok.is_keyword = is_kw
+    tok.is_whitespace = is_ws
+    tok.normalized = value.upper() if is_kw else value
+    return tok
+
+
+def _build(group):
+    # Same attributes as sql.TokenList.__init__, with the value joined
+    # from the children instead of flattening every subtree again.
+    children = [_build(tok) if tok.is_group else tok for tok in group.tokens]
+    value = ''.join([tok.value for tok in children])
+
+    grp = _new_token(group.cls)
+    grp.tokens = children
+    for tok in children:
+        tok.parent = grp
+    grp.value = value
+    grp.ttype = None
+    grp.parent = None
+    grp.is_group = True
+    grp.is_keyword = False
+    grp.is_whitespace = False
+    grp.normalized = value
+    return grp
+
+
+_new_token = object.__new__
+
+
+def _token_next(toks, idx):
+    for i in range(idx + 1, len(toks)):
+        if not toks[i].is_whitespace:
+            return i
+    return None
+
+
+def _token_prev(toks, idx):
+    for i in range(idx - 1, -1, -1):
+        if not toks[i].is_whitespace:
+            return i
+    return None
+
+
+def _groupable_end(group):
+    if group.cls is sql.Parenthesis:
+        return len(group.tokens) - 2
+    return len(group.tokens) - 1
+
+
+def _group_tokens(group, cls, start, end, extend=False):
+    toks = group.tokens
+    first = toks[start]
+    if extend and first.is_group and first.cls is cls:
+        first.tokens.extend(toks[start + 1:end + 1])
+        del toks[start + 1:end + 1]
+        return first
+
+    grp = _Group(cls, toks[start:end + 1])
+    toks[start:end + 1] = [grp]
+    return grp
+
+
+def _is_cls(tok, *classes):
+    return tok is not None and tok.is_group and tok.cls in classes
+
+
+def _is_name(tok):
+    return tok.ttype is not None and tok.ttype in T.Name
+
+
+def _sublists(group, skip=None):
+    return [tok for tok in group.tokens if tok.is_group and tok.cls is not skip]
+
+
+def _group_functions(group):
+    for sub in _sublists(group, sql.Function):
+        _group_functions(sub)
+
+    values = {tok.value for tok in group.tokens if not tok.is_group}
+    if 'CREATE' in values and 'TABLE' in values:
+        return
+
+    toks = group.tokens
+    idx = 0
+    while idx < len(toks):
+        if _is_name(toks[idx]):
+            nidx = _token_next(toks, idx)
+            if nidx is not None and _is_cls(toks[nidx], sql.Parenthesis):
+                _group_tokens(group, sql.Function, idx, nidx)
+        idx += 1
+
+
+def _group_where(group):
+    for sub in _sublists(group, sql.Where):
+        _group_where(sub)
+
+    toks = group.tokens
+    idx = 0
+    while idx < len(toks):
+        tok = toks[idx]
+        if tok.ttype is T.Keyword and tok.normalized == 'WHERE':
+            end = _groupable_end(group)
+            for eidx in range(idx + 1, len(toks)):
+                tok = toks[eidx]
+                if tok.ttype is T.Keyword and tok.normalized in _WHERE_CLOSE:
+                    end = eidx - 1
+                    break
+            _group_tokens(group, sql.Where, idx, end)
+        idx += 1
+
+
+def _group_identifier(group):
+    for sub in _sublists(group, sql.Identifier):
+        _group_identifier(sub)
+
+    toks = group.tokens
+    for idx, tok in enumerate(toks):
+        if tok.ttype == T.String.Symbol or tok.ttype == T.Name:
+            toks[idx] = _Group(sql.Identifier, [tok])
+
+
+def _group_order(group):
+    toks = group.tokens
+    idx = 0
+    while idx < len(toks):
+        tok = toks[idx]
+        if tok.ttype is not None and tok.ttype in T.Keyword.Order:
+            pidx = _token_prev(toks, idx)
+            if pidx is not None and (
+                    _is_cls(toks[pidx], sql.Identifier)
+                    or toks[pidx].ttype is not None and toks[pidx].ttype in T.Number):
+                _group_tokens(group, sql.Identifier, pidx, idx)
+                idx = pidx
+        idx += 1
+
+
+_ALIASED = (sql.Parenthesis, sql.Function, sql.Identifier, sql.Operation, sql.Comparison)
+
+
+def _group_aliased(group):
+    for sub in _sublists(group):
+        _group_aliased(sub)
+
+    toks = group.tokens
+    idx = 0
+    while idx < len(toks):
+        tok = toks[idx]
+        if _is_cls(tok, *_ALIASED) or tok.ttype is not None and tok.ttype in T.Number:
+            nidx = _token_next(toks, idx)
+            if nidx is not None and _is_cls(toks[nidx], sql.Identifier):
+                _group_tokens(group, sql.Identifier, idx, nidx, extend=True)
+        idx += 1
+
+
+def _group(group, cls, match, valid_prev, valid_next, post, extend=True):
+    """
+    Port of ``sqlparse.engine.grouping._group``, quirks included: the
+    loop walks a snapshot of the token list, so tokens swallowed by a new
+    group are still visited afterwards.
+    """
+    toks = group.tokens
+    offset = 0
+    pidx = prev = None
+    for idx, tok in enumerate(list(toks)):
+        tidx = idx - offset
+        if tok.is_whitespace:
+            continue
+
+        if tok.is_group and tok.cls is not cls:
+            _group(tok, cls, match, valid_prev, valid_next, post, extend)
+
+        if match(tok):
+            nidx = _token_next(toks, tidx)
+            nxt = toks[nidx] if nidx is not None else None
+            if prev is not None and valid_prev(prev) and valid_next(nxt):
+                start, end = post(toks, pidx, tidx, nidx)
+                grp = _group_tokens(group, cls, start, end, extend)
+                offset += end - start
+                pidx, prev = start, grp
+                continue
+
+        pidx, prev = tidx, tok
+
+
+def _valid_any(_):
+    return True
+
+
+def _post_span(toks, pidx, tidx, nidx):
+    return pidx, nidx
+
+
+def _match_period(tok):
+    return tok.ttype is T.Punctuation and tok.value == '.'
+
+
+def _valid_prev_period(tok):
+    return (_is_cls(tok, sql.Identifier)
+            or tok.ttype == T.Name
+            or tok.ttype == T.String.Symbol)
+
+
+def _post_period(toks, pidx, tidx, nidx):
+    nxt = toks[nidx] if nidx is not None else None
+    if nxt is not None and (_is_cls(nxt, sql.Function)
+                            or nxt.ttype in (T.Name, T.String.Symbol, T.Wildcard)):
+        return pidx, nidx
+    return pidx, tidx
+
+
+def _match_operator(tok):
+    return tok.ttype == T.Operator or tok.ttype == T.Wildcard
+
+
+_OPERAND_CLS = (sql.Parenthesis, sql.Function, sql.Identifier, sql.Operation)
+_OPERAND_TTYPES = _T_NUMERICAL + _T_STRING + _T_NAME
+
+
+def _valid_operand(tok):
+    return tok is not None and (_is_cls(tok, *_OPERAND_CLS)
+                                or tok.ttype in _OPERAND_TTYPES)
+
+
+def _post_operator(toks, pidx, tidx, nidx):
+    toks[tidx].ttype = T.Operator
+    return pidx, nidx
+
+
+def _match_comparison(tok):
+    return tok.ttype == T.Operator.Comparison
+
+
+def _valid_compared(tok):
+    return _valid_operand(tok) or (
+        tok is not None and tok.is_keyword and tok.normalized == 'NULL')
+
+
+def _match_as(tok):
+    return tok.is_keyword and tok.normalized == 'AS'
+
+
+def _valid_prev_as(tok):
+    return tok.normalized == 'NULL' or not tok.is_keyword
+
+
+def _valid_next_as(tok):
+    return tok is not None and tok.ttype not in (T.DML, T.DDL)
+
+
+def _match_comma(tok):
+    return tok.ttype is T.Punctuation and tok.value == ','
+
+
+_LISTED_CLS = (sql.Function, sql.Identifier, sql.Comparison,
+               sql.IdentifierList, sql.Operation)
+_LISTED_TTYPES = _T_NUMERICAL + _T_STRING + _T_NAME + (T.Keyword, T.Comment, T.Wildcard)
+
+
+def _valid_listed(tok):
+    return tok is not None and (_is_cls(tok, *_LISTED_CLS)
+                                or tok.ttype in _LISTED_TTYPES)
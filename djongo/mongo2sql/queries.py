@@ -1,5 +1,7 @@
 import typing
 
+NESTED_IN_CHUNK_SIZE = 10000
+
 
 class Query:
     def __init__(
@@ -14,10 +16,11 @@ class Query:
         self.params = params
 
         self.alias2op: typing.Dict[str, typing.Any] = {}
-        self.nested_query: 'SelectQuery' = None
-        self.nested_query_result: list = None
+        self.nested_in: typing.List['_InNotInOp'] = []
 
         self.left_table: typing.Optional[str] = None
+        # Set by HavingConverter while it builds its ops
+        self.in_having = False
 
         self._cursor = None
         self.parse()
@@ -26,12 +29,154 @@ class Query:
         return
         yield
 
+    async def __aiter__(self):
+        return
+        yield
+
     def parse(self):
         raise NotImplementedError
 
+    def execute(self):
+        """
+        Sends the statement translated by parse() to MongoDB. SELECTs
+        are sent lazily, when their rows are fetched.
+        """
+        pass
+
+    async def aexecute(self):
+        """
+        The asyncio counterpart of execute(), run by AsyncResult.
+        """
+        pass
+
     def count(self):
         raise NotImplementedError
 
+    @property
+    def write_buffer(self) -> typing.Optional['WriteBuffer']:
+        """
+        The buffer queuing the writes of the connection while it is in
+        an atomic block, if any.
+        """
+        buffer = self._result_ref.write_buffer
+        return buffer if buffer is not None and buffer.active else None
+
+    def index_shapes(self) -> typing.List[typing.Tuple[str, 'QueryShape']]:
+        """
+        Returns the shape of the statement on each collection it filters,
+        for the index advisor.
+        """
+        return []
+
+    def _where_shape(self, where: typing.Optional['WhereConverter']) -> 'QueryShape':
+        shape = QueryShape()
+        if where:
+            where.op.add_to_shape(shape)
+        return shape
+
+    def _matched_id_chunks(self, where: 'WhereConverter'):
+        """
+        Yields filters selecting, a chunk at a time, the documents matched
+        by a WHERE holding nested IN lookups. update_many and delete_many
+        take no pipeline, so the matching _ids are read from one. SQL runs
+        the subquery once, so all of them are read before the first chunk
+        is written, which would otherwise change what later chunks match.
+        """
+        cursor = self._result_ref.db[self.left_table].aggregate(
+            self._matched_id_pipeline(where), batchSize=NESTED_IN_CHUNK_SIZE)
+        yield from _id_chunks([doc['_id'] for doc in cursor])
+
+    def _matched_id_pipeline(self, where: 'WhereConverter') -> list:
+        pipeline = [op.lookup() for op in self.nested_in]
+        where.__class__ = AggWhereConverter
+        pipeline.append(where.to_mongo())
+        pipeline.append({'$project': {'_id': True}})
+        return pipeline
+
+    async def _achunks(self):
+        """
+        Yields the filters of an UPDATE or DELETE, reading the matched
+        _ids of nested IN lookups like _matched_id_chunks() does.
+        """
+        if isinstance(self._chunks, list):
+            for kwargs in self._chunks:
+                yield kwargs
+            return
+
+        cursor = await self._result_ref.db[self.left_table].aggregate(
+            self._matched_id_pipeline(self.where), batchSize=NESTED_IN_CHUNK_SIZE)
+        for kwargs in _id_chunks([doc['_id'] async for doc in cursor]):
+            yield kwargs
+
+
+def _id_chunks(ids: list) -> typing.Iterator[dict]:
+    for start in range(0, len(ids), NESTED_IN_CHUNK_SIZE):
+        yield {'filter': {'_id': {'$in': ids[start:start + NESTED_IN_CHUNK_SIZE]}}}
+
+
+def row_extractor(paths: typing.List[typing.Tuple[str, typing.Optional[str]]]):
+    """
+    Builds a function returning the row tuple of a document. Each path is
+    a (field, subfield) pair, subfield being set for columns of joined
+    tables. Missing fields read as None.
+    """
+    fields = [field for field, _ in paths]
+
+    def extract_missing(doc):
+        return tuple(doc.get(field) for field in fields)
+
+    if any(subfield is not None for _, subfield in paths):
+        def extract(doc):
+            row = []
+            for field, subfield in paths:
+                value = doc.get(field)
+                if subfield is not None:
+                    value = value.get(subfield) if value is not None else None
+                row.append(value)
+            return tuple(row)
+
+        return extract
+
+    if not fields:
+        return lambda doc: ()
+
+    getter = itemgetter(*fields)
+    if len(fields) == 1:
+        def extract(doc):
+            try:
+                return getter(doc),
+            except KeyError:
+                return extract_missing(doc)
+    else:
+        def extract(doc):
+            try:
+                return getter(doc)
+            except KeyError:
+                return extract_missing(doc)
+
+    return extract
+
+
+def and_filter(ops: typing.List['_Op']) -> dict:
+    if len(ops) == 1:
+        return ops[0].to_mongo()
+    return {'$and': [op.to_mongo() for op in ops]}
+
+
+def relative_filter(filter_: dict, table: str) -> dict:
+    """
+    Rewrites the `table.column` fields of a filter as `column`, for use
+    inside the $lookup pipeline of `table`.
+    """
+    start = len(table) + 1
+    relative = {}
+    for field, value in filter_.items():
+        if field in ('$and', '$or'):
+            relative[field] = [relative_filter(each, table) for each in value]
+        else:
+            relative[field[start:]] = value
+    return relative
+
 
 class SelectQuery(Query):
     def __init__(self, *args):
@@ -43,10 +188,18 @@ class SelectQuery(Query):
         ]] = []
         self.order: OrderConverter = None
         self.limit: typing.Optional[LimitConverter] = None
+        self.offset: typing.Optional[OffsetConverter] = None
+        self.groupby: typing.Optional[GroupbyConverter] = None
+        self.having: typing.Optional[HavingConverter] = None
         self.distinct: SQLToken = None
 
+        self.batch_size: typing.Optional[int] = None
         self._returned_count = 0
+        self._first_fields: typing.Dict[str, str] = OrderedDict()
         self._cursor: typing.Union[BasicCursor, CommandCursor] = None
+        self._rows: typing.Optional[typing.Iterator[tuple]] = None
+        self._hash_plan: typing.Optional[typing.List[HashJoin]] = None
+        self._joins_planned = False
         super().__init__(*args)
 
     def parse(self):
@@ -63,9 +216,18 @@ class SelectQuery(Query):
             elif tok.match(tokens.Keyword, 'LIMIT'):
                 c = self.limit = LimitConverter(self, tok_id)
 
+            elif tok.match(tokens.Keyword, 'OFFSET'):
+                c = self.offset = OffsetConverter(self, tok_id)
+
             elif tok.match(tokens.Keyword, 'ORDER'):
                 c = self.order = OrderConverter(self, tok_id)
 
+            elif tok.match(tokens.Keyword, 'GROUP'):
+                c = self.groupby = GroupbyConverter(self, tok_id)
+
+            elif tok.match(tokens.Keyword, 'HAVING'):
+                c = self.having = HavingConverter(self, tok_id)
+
             elif tok.match(tokens.Keyword, 'INNER JOIN'):
                 c = InnerJoinConverter(self, tok_id)
                 self.joins.append(c)
@@ -88,100 +250,736 @@ class SelectQuery(Query):
                 yield self.selected_columns.return_const,
             return
 
+        elif self.aggregated:
+            yield from self._aggregate_rows()
+            return
+
         elif self.selected_columns.return_count:
             yield self.count(),
             return
 
         else:
-            if self._cursor is None:
-                self._cursor = self._get_cursor()
-
-            cur = self._cursor
-            for doc in cur:
-                if isinstance(cur, BasicCursor):                    
-                    if len(doc) - 1 == len(self.selected_columns.sql_tokens):
-                        doc.pop('_id')
-                        yield tuple(doc.values())
-                    else:
-                        yield self._align_results(doc)
-                else:
-                    yield self._align_results(doc)
+            yield from self._fetch_rows(self._row_extractor())
             return
 
-    def count(self):
+    async def __aiter__(self):
+        if self.selected_columns.return_const is not None:
+            for _ in range(await self.acount()):
+                yield self.selected_columns.return_const,
 
-        if self._cursor is None:
-            self._cursor = self._get_cursor()
+        elif self.aggregated:
+            fields = self._aggregate_fields()
+            empty = True
+            async for row in self._afetch_rows(row_extractor([(field, None) for field in fields])):
+                empty = False
+                yield row
+
+            if empty and self.groupby is None:
+                yield self._empty_aggregate_row(fields)
+
+        elif self.selected_columns.return_count:
+            yield await self.acount(),
 
-        if isinstance(self._cursor, BasicCursor):
-            return self._cursor.count()
         else:
-            return len(list(self._cursor))
+            async for row in self._afetch_rows(self._row_extractor()):
+                yield row
+
+    @property
+    def aggregated(self):
+        return (self.groupby is not None
+                or (self.selected_columns.aggregates and not self.selected_columns.return_count))
+
+    def field_path(self, table: str, column: str) -> str:
+        if table == self.left_table:
+            return column
+        return f'{table}.{column}'
+
+    def group_field(self, sql: 'SQLToken') -> str:
+        """
+        Returns the field holding the value of `sql` after the $group
+        stage. Columns that are not grouped keep their first value.
+        """
+        field = self.selected_columns.alias_field(sql.column)
+        if field is not None:
+            return field
+
+        path = self.field_path(sql.table, sql.column)
+        if self.groupby:
+            for i, key in enumerate(self.groupby.sql_tokens):
+                if self.field_path(key.table, key.column) == path:
+                    return f'key{i}'
+
+        field = self._first_fields.get(path)
+        if field is None:
+            field = self._first_fields[path] = f'first{len(self._first_fields)}'
+        return field
+
+    def _group_stages(self):
+        group = {'_id': self.groupby.to_mongo() if self.groupby else None}
+        project = {'_id': False}
+        if self.groupby:
+            for key in group['_id']:
+                project[key] = '$_id.' + key
+
+        for field, func in self.selected_columns.aggregates.items():
+            path = None
+            if func.column_name is not None:
+                path = self.field_path(func.table_name, func.column_name)
+            group[field] = func.accumulator(path)
+            project[field] = func.project(field)
+
+        for path, field in self._first_fields.items():
+            group[field] = {'$first': '$' + path}
+            project[field] = True
+
+        return [{'$group': group}, {'$project': project}]
+
+    def _aggregate_fields(self) -> typing.List[str]:
+        return [
+            self.group_field(selected) if isinstance(selected, SQLToken) else selected
+            for selected in self.selected_columns.selected
+        ]
+
+    def _empty_aggregate_row(self, fields: typing.List[str]) -> tuple:
+        # Aggregates without GROUP BY return one row even over no rows
+        aggregates = self.selected_columns.aggregates
+        return tuple(aggregates[field].empty if field in aggregates else None
+                     for field in fields)
+
+    def _aggregate_rows(self):
+        fields = self._aggregate_fields()
+        extract = row_extractor([(field, None) for field in fields])
+        empty = True
+        for row in self._fetch_rows(extract):
+            empty = False
+            yield row
+
+        if empty and self.groupby is None:
+            yield self._empty_aggregate_row(fields)
 
-    def _get_cursor(self):
-        if self.nested_query:
-            self.nested_query_result = [res[0] for res in iter(self.nested_query)]
+    def count(self):
+        if not timings.enabled:
+            return self._count()
 
-        if self.joins:
-            pipeline = []
-            for join in self.joins:
-                pipeline.extend(join.to_mongo())
+        start = perf_counter()
+        count = self._count()
+        timings.emit('execute', perf_counter() - start, self.left_table, 'SELECT')
+        return count
 
-            if self.where:
-                self.where.__class__ = AggWhereConverter
-                pipeline.append(self.where.to_mongo())
+    def _count(self):
+        if self.distinct:
+            if self._cursor is None:
+                self._cursor = self._get_cursor()
+            return len(self._cursor)
 
-            if self.order:
-                self.order.__class__ = AggOrderConverter
-                pipeline.append(self.order.to_mongo())
+        if self.aggregated and self.groupby is None:
+            return 1
 
-            if self.limit:
-                self.limit.__class__ = AggLimitConverter
-                pipeline.append(self.limit.to_mongo())
+        collection = self._collection()
 
-            if self.selected_columns:
-                self.selected_columns.__class__ = AggColumnSelectConverter
-                pipeline.append(self.selected_columns.to_mongo())
+        if self.pipelined:
+            counted = list(collection.aggregate(self._pipeline(count=True)))
+            return counted[0]['count'] if counted else 0
 
-            cur = self._result_ref.db[self.left_table].aggregate(pipeline)
-            return cur
+        kwargs = self._find_kwargs(count=True)
+        if not kwargs:
+            return collection.estimated_document_count()
 
-        else:
-            kwargs = {}
-            if self.where:
-                kwargs.update(self.where.to_mongo())
+        return collection.count_documents(kwargs.pop('filter', {}), **kwargs)
+
+    async def acount(self):
+        if not timings.enabled:
+            return await self._acount()
+
+        start = perf_counter()
+        count = await self._acount()
+        timings.emit('execute', perf_counter() - start, self.left_table, 'SELECT')
+        return count
 
-            if self.selected_columns:
-                kwargs.update(self.selected_columns.to_mongo())
+    async def _acount(self):
+        if self.distinct:
+            if self._cursor is None:
+                self._cursor = await self._aget_cursor()
+            return len(self._cursor)
+
+        if self.aggregated and self.groupby is None:
+            return 1
+
+        collection = self._collection()
+
+        if self.pipelined:
+            cursor = await collection.aggregate(self._pipeline(count=True))
+            counted = await cursor.to_list()
+            return counted[0]['count'] if counted else 0
+
+        kwargs = self._find_kwargs(count=True)
+        if not kwargs:
+            return await collection.estimated_document_count()
+
+        return await collection.count_documents(kwargs.pop('filter', {}), **kwargs)
+
+    @property
+    def fast_decode(self):
+        # distinct() returns bare values, and hash joins joined documents
+        return (bool(self._result_ref.options.get('FAST_DECODE')) and not self.distinct
+                and self._hash_joins() is None)
+
+    @property
+    def pipelined(self):
+        return bool(self.joins or self.nested_in or self.aggregated)
+
+    def index_shapes(self):
+        shape = self._where_shape(self.where)
+        # Only sorts ahead of any $lookup or $group can use an index
+        if self._sorts_first:
+            shape.sort.extend((tok.column, tok_ord.order) for tok, tok_ord in self.order.columns)
+        shapes = [(self.left_table, shape)]
+
+        for join in self.joins:
+            joined = QueryShape()
+            joined.equality.append(join.right_column)
+            shapes.append((join.right_table, joined))
+
+        for op in self.nested_in:
+            nested = op._nested
+            nested_shapes = nested.index_shapes()
+            # The $lookup pipeline matches the selected column
+            selected = nested.distinct or next(iter(nested.selected_columns.sql_tokens), None)
+            if (not nested.aggregated and selected is not None
+                    and selected.table == nested.left_table):
+                nested_shapes[0][1].equality.append(selected.column)
+            shapes.extend(nested_shapes)
+
+        return shapes
+
+    def in_pipeline(self) -> list:
+        """
+        Returns the pipeline of this query as the nested SELECT of an IN,
+        keeping at most one row whose value equals the `value` variable.
+        """
+        if self.distinct:
+            path = self.field_path(self.distinct.table, self.distinct.column)
+        elif self.aggregated:
+            selected = self.selected_columns.selected[0]
+            path = self.group_field(selected) if isinstance(selected, SQLToken) else selected
+        else:
+            selected = self.selected_columns.sql_tokens[0]
+            path = self.field_path(selected.table, selected.column)
+
+        pipeline = self._pipeline(project=False)
+        pipeline.append({'$match': {'$expr': {'$eq': ['$' + path, '$$value']}}})
+        pipeline.append({'$limit': 1})
+        return pipeline
+
+    def _pipeline(self, count=False, project=True):
+        pushed, kept = self._split_where()
+        pipeline = []
+        if pushed:
+            pipeline.append({'$match': and_filter(pushed)})
+
+        sort_first = self._sorts_first and not count
+        if sort_first:
+            self.order.__class__ = AggOrderConverter
+            pipeline.append(self.order.to_mongo())
+
+        columns = None
+        matches = {}
+        if self._result_ref.options.get('JOIN_PIPELINES', True):
+            columns = self._joined_columns()
+            matches = self._join_matches(kept)
+        paged = self._paged_joins(kept, count)
+        for join in self.joins[:paged]:
+            pipeline.extend(join.to_mongo(columns and columns[join.right_table],
+                                          matches.get(join.right_table)))
+
+        for op in self.nested_in:
+            pipeline.append(op.lookup())
+
+        if kept:
+            pipeline.append({'$match': and_filter(kept)})
+
+        if self.aggregated:
+            return pipeline + self._group_pipeline(count)
+
+        if self.order and not count and not sort_first:
+            self.order.__class__ = AggOrderConverter
+            pipeline.append(self.order.to_mongo())
+
+        if self.offset:
+            self.offset.__class__ = AggOffsetConverter
+            pipeline.append(self.offset.to_mongo())
+
+        if self.limit:
+            self.limit.__class__ = AggLimitConverter
+            pipeline.append(self.limit.to_mongo())
+
+        if count:
+            # The joins after the page neither drop nor repeat rows
+            pipeline.append({'$count': 'count'})
+            return pipeline
+
+        for join in self.joins[paged:]:
+            pipeline.extend(join.to_mongo(columns and columns[join.right_table]))
+
+        if self.selected_columns and project:
+            self.selected_columns.__class__ = AggColumnSelectConverter
+            pipeline.append(self.selected_columns.to_mongo())
+
+        return pipeline
+
+    def _split_where(self) -> typing.Tuple[typing.List['_Op'], typing.List['_Op']]:
+        """
+        Splits the WHERE into the conjuncts reading only the left table,
+        which filter it ahead of the first $lookup, and the others, which
+        run after the lookups.
+        """
+        if not self.where:
+            return [], []
+
+        if not (self.joins or self.nested_in):
+            return [self.where.op], []
+
+        pushed, kept = [], []
+        for op in self.where.op.conjuncts():
+            if all(table == self.left_table for table, _ in op.columns()):
+                pushed.append(op)
+            else:
+                kept.append(op)
+        return pushed, kept
+
+    def _join_matches(self, kept: typing.List['_Op']) -> typing.Dict[str, dict]:
+        """
+        Moves the conjuncts in `kept` reading only the right table of an
+        inner join into the $lookup pipeline of that join, so the rows
+        they reject are never joined. Returns the filters by table.
+        """
+        inner = {join.right_table for join in self.joins
+                 if isinstance(join, InnerJoinConverter)}
+        moved = {}
+        for op in list(kept):
+            tables = {table for table, _ in op.columns()}
+            if len(tables) == 1 and tables <= inner:
+                moved.setdefault(tables.pop(), []).append(op)
+                kept.remove(op)
+
+        return {table: relative_filter(and_filter(ops), table)
+                for table, ops in moved.items()}
+
+    @property
+    def _sorts_first(self) -> bool:
+        """
+        True when the query sorts on columns of the left table only, so
+        the $sort can run ahead of the lookups, where an index serves it.
+        """
+        return bool(self.order and not self.aggregated
+                    and all(tok.table == self.left_table for tok, _ in self.order.columns))
+
+    def _paged_joins(self, kept: typing.List['_Op'], count: bool) -> int:
+        """
+        Returns how many joins run before $skip and $limit. The trailing
+        outer joins that match at most one row, and that nothing before
+        the page reads, run after it on the paged rows only.
+        """
+        paged = len(self.joins)
+        if (self.aggregated or self.distinct
+                or not (count or self.limit or self.offset)
+                or not (count or not self.order or self._sorts_first)):
+            return paged
+
+        read = {table for op in kept for table, _ in op.columns()}
+        while (paged and isinstance(self.joins[paged - 1], OuterJoinConverter)
+               and self.joins[paged - 1].to_one
+               and self.joins[paged - 1].right_table not in read):
+            paged -= 1
+        return paged
+
+    def _joined_columns(self) -> typing.Optional[typing.Dict[str, typing.Set[str]]]:
+        """
+        Returns the columns the query reads from the left table and from
+        each joined table, or None when whole rows are needed.
+        """
+        if self.selected_columns.select_all or self.having:
+            return None
+
+        read = [(tok.table, tok.column) for tok in self.selected_columns.sql_tokens]
+        read.extend((func.table_name, func.column_name)
+                    for func in self.selected_columns.aggregates.values())
+        read.extend((join.left_table, join.left_column) for join in self.joins)
+        if self.distinct:
+            read.append((self.distinct.table, self.distinct.column))
+        if self.order:
+            read.extend((tok.table, tok.column) for tok, _ in self.order.columns)
+        if self.groupby:
+            read.extend((tok.table, tok.column) for tok in self.groupby.sql_tokens)
+        if self.where:
+            read.extend(self.where.op.columns())
+
+        columns = {join.right_table: set() for join in self.joins}
+        columns[self.left_table] = set()
+        for table, column in read:
+            if table in columns:
+                columns[table].add(column)
+        return columns
+
+    def _hash_joins(self) -> typing.Optional[typing.List[HashJoin]]:
+        """
+        Returns the joins to run with `hash_join()`, or None when the
+        query runs as one $lookup aggregation. Only queries whose filters
+        and sort can run on the left collection or inside a join qualify.
+        """
+        if self._joins_planned:
+            return self._hash_plan
+        self._joins_planned = True
+
+        strategy = join_planner.strategy(
+            self._result_ref.options.get('JOIN_STRATEGY', 'lookup'))
+        # hash_join() runs on the blocking driver
+        if (strategy == 'lookup' or self._result_ref.asynchronous
+                or not self.joins or self.aggregated
+                or self.distinct or self.nested_in
+                or (self.order and not self._sorts_first)):
+            return None
+
+        _, kept = self._split_where()
+        matches = self._join_matches(kept)
+        if kept:
+            return None
 
+        db = self._result_ref.db
+        if strategy == 'auto' and not join_planner.hash_join_pays(
+                (db[join.right_table], join.right_column) for join in self.joins):
+            return None
+
+        columns = self._joined_columns()
+        pin = self._result_ref.options.get('READ_AFTER_WRITE_PIN', 5)
+        self._hash_plan = []
+        for join in self.joins:
+            projection = None
+            if columns is not None:
+                projection = dict.fromkeys(
+                    sorted(columns[join.right_table] | {join.right_column}), True)
+                projection.setdefault('_id', False)
+            self._hash_plan.append(HashJoin(
+                collection=read_router.route(db[join.right_table], pin),
+                local_field=join.local_field,
+                foreign_field=join.right_column,
+                as_field=join.right_table,
+                outer=isinstance(join, OuterJoinConverter),
+                match=matches.get(join.right_table),
+                projection=projection
+            ))
+        return self._hash_plan
+
+    def _hash_find_kwargs(self) -> typing.Tuple[dict, int]:
+        """
+        Returns the find() arguments reading the left collection of a
+        hash joined query, with the number of joins to run before paging.
+        """
+        pushed, _ = self._split_where()
+        paged = self._paged_joins([], False)
+        kwargs = {'filter': and_filter(pushed) if pushed else {}}
+
+        columns = self._joined_columns()
+        if columns is not None:
+            projection = dict.fromkeys(sorted(columns[self.left_table]), True)
+            projection.setdefault('_id', False)
+            kwargs['projection'] = projection
+
+        if self.order:
+            self.order.__class__ = OrderConverter
+            kwargs.update(self.order.to_mongo())
+
+        # Joins that keep every row let the server page
+        if not paged:
+            if self.offset:
+                self.offset.__class__ = OffsetConverter
+                kwargs.update(self.offset.to_mongo())
             if self.limit:
+                self.limit.__class__ = LimitConverter
                 kwargs.update(self.limit.to_mongo())
 
-            if self.order:
-                kwargs.update(self.order.to_mongo())
+        return kwargs, paged
+
+    def _hash_joined_docs(self) -> typing.Iterator[dict]:
+        kwargs, paged = self._hash_find_kwargs()
+        batch_size = (self.batch_size or self._result_ref.options.get('FETCH_BATCH_SIZE')
+                      or HASH_JOIN_BATCH_SIZE)
+        docs = hash_join(self._collection().find(batch_size=batch_size, **kwargs),
+                         self._hash_plan, batch_size)
+        if paged and (self.offset or self.limit):
+            start = self.offset.offset if self.offset else 0
+            stop = start + self.limit.limit if self.limit else None
+            docs = islice(docs, start, stop)
+        return docs
+
+    def _group_pipeline(self, count=False):
+        sort = None
+        if self.order and not count:
+            self.order.__class__ = GroupOrderConverter
+            sort = self.order.to_mongo()
 
-            cur = self._result_ref.db[self.left_table].find(**kwargs)
+        pipeline = self._group_stages()
+        if self.having:
+            pipeline.append(self.having.to_mongo())
 
-            if self.distinct:
-                cur = cur.distinct(self.distinct.column)
+        if sort:
+            pipeline.append(sort)
 
-            return cur
+        if self.offset:
+            self.offset.__class__ = AggOffsetConverter
+            pipeline.append(self.offset.to_mongo())
 
-    def _align_results(self, doc):
-        ret = []
+        if self.limit:
+            self.limit.__class__ = AggLimitConverter
+            pipeline.append(self.limit.to_mongo())
+
+        if count:
+            pipeline.append({'$count': 'count'})
+
+        return pipeline
+
+    def _find_kwargs(self, count=False):
+        kwargs = {}
+        if self.where:
+            kwargs.update(self.where.to_mongo())
+
+        if self.offset:
+            kwargs.update(self.offset.to_mongo())
+
+        if self.limit:
+            kwargs.update(self.limit.to_mongo())
+
+        if count:
+            return kwargs
+
+        if self.selected_columns:
+            kwargs.update(self.selected_columns.to_mongo())
+
+        if self.order:
+            kwargs.update(self.order.to_mongo())
+
+        return kwargs
+
+    def explain(self) -> dict:
+        """
+        Returns the filter or pipeline sent to MongoDB with the plan the
+        server picks for it. No row is fetched.
+        """
+        collection = self._collection()
+        if self._hash_joins() is not None:
+            # The joins run in the client, only the left collection is explained
+            query, _ = self._hash_find_kwargs()
+            explained = collection.find(**query).explain()
+            query['hash_joins'] = [join.as_field for join in self._hash_plan]
+        elif self.pipelined:
+            pipeline = self._pipeline()
+            query = {'pipeline': pipeline}
+            explained = self._result_ref.db.command(
+                'explain',
+                {'aggregate': self.left_table, 'pipeline': pipeline, 'cursor': {}},
+                verbosity='executionStats',
+                read_preference=collection.read_preference
+            )
+        else:
+            query = self._find_kwargs()
+            explained = collection.find(**query).explain()
+
+        return {
+            'collection': self.left_table,
+            **query,
+            **plan_summary(explained),
+            'explain': explained
+        }
+
+    def _collection(self):
+        return read_router.route(self._result_ref.db[self.left_table],
+                                 self._result_ref.options.get('READ_AFTER_WRITE_PIN', 5))
+
+    def _cursor_request(self) -> typing.Tuple[str, tuple, dict]:
+        """
+        Returns the name of the collection method opening the cursor of
+        the query, and its arguments.
+        """
+        batch_size = self.batch_size or self._result_ref.options.get('FETCH_BATCH_SIZE')
+
+        if self.pipelined:
+            pipeline = self._pipeline()
+            kwargs = {'batchSize': batch_size} if batch_size else {}
+            if self.fast_decode:
+                project = pipeline[-1].get('$project')
+                if project is not None and '_id' not in project:
+                    project['_id'] = False
+                return 'aggregate_raw_batches', (pipeline,), kwargs
+
+            return 'aggregate', (pipeline,), kwargs
+
+        kwargs = self._find_kwargs()
+        if batch_size:
+            kwargs['batch_size'] = batch_size
+
+        if self.fast_decode:
+            projection = kwargs.get('projection')
+            if projection is not None and '_id' not in projection:
+                kwargs['projection'] = {**dict.fromkeys(projection, True), '_id': False}
+            return 'find_raw_batches', (), kwargs
+
+        return 'find', (), kwargs
+
+    def _get_cursor(self):
+        if self._hash_joins() is not None:
+            return self._hash_joined_docs()
+
+        method, args, kwargs = self._cursor_request()
+        cur = getattr(self._collection(), method)(*args, **kwargs)
+        if self.distinct and method == 'find':
+            cur = cur.distinct(self.distinct.column)
+
+        return cur
+
+    async def _aget_cursor(self):
+        method, args, kwargs = self._cursor_request()
+        cur = getattr(self._collection(), method)(*args, **kwargs)
+        if method.startswith('aggregate'):
+            # Unlike find(), AsyncCollection.aggregate() is a coroutine
+            cur = await cur
+        elif self.distinct and method == 'find':
+            cur = await cur.distinct(self.distinct.column)
+
+        return cur
+
+    def _fetch_rows(self, extract) -> typing.Iterator[tuple]:
+        """
+        Returns the iterator over the rows of the query, opening the
+        cursor on first use. In FAST_DECODE mode every raw batch is
+        decoded at once into plain dicts, skipping the OrderedDict
+        document class and the per document cursor overhead.
+        """
+        if self._rows is not None:
+            return self._rows
+
+        if timings.enabled:
+            start = perf_counter()
+            if self._cursor is None:
+                self._cursor = self._get_cursor()
+            self._rows = self._timed_rows(extract, perf_counter() - start)
+            return self._rows
+
+        if self._cursor is None:
+            self._cursor = self._get_cursor()
+
+        codec_options = self._codec_options()
+        if codec_options is None:
+            self._rows = map(extract, self._cursor)
+            return self._rows
+
+        self._rows = chain.from_iterable(
+            map(extract, decode_all(batch, codec_options)) for batch in self._cursor
+        )
+        return self._rows
+
+    def _timed_rows(self, extract, opened: float):
+        """
+        Yields the rows of _fetch_rows while adding up the time spent
+        waiting on MongoDB apart from the time spent building rows.
+        """
+        codec_options = self._codec_options()
+        cursor = iter(self._cursor)
+        times = [opened, 0.0]
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    fetched = next(cursor)
+                except StopIteration:
+                    times[0] += perf_counter() - start
+                    return
+
+                yield from self._timed_decode(extract, fetched, codec_options, start, times)
+        finally:
+            self._emit_fetch_times(times)
+
+    async def _afetch_rows(self, extract):
+        """
+        The asyncio counterpart of _fetch_rows(), timed like _timed_rows().
+        """
+        opened = perf_counter()
+        if self._cursor is None:
+            self._cursor = await self._aget_cursor()
+        times = [perf_counter() - opened, 0.0]
+
+        try:
+            if isinstance(self._cursor, list):
+                # distinct() returns all the values at once
+                for value in self._cursor:
+                    yield extract(value)
+                return
+
+            codec_options = self._codec_options()
+            cursor = self._cursor.__aiter__()
+            while True:
+                start = perf_counter()
+                try:
+                    fetched = await cursor.__anext__()
+                except StopAsyncIteration:
+                    times[0] += perf_counter() - start
+                    return
+
+                for row in self._timed_decode(extract, fetched, codec_options, start, times):
+                    yield row
+        finally:
+            if timings.enabled:
+                self._emit_fetch_times(times)
+
+    def _codec_options(self):
+        """
+        Returns the codec options FAST_DECODE batches are decoded with, or
+        None when the cursor returns documents.
+        """
+        if not self.fast_decode:
+            return None
+        return self._result_ref.db[self.left_table].codec_options.with_options(
+            document_class=dict)
+
+    @staticmethod
+    def _timed_decode(extract, fetched, codec_options, start: float, times: list):
+        """
+        Builds the rows of what the cursor returned, adding the time since
+        `start` spent waiting on MongoDB and the time spent building rows
+        to `times`.
+        """
+        built = perf_counter()
+        if codec_options is not None:
+            rows = list(map(extract, decode_all(fetched, codec_options)))
+        else:
+            rows = extract(fetched),
+        end = perf_counter()
+
+        times[0] += built - start
+        times[1] += end - built
+        return rows
+
+    def _emit_fetch_times(self, times: list):
+        execute, decode = times
+        timings.emit('execute', execute, self.left_table, 'SELECT')
+        timings.emit('decode', decode, self.left_table, 'SELECT')
+
+    def _row_extractor(self):
+        """
+        Resolves the selected columns once into a function that turns a
+        returned document into a row tuple.
+        """
+        if self.distinct:
+            # distinct() returns the bare values
+            return lambda value: (value,)
+
+        paths = []
         for selected in self.selected_columns.sql_tokens:
             if selected.table == self.left_table:
-                try:
-                    ret.append(doc[selected.column])
-                except KeyError:
-                    ret.append(None)  # This is a silent failure
+                paths.append((selected.column, None))
             else:
-                try:
-                    ret.append(doc[selected.table][selected.column])
-                except KeyError:
-                    ret.append(None)  # This is a silent failure.
+                paths.append((selected.table, selected.column))
 
-        return ret
+        return row_extractor(paths)
 
 
 class UpdateQuery(Query):
@@ -190,14 +988,13 @@ class UpdateQuery(Query):
         self.selected_table: ColumnSelectConverter = None
         self.set_columns: SetConverter = None
         self.where: WhereConverter = None
-        self.result = None
+        self.modified_count = 0
         super().__init__(*args)
 
     def count(self):
-        return self.result.modified_count
+        return self.modified_count
 
     def parse(self):
-        db = self._result_ref.db
         tok_id = 0
         tok: Token = self.statement[0]
 
@@ -217,90 +1014,254 @@ class UpdateQuery(Query):
 
             tok_id, tok = self.statement.token_next(c.end_id)
 
-        kwargs = {}
-        if self.where:
-            kwargs.update(self.where.to_mongo())
-
-        kwargs.update(self.set_columns.to_mongo())
-        self.result = db[self.left_table].update_many(**kwargs)
-        logger.debug(f'update_many: {self.result.modified_count}, matched: {self.result.matched_count}')
+        if self._result_ref.options.get('NULL_SAFE_UPDATES', True):
+            non_null = self._non_null_columns()
+        else:
+            # Pipeline updates need MongoDB 4.2
+            non_null = None
+        self._update = self.set_columns.to_mongo(non_null)
+        if self.nested_in:
+            self._chunks = self._matched_id_chunks(self.where)
+        elif self.where:
+            self._chunks = [self.where.to_mongo()]
+        else:
+            self._chunks = [{'filter': {}}]
+
+    def execute(self):
+        collection = self._result_ref.db[self.left_table]
+        buffer = self.write_buffer
+        if buffer is not None:
+            if isinstance(self._chunks, list):
+                # Django reads the row count right away, so the update
+                # goes out now, in the same bulk_write as queued writes
+                # to its collection
+                result = buffer.flush(collection, UpdateMany(
+                    self._chunks[0]['filter'], self._update['update']))
+                self.modified_count = result.modified_count
+                return
+            buffer.flush()
+            buffer.sent()
+
+        for kwargs in self._chunks:
+            result = collection.update_many(**kwargs, **self._update)
+            self.modified_count += result.modified_count
+            logger.debug('update_many: %s, matched: %s',
+                         result.modified_count, result.matched_count)
+
+    async def aexecute(self):
+        collection = self._result_ref.db[self.left_table]
+        async for kwargs in self._achunks():
+            result = await collection.update_many(**kwargs, **self._update)
+            self.modified_count += result.modified_count
+            logger.debug('update_many: %s, matched: %s',
+                         result.modified_count, result.matched_count)
+
+    def _non_null_columns(self) -> typing.Set[str]:
+        """
+        Returns the columns the WHERE only matches non-null values of.
+        """
+        if self.where is None:
+            return set()
+        return {op.non_null_column() for op in self.where.op.conjuncts()
+                if isinstance(op, CmpOp)} - {None}
+
+    def index_shapes(self):
+        return [(self.left_table, self._where_shape(self.where))]
 
 
 class InsertQuery(Query):
 
+    def __init__(self, *args):
+        self.columns: typing.List[str] = []
+        self.values: typing.List[typing.List[typing.Optional[int]]] = []
+        self.inserted_ids = []
+        self._param_rows = None
+        super().__init__(*args)
+
+    def count(self):
+        return len(self.inserted_ids)
+
     def parse(self):
-        db = self._result_ref.db
         sm = self.statement
-        insert = {}
-
-        nextid, nexttok = sm.token_next(2)
-        if isinstance(nexttok, Identifier):
-            collection = nexttok.get_name()
-            self.left_table = collection
-            auto = db['__schema__'].find_one_and_update(
-                {
-                    'name': collection,
-                    'auto': {
-                        '$exists': True
-                    }
-                },
-                {'$inc': {'auto.seq': 1}},
-                return_document=ReturnDocument.AFTER
-            )
 
-            if auto:
-                auto_field_id = auto['auto']['seq']
-                for name in auto['auto']['field_names']:
-                    insert[name] = auto_field_id
-            else:
-                auto_field_id = None
-        else:
+        tok_id, tok = sm.token_next(2)
+        if not isinstance(tok, Identifier):
             raise SQLDecodeError
+        self.left_table = tok.get_name()
 
-        nextid, nexttok = sm.token_next(nextid)
+        tok_id, tok = sm.token_next(tok_id)
+        if not isinstance(tok, Parenthesis):
+            raise SQLDecodeError
+        self._columns(tok)
 
-        for aid in nexttok[1].get_identifiers():
-            sql = SQLToken(aid, None)
-            insert[sql.column] = self.params.pop(0)
+        tok_id, tok = sm.token_next(tok_id)
+        if not tok.match(tokens.Keyword, 'VALUES'):
+            raise SQLDecodeError
+
+        tok_id, tok = sm.token_next(tok_id)
+        while tok_id is not None:
+            if isinstance(tok, Parenthesis):
+                row = list(SQLToken(tok, None))
+                if len(row) != len(self.columns):
+                    raise SQLDecodeError
+                self.values.append(row)
 
-        if self.params:
+            elif not tok.match(tokens.Punctuation, ','):
+                raise SQLDecodeError
+
+            tok_id, tok = sm.token_next(tok_id)
+
+        if not self.values:
             raise SQLDecodeError
 
-        result = db[collection].insert_one(insert)
-        if not auto_field_id:
-            auto_field_id = str(result.inserted_id)
+        if self._result_ref.many:
+            self._param_rows = self.params
+        else:
+            self._param_rows = [self.params]
+
+    def execute(self):
+        if not self._param_rows:
+            # executemany() without params sets inserts nothing
+            return
+        self._insert(self._param_rows)
+
+    async def aexecute(self):
+        if not self._param_rows:
+            return
+        collection, block_size, ordered = self._insert_options()
+        for batch in self._batches(self._param_rows):
+            field_names, auto_ids = await id_allocator.aallocate(
+                self._result_ref.db, self.left_table, len(batch), block_size)
+            batch = self._with_auto_ids(batch, field_names, auto_ids)
+            if len(batch) == 1:
+                inserted_ids = [(await collection.insert_one(batch[0])).inserted_id]
+            else:
+                inserted_ids = (await collection.insert_many(batch, ordered=ordered)).inserted_ids
+            self._add_inserted(inserted_ids, auto_ids)
+
+        self._inserted()
 
-        self._result_ref.last_row_id = auto_field_id
-        logger.debug('insert id {}'.format(result.inserted_id))
+    def _columns(self, tok):
+        tok = tok[1:-1][0]
+        if isinstance(tok, IdentifierList):
+            identifiers = tok.get_identifiers()
+        else:
+            identifiers = [tok]
+
+        self.columns = [SQLToken(aid, None).column for aid in identifiers]
+
+    def _documents(self, param_rows):
+        for params in param_rows:
+            for row in self.values:
+                yield {
+                    column: None if index is None else params[index]
+                    for column, index in zip(self.columns, row)
+                }
+
+    def _batches(self, param_rows) -> typing.Iterator[typing.List[dict]]:
+        batch_size = self._result_ref.options.get('INSERT_BATCH_SIZE', 1000)
+        docs = self._documents(param_rows)
+        count = len(self.values) * len(param_rows)
+        return (list(islice(docs, batch_size))
+                for _ in range(0, count, batch_size))
+
+    def _insert_options(self):
+        options = self._result_ref.options
+        return (self._result_ref.db[self.left_table],
+                options.get('AUTO_ID_BLOCK_SIZE', 1),
+                options.get('ORDERED_INSERTS', True))
+
+    @staticmethod
+    def _with_auto_ids(batch: typing.List[dict], field_names, auto_ids: typing.Optional[range]):
+        if auto_ids is None:
+            return batch
+        return [{**dict.fromkeys(field_names, auto_id), **doc}
+                for doc, auto_id in zip(batch, auto_ids)]
+
+    def _add_inserted(self, inserted_ids: list, auto_ids: typing.Optional[range]):
+        if auto_ids is not None:
+            self.inserted_ids.extend(auto_ids)
+        else:
+            self.inserted_ids.extend(str(_id) for _id in inserted_ids)
+
+    def _inserted(self):
+        self._result_ref.last_row_id = self.inserted_ids[-1]
+        self._result_ref.inserted_ids = self.inserted_ids
+        logger.debug('inserted %s documents', len(self.inserted_ids))
+
+    def _insert(self, param_rows):
+        collection, block_size, ordered = self._insert_options()
+        buffer = self.write_buffer
+        for batch in self._batches(param_rows):
+            field_names, auto_ids = id_allocator.allocate(
+                self._result_ref.db, self.left_table, len(batch), block_size)
+            batch = self._with_auto_ids(batch, field_names, auto_ids)
+            if buffer is not None:
+                # The _ids are known before the documents are sent
+                for doc in batch:
+                    doc.setdefault('_id', ObjectId())
+                    buffer.queue(collection, InsertOne(doc))
+                inserted_ids = [doc['_id'] for doc in batch]
+            elif len(batch) == 1:
+                inserted_ids = [collection.insert_one(batch[0]).inserted_id]
+            else:
+                inserted_ids = collection.insert_many(batch, ordered=ordered).inserted_ids
+            self._add_inserted(inserted_ids, auto_ids)
+
+        self._inserted()
 
 
 class DeleteQuery(Query):
 
     def __init__(self, *args):
-        self.result = None
+        self.where: typing.Optional[WhereConverter] = None
+        self.deleted_count = 0
         super().__init__(*args)
 
     def parse(self):
-        db_con = self._result_ref.db
         sm = self.statement
-        kw = {}
+        self._chunks = [{'filter': {}}]
 
         tok_id, tok = sm.token_next(2)
         sql_token = SQLToken(tok, None)
-        collection = sql_token.table
-
         self.left_table = sql_token.table
 
         tok_id, tok = sm.token_next(tok_id)
         if tok_id and isinstance(tok, Where):
-            where = WhereConverter(self, tok_id)
-            kw.update(where.to_mongo())
-
-        self.result = db_con[collection].delete_many(**kw)
-        logger.debug('delete_many: {}'.format(self.result.deleted_count))
+            where = self.where = WhereConverter(self, tok_id)
+            if self.nested_in:
+                self._chunks = self._matched_id_chunks(where)
+            else:
+                self._chunks = [where.to_mongo()]
+
+    def execute(self):
+        collection = self._result_ref.db[self.left_table]
+        buffer = self.write_buffer
+        if buffer is not None:
+            if isinstance(self._chunks, list):
+                result = buffer.flush(collection, DeleteMany(self._chunks[0]['filter']))
+                self.deleted_count = result.deleted_count
+                return
+            buffer.flush()
+            buffer.sent()
+
+        for kw in self._chunks:
+            result = collection.delete_many(**kw)
+            self.deleted_count += result.deleted_count
+            logger.debug('delete_many: %s', result.deleted_count)
+
+    async def aexecute(self):
+        collection = self._result_ref.db[self.left_table]
+        async for kw in self._achunks():
+            result = await collection.delete_many(**kw)
+            self.deleted_count += result.deleted_count
+            logger.debug('delete_many: %s', result.deleted_count)
 
     def count(self):
-        return self.result.deleted_count
+        return self.deleted_count
+
+    def index_shapes(self):
+        return [(self.left_table, self._where_shape(self.where))]
 
 
 
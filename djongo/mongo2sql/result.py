@@ -3,21 +3,29 @@ from pymongo.database import Database
 
 
 class Result:
+    # Set on AsyncResult, whose db is an AsyncMongoClient database
+    asynchronous = False
 
     def __init__(self,
                  client_connection: MongoClient,
                  db_connection: Database,
                  sql: str,
-                 params: typing.Optional[list]):
-        logger.debug('params: {}'.format(params))
-
+                 params: typing.Optional[list],
+                 options: typing.Optional[dict] = None,
+                 many: bool = False,
+                 write_buffer: typing.Optional[WriteBuffer] = None):
         self._params = params
         self.db = db_connection
         self.cli_con = client_connection
+        self.options = options or {}
+        self.many = many
+        self.write_buffer = write_buffer
         self._params_index_count = -1
         self._sql = re.sub(r'%s', self._param_index, sql)
         self.last_row_id = None
+        self.inserted_ids = []
         self._result_generator = None
+        self._explain = False
 
         self._query = None
         self.parse()
@@ -37,54 +45,148 @@ class Result:
 
     next = __next__
 
+    def fetchmany(self, size: int) -> list:
+        """
+        Returns up to `size` rows. The first call sizes the server batches
+        of a SELECT to match, so each call costs at most one round trip.
+        """
+        if self._result_generator is None:
+            if isinstance(self._query, SelectQuery) and self._query.batch_size is None:
+                self._query.batch_size = size
+            self._result_generator = iter(self)
+
+        return list(islice(self._result_generator, size))
+
+    def explain(self) -> dict:
+        if not isinstance(self._query, SelectQuery):
+            raise NotImplementedError(f'EXPLAIN not implemented for SQL {self._sql}')
+        return self._query.explain()
+
     def __iter__(self):
+        if self._explain:
+            # One row per line, which QuerySet.explain() joins back
+            for line in json_util.dumps(self.explain(), indent=2).splitlines():
+                yield line,
+            return
+
         try:
             yield from iter(self._query)
-        except SQLDecodeError as e:
-            print(f'FAILED SQL: {self._sql}')
-            raise e
+        except SQLDecodeError:
+            logger.error('FAILED SQL: %s', self._sql)
+            raise
         except OperationFailure as e:
-            print(f'FAILED SQL: {self._sql}')
-            print(e.details)
-            raise e
+            logger.error('FAILED SQL: %s %s', self._sql, e.details)
+            raise
 
     def _param_index(self, _):
         self._params_index_count += 1
         return '%({})s'.format(self._params_index_count)
 
     def parse(self):
-        logger.debug(f'\n sql_command: {self._sql}')
-        statement = sqlparse(self._sql)
-
-        if len(statement) > 1:
-            raise SQLDecodeError(self._sql)
-
-        statement = statement[0]
-        sm_type = statement.get_type()
+        stamps = self._translate()
+        if self._query is not None:
+            try:
+                self._query.execute()
+            except OperationFailure as e:
+                logger.error('FAILED SQL: %s %s', self._sql, e.details)
+                raise
+
+        if stamps is not None:
+            self._emit_timings(stamps, perf_counter() - stamps[-1])
+
+    def _translate(self) -> typing.Optional[typing.Tuple[float, float, float]]:
+        """
+        Parses the statement and builds its query, running DDL right away.
+        With timings enabled, returns the perf_counter() readings taken
+        before parsing, after parsing and after translating.
+        """
+        logger.debug('sql_command: %s params: %s', self._sql, self._params)
+        timed = timings.enabled
+        if timed:
+            start = perf_counter()
+
+        sql = self._sql
+        if sql.startswith('EXPLAIN '):
+            if self.asynchronous:
+                raise NotImplementedError(f'EXPLAIN not implemented for async SQL {self._sql}')
+            self._explain = True
+            sql = sql[len('EXPLAIN '):]
+
+        statement = statement_cache.parse(sql)
+        sm_type = self._sm_type = statement.get_type()
+        if timed:
+            parsed = perf_counter()
+
+        if self._explain and sm_type != 'SELECT':
+            raise NotImplementedError(f'EXPLAIN not implemented for {sm_type} SQL {self._sql}')
 
         try:
             handler = self.FUNC_MAP[sm_type]
         except KeyError:
-            logger.debug('\n Not implemented {} {}'.format(sm_type, statement))
+            logger.debug('Not implemented %s %s', sm_type, statement)
             raise NotImplementedError(f'{sm_type} command not implemented for SQL {self._sql}')
 
-        else:
-            try:
-                return handler(self, statement)
-            except SQLDecodeError as e:
-                print(f'FAILED SQL: {self._sql}')
-                raise e
-            except OperationFailure as e:
-                print(f'FAILED SQL: {self._sql}')
-                print(e.details)
-                raise e
+        if sm_type != 'SELECT':
+            # Routed reads of this thread go to the primary for a while
+            read_router.wrote()
+
+        buffer = self.write_buffer
+        if (buffer is not None and buffer.pending
+                and sm_type not in ('INSERT', 'UPDATE', 'DELETE')):
+            # Reads and DDL see the queued writes
+            buffer.flush()
+
+        if self.many and sm_type != 'INSERT':
+            raise NotImplementedError(f'executemany not implemented for {sm_type} SQL {self._sql}')
+
+        try:
+            handler(self, statement)
+            advisor_db = self._advisor_db()
+            if (self._query is not None and advisor_db is not None
+                    and self.options.get('INDEX_ADVISOR', False)):
+                for collection, shape in self._query.index_shapes():
+                    index_advisor.record(advisor_db, collection, shape)
+        except SQLDecodeError:
+            logger.error('FAILED SQL: %s', self._sql)
+            raise
+        except OperationFailure as e:
+            logger.error('FAILED SQL: %s %s', self._sql, e.details)
+            raise
+
+        if timed:
+            return start, parsed, perf_counter()
+        return None
+
+    def _advisor_db(self) -> typing.Optional[Database]:
+        # The database the index advisor saves the query shapes in
+        return self.db
+
+    def _emit_timings(self, stamps: typing.Tuple[float, float, float], execute: float):
+        """
+        Emits the timings of the statement from the readings _translate()
+        returned and the time its query took to execute.
+        """
+        start, parsed, translated = stamps
+        sm_type = self._sm_type
+        if self._query is None:
+            # DDL runs as it is translated
+            timings.emit('parse', parsed - start, None, sm_type)
+            timings.emit('execute', translated - parsed, None, sm_type)
+            return
+
+        collection = self._query.left_table
+        timings.emit('parse', parsed - start, collection, sm_type)
+        timings.emit('translate', translated - parsed, collection, sm_type)
+        if sm_type != 'SELECT':
+            # SELECTs emit theirs as their rows are read
+            timings.emit('execute', execute, collection, sm_type)
 
     def _alter(self, sm):
         tok_id, tok = sm.token_next(0)
         if tok.match(tokens.Keyword, 'TABLE'):
             tok_id, tok = sm.token_next(tok_id)
             if not tok:
-                logger.debug('Not implemented command not implemented for SQL {}'.format(self._sql))
+                logger.debug('Not implemented command not implemented for SQL %s', self._sql)
                 return
 
             table = SQLToken(tok, None).table
@@ -92,25 +194,25 @@ class Result:
             tok_id, tok = sm.token_next(tok_id)
             if (not tok
                     or not tok.match(tokens.Keyword, 'ADD')):
-                logger.debug('Not implemented command not implemented for SQL {}'.format(self._sql))
+                logger.debug('Not implemented command not implemented for SQL %s', self._sql)
                 return
 
             tok_id, tok = sm.token_next(tok_id)
             if (not tok
                     or not tok.match(tokens.Keyword, 'CONSTRAINT')):
-                logger.debug('Not implemented command not implemented for SQL {}'.format(self._sql))
+                logger.debug('Not implemented command not implemented for SQL %s', self._sql)
                 return
 
             tok_id, tok = sm.token_next(tok_id)
             if not isinstance(tok, Identifier):
-                logger.debug('Not implemented command not implemented for SQL {}'.format(self._sql))
+                logger.debug('Not implemented command not implemented for SQL %s', self._sql)
                 return
 
             constraint_name = tok.get_name()
 
             tok_id, tok = sm.token_next(tok_id)
             if not tok.match(tokens.Keyword, 'UNIQUE'):
-                logger.debug('Not implemented command not implemented for SQL {}'.format(self._sql))
+                logger.debug('Not implemented command not implemented for SQL %s', self._sql)
                 return
 
             tok_id, tok = sm.token_next(tok_id)
@@ -126,7 +228,8 @@ class Result:
             tok_id, tok = sm.token_next(tok_id)
             table = SQLToken(tok, None).table
             self.db.create_collection(table)
-            logger.debug('Created table {}'.format(table))
+            id_allocator.invalidate(self.db.name, table)
+            logger.debug('Created table %s', table)
 
             tok_id, tok = sm.token_next(tok_id)
             if isinstance(tok, Parenthesis):
@@ -136,6 +239,7 @@ class Result:
                 _set = {}
                 push = {}
                 update = {}
+                indexes = []
 
                 for col in tok.value.strip('()').split(','):
                     field = col[col.find('"') + 1: col.rfind('"')]
@@ -145,10 +249,13 @@ class Result:
                         _set['auto.seq'] = 0
 
                     if col.find('PRIMARY KEY') != -1:
-                        self.db[table].create_index(field, unique=True, name='__primary_key__')
+                        indexes.append(IndexModel(field, unique=True, name='__primary_key__'))
 
                     if col.find('UNIQUE') != -1:
-                        self.db[table].create_index(field, unique=True)
+                        indexes.append(IndexModel(field, unique=True))
+
+                if indexes:
+                    self.db[table].create_indexes(indexes)
 
                 if _set:
                     update['$set'] = _set
@@ -161,20 +268,135 @@ class Result:
                         upsert=True
                     )
 
+        elif tok.match(tokens.Keyword, 'UNIQUE'):
+            tok_id, tok = sm.token_next(tok_id)
+            if not tok.match(tokens.Keyword, 'INDEX'):
+                raise SQLDecodeError('statement:{}'.format(sm))
+            self._create_index(sm, tok_id, unique=True)
+
+        elif tok.match(tokens.Keyword, 'INDEX'):
+            self._create_index(sm, tok_id, unique=False)
+
         elif tok.match(tokens.Keyword, 'DATABASE'):
             pass
         else:
-            logger.debug('Not supported {}'.format(sm))
+            logger.debug('Not supported %s', sm)
+
+    def _create_index(self, sm, tok_id, unique):
+        tok_id, tok = sm.token_next(tok_id)
+        name = tok.get_name()
+
+        tok_id, tok = sm.token_next(tok_id)
+        if not tok.match(tokens.Keyword, 'ON'):
+            raise SQLDecodeError('statement:{}'.format(sm))
+
+        tok_id, tok = sm.token_next(tok_id)
+        table = SQLToken(tok, None).table
+
+        tok_id, tok = sm.token_next(tok_id)
+        if not isinstance(tok, Parenthesis):
+            raise SQLDecodeError('statement:{}'.format(sm))
+
+        keys = []
+        for col in tok.value.strip('()').split(','):
+            field = col[col.find('"') + 1: col.rfind('"')]
+            if not field:
+                raise NotImplementedError(f'Expression indexes not supported for SQL {self._sql}')
+            order = DESCENDING if col.rstrip().upper().endswith(' DESC') else ASCENDING
+            keys.append((field, order))
+
+        kwargs = {'name': name}
+        if unique:
+            kwargs['unique'] = True
+
+        tok_id, tok = sm.token_next(tok_id)
+        if isinstance(tok, Where):
+            kwargs['partialFilterExpression'] = self._index_filter(table, tok)
+
+        index_builds.create(self.db[table], [IndexModel(keys, **kwargs)])
+        logger.debug('Created index %s on %s', name, table)
+
+    def _index_filter(self, table: str, where: Where) -> dict:
+        """
+        Translates the WHERE of a partial index. Django renders its values
+        inline, so they are turned back into params of a SELECT on the
+        table, whose filter is the partialFilterExpression.
+        """
+        sql = []
+        params = []
+        toks = list(where.flatten())[1:]
+        i = 0
+        while i < len(toks):
+            tok = toks[i]
+            ttype = tok.ttype
+            if ttype in tokens.Literal.String.Symbol:
+                if i + 2 < len(toks) and toks[i + 1].value == '.':
+                    sql.append(tok.value + '.' + toks[i + 2].value)
+                    i += 2
+                else:
+                    # Django leaves the columns of index conditions unqualified
+                    sql.append(f'"{table}".{tok.value}')
+
+                nxt = next((each for each in toks[i + 1:] if not each.is_whitespace), None)
+                if (nxt is None or nxt.match(tokens.Keyword, ('AND', 'OR'))
+                        or nxt.match(tokens.Punctuation, ')')):
+                    # A bare boolean column
+                    sql.append(f' = %({len(params)})s')
+                    params.append(True)
+
+            elif ttype in tokens.Literal.String.Single:
+                sql.append(f'%({len(params)})s')
+                params.append(tok.value[1:-1].replace("''", "'"))
+            elif ttype in tokens.Literal.Number.Integer:
+                sql.append(f'%({len(params)})s')
+                params.append(int(tok.value))
+            elif ttype in tokens.Literal.Number.Float:
+                sql.append(f'%({len(params)})s')
+                params.append(float(tok.value))
+            elif tok.match(tokens.Keyword, ('TRUE', 'FALSE')):
+                sql.append(f'%({len(params)})s')
+                params.append(tok.normalized == 'TRUE')
+            else:
+                sql.append(tok.value)
+            i += 1
+
+        statement = statement_cache.parse(f'SELECT * FROM "{table}" WHERE {"".join(sql)}')
+        return SelectQuery(self, statement, params).where.to_mongo()['filter']
 
     def _drop(self, sm):
         tok_id, tok = sm.token_next(0)
 
+        if tok.match(tokens.Keyword, 'INDEX'):
+            self._drop_index(sm, tok_id)
+            return
+
         if not tok.match(tokens.Keyword, 'DATABASE'):
             raise SQLDecodeError('statement:{}'.format(sm))
 
         tok_id, tok = sm.token_next(tok_id)
         db_name = tok.get_name()
         self.cli_con.drop_database(db_name)
+        id_allocator.invalidate(db_name)
+
+    def _drop_index(self, sm, tok_id):
+        tok_id, tok = sm.token_next(tok_id)
+        name = tok.get_name()
+
+        tok_id, tok = sm.token_next(tok_id)
+        if tok and tok.match(tokens.Keyword, 'ON'):
+            tok_id, tok = sm.token_next(tok_id)
+            table = SQLToken(tok, None).table
+        else:
+            # MongoDB drops indexes by collection, find the one holding it
+            table = index_builds.queued(self.db.name, name)
+            if table is None:
+                table = next((each for each in self.db.list_collection_names()
+                              if name in self.db[each].index_information()), None)
+            if table is None:
+                raise SQLDecodeError(f'Index {name} not found for SQL {self._sql}')
+
+        index_builds.drop(self.db[table], name)
+        logger.debug('Dropped index %s on %s', name, table)
 
     def _update(self, sm):
         self._query = UpdateQuery(self, sm, self._params)
@@ -199,25 +421,196 @@ class Result:
     }
 
 
+class AsyncResult(Result):
+    """
+    Translates a statement like Result, for the asyncio driver. The
+    statement is sent when `execute()` is awaited and its rows are read
+    with `async for` or the awaited fetch methods. Only SELECT, INSERT,
+    UPDATE and DELETE are supported, schema changes run on the blocking
+    connection.
+    """
+    asynchronous = True
+
+    FUNC_MAP = {
+        sm_type: Result.FUNC_MAP[sm_type]
+        for sm_type in ('SELECT', 'UPDATE', 'INSERT', 'DELETE')
+    }
+
+    def __init__(self, *args, advisor_db: typing.Optional[Database] = None, **kwargs):
+        # The index advisor flushes with blocking writes, so it is given
+        # a blocking handle on the same database, or records nothing
+        self._blocking_db = advisor_db
+        super().__init__(*args, **kwargs)
+
+    def _advisor_db(self):
+        return self._blocking_db
+
+    def count(self):
+        # Counting the rows of a SELECT takes a query, see acount()
+        if isinstance(self._query, SelectQuery):
+            return -1
+        return self._query.count()
+
+    async def acount(self):
+        if isinstance(self._query, SelectQuery):
+            return await self._query.acount()
+        return self._query.count()
+
+    async def close(self):
+        cursor = self._query._cursor if self._query else None
+        if cursor is not None and not isinstance(cursor, list):
+            await cursor.close()
+
+    def __aiter__(self):
+        if self._result_generator is None:
+            self._result_generator = self._rows()
+        return self._result_generator
+
+    async def _rows(self):
+        try:
+            async for row in self._query:
+                yield row
+        except SQLDecodeError:
+            logger.error('FAILED SQL: %s', self._sql)
+            raise
+        except OperationFailure as e:
+            logger.error('FAILED SQL: %s %s', self._sql, e.details)
+            raise
+
+    async def fetchmany(self, size: int) -> list:
+        if self._result_generator is None:
+            if isinstance(self._query, SelectQuery) and self._query.batch_size is None:
+                self._query.batch_size = size
+
+        rows = []
+        generator = self.__aiter__()
+        while len(rows) < size:
+            try:
+                rows.append(await generator.__anext__())
+            except StopAsyncIteration:
+                break
+        return rows
+
+    async def fetchall(self) -> list:
+        return [row async for row in self]
+
+    def parse(self):
+        self._stamps = self._translate()
+
+    async def execute(self):
+        """
+        Sends the statement translated on construction. SELECTs are sent
+        lazily, when their rows are fetched.
+        """
+        start = perf_counter()
+        if self._sm_type != 'SELECT':
+            try:
+                await self._query.aexecute()
+            except OperationFailure as e:
+                logger.error('FAILED SQL: %s %s', self._sql, e.details)
+                raise
+
+        if self._stamps is not None:
+            self._emit_timings(self._stamps, perf_counter() - start)
+
+
+_NAME_TYPES = (tokens.Name, tokens.Wildcard, tokens.String.Symbol)
+
+# Table and column names repeat across statements, share one string each
+_unquote = lru_cache(maxsize=4096)(remove_quotes)
+
+
+def _first_name(toks, keywords=False):
+    for tok in toks:
+        if tok.ttype in _NAME_TYPES or (keywords and tok.ttype == tokens.Keyword):
+            return _unquote(tok.value)
+
+        elif isinstance(tok, (Identifier, Function)):
+            _, name, alias, _ = _identifier_names(tok)
+            return alias or name
+
+
+def _identifier_names(token: Identifier):
+    """
+    Returns the parent name, real name, alias and ordering of `token` in
+    one pass. Matches what sqlparse's get_parent_name, get_real_name,
+    get_alias and get_ordering return.
+    """
+    toks = token.tokens
+    dot_idx = as_idx = ordering = None
+    has_ws = False
+    for i, tok in enumerate(toks):
+        ttype = tok.ttype
+        if ttype is None:
+            continue
+
+        if tok.is_whitespace:
+            has_ws = True
+
+        elif dot_idx is None and ttype is tokens.Punctuation and tok.value == '.':
+            dot_idx = i
+
+        elif as_idx is None and ttype is tokens.Keyword and tok.normalized == 'AS':
+            as_idx = i
+
+        elif ordering is None and ttype in tokens.Keyword.Order:
+            ordering = tok.normalized
+
+    if dot_idx is None:
+        parent = None
+        name = _first_name(toks)
+    else:
+        parent = None
+        for tok in reversed(toks[:dot_idx]):
+            if not tok.is_whitespace:
+                parent = _unquote(tok.value)
+                break
+        name = _first_name(toks[dot_idx:])
+
+    if as_idx is not None:
+        alias = _first_name(toks[as_idx + 1:], keywords=True)
+    elif has_ws and len(toks) > 2:
+        alias = _first_name(reversed(toks))
+    else:
+        alias = None
+
+    return parent, name, alias, ordering
+
+
 class SQLToken:
+    """
+    Resolved view of a sqlparse token. Names, ordering and placeholder
+    indexes are read from the token once, on construction, instead of on
+    every property access. Only table aliases are looked up on access, as
+    FROM and JOIN register them after SELECT is parsed.
+    """
+    __slots__ = ('_token', 'alias2op', '_table', '_column', '_alias',
+                 '_order', '_lhs', '_rhs', '_rhs_index', '_indexes')
 
     def __init__(self, token: Token, alias2op=None):
         self._token = token
         self.alias2op: typing.Dict[str, SQLToken] = alias2op
+        self._table = self._column = self._alias = self._order = None
+        self._lhs = self._rhs = self._rhs_index = self._indexes = None
 
-    @property
-    def table(self):
-        if not isinstance(self._token, Identifier):
-            raise SQLDecodeError
+        if isinstance(token, Identifier):
+            parent, self._column, self._alias, _ord = _identifier_names(token)
+            self._table = parent or self._column
+            if _ord is not None:
+                self._order = ORDER_BY_MAP[_ord]
 
-        name = self._token.get_parent_name()
-        if name is None:
-            name = self._token.get_real_name()
-        else:
-            if name in self.alias2op:
-                return self.alias2op[name].table
-            return name
+        elif isinstance(token, Comparison):
+            self._lhs = SQLToken(token.left, alias2op)
+            self._rhs = SQLToken(token.right, alias2op)
+            if token.right.ttype == tokens.Name.Placeholder:
+                self._rhs_index = self.placeholder_index(token.right)
 
+        elif isinstance(token, Parenthesis):
+            self._indexes = self._placeholder_indexes(token)
+
+    @property
+    def table(self):
+        name = self._table
         if name is None:
             raise SQLDecodeError
 
@@ -227,107 +620,90 @@ class SQLToken:
 
     @property
     def column(self):
-        if not isinstance(self._token, Identifier):
+        if self._column is None:
             raise SQLDecodeError
-
-        name = self._token.get_real_name()
-        if name is None:
-            raise SQLDecodeError
-        return name
+        return self._column
 
     @property
     def alias(self):
         if not isinstance(self._token, Identifier):
             raise SQLDecodeError
-
-        return self._token.get_alias()
+        return self._alias
 
     @property
     def order(self):
-        if not isinstance(self._token, Identifier):
+        if self._order is None:
             raise SQLDecodeError
-
-        _ord = self._token.get_ordering()
-        if _ord is None:
-            raise SQLDecodeError
-
-        return ORDER_BY_MAP[_ord]
+        return self._order
 
     @property
     def left_table(self):
-        if not isinstance(self._token, Comparison):
+        if self._lhs is None:
             raise SQLDecodeError
-
-        lhs = SQLToken(self._token.left, self.alias2op)
-        return lhs.table
+        return self._lhs.table
 
     @property
     def left_column(self):
-        if not isinstance(self._token, Comparison):
+        if self._lhs is None:
             raise SQLDecodeError
-
-        lhs = SQLToken(self._token.left, self.alias2op)
-        return lhs.column
+        return self._lhs.column
 
     @property
     def right_table(self):
-        if not isinstance(self._token, Comparison):
+        if self._rhs is None:
             raise SQLDecodeError
-
-        rhs = SQLToken(self._token.right, self.alias2op)
-        return rhs.table
+        return self._rhs.table
 
     @property
     def right_column(self):
-        if not isinstance(self._token, Comparison):
+        if self._rhs is None:
             raise SQLDecodeError
-
-        rhs = SQLToken(self._token.right, self.alias2op)
-        return rhs.column
+        return self._rhs.column
 
     @property
     def lhs_column(self):
-        if not isinstance(self._token, Comparison):
-            raise SQLDecodeError
-
-        lhs = SQLToken(self._token.left, self.alias2op)
-        return lhs.column
+        return self.left_column
 
     @property
     def rhs_indexes(self):
-        if not self._token.right.ttype == tokens.Name.Placeholder:
+        if self._rhs_index is None:
             raise SQLDecodeError
-
-        index = self.placeholder_index(self._token.right)
-        return index
+        return self._rhs_index
 
     @staticmethod
     def placeholder_index(token):
-        return int(re.match(r'%\(([0-9]+)\)s', token.value, flags=re.IGNORECASE).group(1))
+        # Placeholders are normalized to %(<index>)s by Result
+        try:
+            return int(token.value[2:-2])
+        except ValueError:
+            raise SQLDecodeError(f'Bad placeholder: {token.value}')
 
-    def __iter__(self):
-        if not isinstance(self._token, Parenthesis):
-            raise SQLDecodeError
-        tok = self._token[1:-1][0]
+    @classmethod
+    def _placeholder_indexes(cls, token):
+        tok = token[1:-1][0]
         if tok.ttype == tokens.Name.Placeholder:
-            yield self.placeholder_index(tok)
-            return
+            return [cls.placeholder_index(tok)]
 
         elif tok.match(tokens.Keyword, 'NULL'):
-            yield None
-            return
+            return [None]
 
         elif isinstance(tok, IdentifierList):
+            indexes = []
             for aid in tok.get_identifiers():
                 if aid.ttype == tokens.Name.Placeholder:
-                    yield self.placeholder_index(aid)
+                    indexes.append(cls.placeholder_index(aid))
 
                 elif aid.match(tokens.Keyword, 'NULL'):
-                    yield None
+                    indexes.append(None)
 
                 else:
-                    raise SQLDecodeError
+                    return None
 
-        else:
-            raise SQLDecodeError
+            return indexes
+
+        return None
 
+    def __iter__(self):
+        if self._indexes is None:
+            raise SQLDecodeError
+        return iter(self._indexes)
@@ -0,0 +1,74 @@
+import threading
+import time
+import typing
+from contextlib import contextmanager
+
+from pymongo.collection import Collection
+from pymongo.read_preferences import (
+    ReadPreference, make_read_preference, read_pref_mode_from_name
+)
+
+
+def resolve(preference, max_staleness: int = -1):
+    """
+    Returns the pymongo read preference for a mode name such as
+    'secondaryPreferred' or 'nearest', or `preference` itself when it
+    already is one.
+    """
+    if isinstance(preference, str):
+        return make_read_preference(read_pref_mode_from_name(preference),
+                                    None, max_staleness)
+    return preference
+
+
+class ReadRouter:
+    """
+    Picks the read preference of SELECTs. A `read_preference()` block
+    overrides the per table defaults, which come from the
+    `read_preference` of the DjongoManager of models. Routed reads of a thread
+    that wrote recently go to the primary, so it reads its own writes.
+    Other reads keep the read preference of the client.
+    """
+
+    def __init__(self):
+        self._tables: typing.Dict[str, typing.Any] = {}
+        self._local = threading.local()
+
+    def set_table(self, table: str, preference):
+        self._tables[table] = resolve(preference)
+
+    @contextmanager
+    def read_preference(self, preference, max_staleness: int = -1):
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(resolve(preference, max_staleness))
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    def wrote(self):
+        self._local.last_write = time.monotonic()
+
+    def route(self, collection: Collection, pin_seconds: float) -> Collection:
+        stack = self._local.__dict__.get('stack')
+        preference = stack[-1] if stack else self._tables.get(collection.name)
+        if preference is None:
+            return collection
+
+        if preference.mode != ReadPreference.PRIMARY.mode:
+            last_write = self._local.__dict__.get('last_write')
+            if last_write is not None and time.monotonic() - last_write < pin_seconds:
+                preference = ReadPreference.PRIMARY
+
+        return collection.with_options(read_preference=preference)
+
+    def clear(self):
+        """
+        Forgets the per table defaults. Open `read_preference()` blocks
+        and the recent writes of threads are left alone.
+        """
+        self._tables.clear()
+
+
+read_router = ReadRouter()
+read_preference = read_router.read_preference
@@ -0,0 +1,43 @@
+import threading
+import typing
+
+# stage, seconds, collection, statement type
+Callback = typing.Callable[[str, float, typing.Optional[str], str], None]
+
+
+class Timings:
+    """
+    Hands the duration of each stage of a statement to the subscribed
+    callbacks:
+
+    parse: SQL text to token tree
+    translate: token tree to filters, updates and pipelines
+    execute: MongoDB round trips
+    decode: documents to row tuples
+
+    Each duration is tagged with the collection and statement type.
+    Statements only read the clock while `enabled` is set, so nothing
+    is measured until a callback subscribes.
+    """
+
+    def __init__(self):
+        self._callbacks: typing.List[Callback] = []
+        self._lock = threading.Lock()
+        self.enabled = False
+
+    def subscribe(self, callback: Callback):
+        with self._lock:
+            self._callbacks = self._callbacks + [callback]
+            self.enabled = True
+
+    def unsubscribe(self, callback: Callback):
+        with self._lock:
+            self._callbacks = [each for each in self._callbacks if each is not callback]
+            self.enabled = bool(self._callbacks)
+
+    def emit(self, stage: str, seconds: float, collection: typing.Optional[str], statement: str):
+        for callback in self._callbacks:
+            callback(stage, seconds, collection, statement)
+
+
+timings = Timings()
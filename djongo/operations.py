@@ -4,6 +4,11 @@ import datetime, calendar
 
 
 class DatabaseOperations(BaseDatabaseOperations):
+    explain_prefix = 'EXPLAIN'
+
+    def no_limit_value(self):
+        # An OFFSET without LIMIT is sent as skip alone
+        return None
 
     def quote_name(self, name):
         if name.startswith('"') and name.endswith('"'):
@@ -47,6 +52,21 @@ class DatabaseOperations(BaseDatabaseOperations):
             converters.append(self.convert_timefield_value)
         return converters
 
+    def bulk_insert_sql(self, fields, placeholder_rows):
+        placeholder_rows_sql = (', '.join(row) for row in placeholder_rows)
+        values_sql = ', '.join('({})'.format(sql) for sql in placeholder_rows_sql)
+        return 'VALUES ' + values_sql
+
+    def return_insert_id(self):
+        # Ids are collected by the INSERT itself, nothing to append
+        return '', ()
+
+    def fetch_returned_insert_id(self, cursor):
+        return cursor.lastrowid
+
+    def fetch_returned_insert_ids(self, cursor):
+        return list(cursor.inserted_ids)
+
     def sql_flush(self, style, tables, sequences, allow_cascade=False):
         # TODO: Need to implement this fully
         return ['ALTER TABLE']
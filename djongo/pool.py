@@ -0,0 +1,201 @@
+import asyncio
+import os
+import threading
+import time
+import typing
+import weakref
+
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
+
+from . import database as Database
+
+
+class PoolInfo(typing.NamedTuple):
+    clients: int
+    checkouts: int
+    failed_checkouts: int
+    wait_time: float
+    max_wait_time: float
+    connections: int
+
+
+class PoolMetrics(ConnectionPoolListener):
+    """
+    Counts connection checkouts of the pooled clients and the time
+    threads waited for a connection, which grows once maxPoolSize is
+    reached.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.failed_checkouts = 0
+            self.wait_time = 0.0
+            self.max_wait_time = 0.0
+            self.connections = 0
+
+    def _waited(self):
+        started = getattr(self._started, 'time', None)
+        if started is None:
+            return 0.0
+        self._started.time = None
+        return time.monotonic() - started
+
+    def connection_check_out_started(self, event):
+        self._started.time = time.monotonic()
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.failed_checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections -= 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+def _settings_key(kwargs: dict) -> tuple:
+    return tuple(sorted((name, repr(value)) for name, value in kwargs.items()))
+
+
+class ClientPool:
+    """
+    One MongoClient per process and per distinct connection settings.
+    Django opens a connection per request and thread, so handing out
+    database handles from a shared client keeps its connection pool,
+    handshakes and monitor threads alive across requests.
+    """
+
+    def __init__(self):
+        self._clients: typing.Dict[tuple, MongoClient] = {}
+        self._lock = threading.Lock()
+        self.metrics = PoolMetrics()
+
+    def get(self, warm_up: bool = False, **kwargs) -> MongoClient:
+        """
+        Returns the client for the `kwargs` MongoClient arguments, creating
+        it on first use. A warmed up client connects before it is returned
+        instead of on its first query.
+        """
+        key = _settings_key(kwargs)
+        with self._lock:
+            try:
+                return self._clients[key]
+            except KeyError:
+                pass
+
+            client = self._clients[key] = Database.connect(
+                event_listeners=[self.metrics], **kwargs)
+
+        if warm_up:
+            client.admin.command('ping')
+        return client
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+
+        for client in clients:
+            client.close()
+
+    def info(self) -> PoolInfo:
+        metrics = self.metrics
+        with metrics._lock:
+            return PoolInfo(len(self._clients), metrics.checkouts,
+                            metrics.failed_checkouts, metrics.wait_time,
+                            metrics.max_wait_time, metrics.connections)
+
+    def _after_fork(self):
+        # MongoClient is not fork safe, the child builds its own clients
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.metrics = PoolMetrics()
+
+
+class AsyncClientPool:
+    """
+    One AsyncMongoClient per event loop and per distinct connection
+    settings. An asyncio client only runs on the loop it was first used
+    on, so each loop gets its own, shared by all its coroutines. The
+    clients of a loop are dropped with it.
+    """
+
+    def __init__(self):
+        self._clients: typing.MutableMapping[asyncio.AbstractEventLoop, dict] = \
+            weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, **kwargs):
+        """
+        Returns the client of the running event loop for the `kwargs`
+        AsyncMongoClient arguments, creating it on first use.
+        """
+        loop = asyncio.get_running_loop()
+        key = _settings_key(kwargs)
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            try:
+                return clients[key]
+            except KeyError:
+                client = clients[key] = Database.connect_async(**kwargs)
+                return client
+
+    async def close(self):
+        """
+        Closes the clients of the running event loop.
+        """
+        with self._lock:
+            clients = self._clients.pop(asyncio.get_running_loop(), {})
+
+        for client in clients.values():
+            await client.close()
+
+    def _after_fork(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+
+client_pool = ClientPool()
+async_client_pool = AsyncClientPool()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=client_pool._after_fork)
+    os.register_at_fork(after_in_child=async_client_pool._after_fork)
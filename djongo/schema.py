@@ -1,10 +1,38 @@
 from django.db.backends.base.schema import BaseDatabaseSchemaEditor
 from logging import getLogger
 
+from .mongo2sql.indexes import index_builds
+
 logger = getLogger(__name__)
 
 class DatabaseSchemaEditor(BaseDatabaseSchemaEditor):
-    pass
+    # MongoDB drops an index through its collection
+    sql_delete_index = 'DROP INDEX %(name)s ON %(table)s'
+
+    def __enter__(self):
+        # The indexes of a migration are built per collection on exit
+        self._index_batch = index_builds.batch()
+        self._index_batch.__enter__()
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            super().__exit__(exc_type, exc_value, traceback)
+        except BaseException as e:
+            self._index_batch.__exit__(type(e), e, e.__traceback__)
+            raise
+        self._index_batch.__exit__(exc_type, exc_value, traceback)
+
+    def quote_value(self, value):
+        # Django inlines the values of partial index conditions
+        if isinstance(value, bool):
+            return 'TRUE' if value else 'FALSE'
+        if isinstance(value, (int, float)):
+            return repr(value)
+        if value is None:
+            return 'NULL'
+        return "'{}'".format(str(value).replace("'", "''"))
+
     # def create_model(self, model):
     #     db_con = self.connection.connection
     #     db_con.create_collection(model._meta.db_table)
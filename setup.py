@@ -63,11 +63,15 @@ setup(
     author_email='nesdis@gmail.com',
     description='Driver for allowing Django to use MongoDB as the database backend.',
     install_requires=[
-        'sqlparse>=0.2.3',
-        'pymongo>=3.2.0',
+        'sqlparse>=0.2.3,<0.3',
+        'pymongo>=3.9.0',
         'django>=1.8',
         'dataclasses>=0.1'
     ],
+    extras_require={
+        # DatabaseWrapper.async_cursor()
+        'async': ['pymongo>=4.9'],
+    },
 	long_description=LONG_DESCRIPTION,
     python_requires='>=3.6'
 )
@@ -0,0 +1,35 @@
+"""
+Parse throughput of djongo.mongo2sql.parser against sqlparse over the
+SQL corpus in tests/test_sqlparsing.py. Run from the repository root:
+
+    python -m tests.benchmarks.bench_parser
+"""
+import timeit
+
+from sqlparse import parse as sqlparse
+
+from djongo.mongo2sql import parser
+from tests.test_sqlparsing import sql as corpus
+
+
+def bench(number=50):
+    statements = [sm for sm in corpus if parser.parse(sm) is not None]
+    results = {}
+    for name, func in (('sqlparse', lambda sm: sqlparse(sm)[0]),
+                       ('fast', parser.parse)):
+        elapsed = timeit.timeit(lambda: [func(sm) for sm in statements], number=number)
+        results[name] = number * len(statements) / elapsed
+
+    return len(statements), len(corpus), results
+
+
+def main():
+    handled, total, results = bench()
+    print(f'{handled}/{total} corpus statements handled by the fast parser')
+    for name, rate in results.items():
+        print(f'{name:>10}: {rate:10.0f} statements/s')
+    print(f'{"speedup":>10}: {results["fast"] / results["sqlparse"]:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
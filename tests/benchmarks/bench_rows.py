@@ -0,0 +1,86 @@
+"""
+Row extraction throughput of SelectQuery on a 100k document scan of a
+20 column table. The collection is mocked, so only the translation,
+BSON decoding and row building are measured. Run from the repository
+root:
+
+    python -m tests.benchmarks.bench_rows
+"""
+import time
+from collections import OrderedDict
+from unittest import mock
+
+from bson import BSON, ObjectId, decode_all
+from bson.codec_options import CodecOptions
+
+from djongo.sql2mongo import Result
+
+COLUMNS = [f'col{i}' for i in range(20)]
+SQL = 'SELECT {} FROM "table"'.format(', '.join(f'"table"."{col}"' for col in COLUMNS))
+
+
+def documents(count):
+    docs = []
+    for i in range(count):
+        doc = OrderedDict(_id=ObjectId())
+        doc.update((col, i) for col in COLUMNS)
+        docs.append(doc)
+    return docs
+
+
+def per_row_align(query, doc):
+    # What the iterator did for every row before the plan was precomputed
+    ret = []
+    for selected in query.selected_columns.sql_tokens:
+        if selected.table == query.left_table:
+            ret.append(doc.get(selected.column))
+        else:
+            ret.append(doc.get(selected.table, {}).get(selected.column))
+    return tuple(ret)
+
+
+def bench(count=100000):
+    docs = documents(count)
+    db = mock.MagicMock()
+    db.__getitem__().find.return_value = docs
+
+    results = {}
+    start = time.perf_counter()
+    rows = list(Result(None, db, SQL, []))
+    results['plan'] = len(rows) / (time.perf_counter() - start)
+
+    query = Result(None, db, SQL, [])._query
+    start = time.perf_counter()
+    rows = [per_row_align(query, doc) for doc in docs]
+    results['per row'] = len(rows) / (time.perf_counter() - start)
+
+    batches = [b''.join(BSON.encode(doc) for doc in docs[i:i + 1000])
+               for i in range(0, count, 1000)]
+    codec_options = CodecOptions(document_class=OrderedDict)
+    db = mock.MagicMock()
+    db.__getitem__().codec_options = codec_options
+    db.__getitem__().find.side_effect = lambda **kwargs: (
+        doc for batch in batches for doc in decode_all(batch, codec_options))
+    db.__getitem__().find_raw_batches.return_value = batches
+
+    start = time.perf_counter()
+    rows = list(Result(None, db, SQL, []))
+    results['decode'] = len(rows) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    rows = list(Result(None, db, SQL, [], {'FAST_DECODE': True}))
+    results['fast'] = len(rows) / (time.perf_counter() - start)
+
+    return results
+
+
+def main():
+    results = bench()
+    for name, rate in results.items():
+        print(f'{name:>10}: {rate:10.0f} rows/s')
+    print(f'{"speedup":>10}: {results["plan"] / results["per row"]:10.1f}x plan, '
+          f'{results["fast"] / results["decode"]:.1f}x fast decode')
+
+
+if __name__ == '__main__':
+    main()
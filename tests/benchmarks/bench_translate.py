@@ -0,0 +1,196 @@
+"""
+Translation throughput of Result over the SQL corpus in
+tests/test_sqlparsing.py, plus generated wide SELECT, large IN and large
+INSERT statements. The database is mocked, so only parsing, translation
+and row handling are measured. Every case is replayed once before it is
+measured, so repeated statements hit the statement cache like they do
+in a running site. Run from the repository root:
+
+    python -m tests.benchmarks.bench_translate
+    python -m tests.benchmarks.bench_translate --save baseline.json
+    python -m tests.benchmarks.bench_translate --compare baseline.json
+
+--compare exits with status 1 when the median latency or the
+allocations of a case grew by more than --threshold.
+"""
+import argparse
+import json
+import logging
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+from djongo.sql2mongo import Result
+from tests.test_sqlparsing import sql as corpus
+
+PLACEHOLDER = re.compile(r'%s|%\(\d+\)s')
+WIDE_COLUMNS = 200
+IN_VALUES = 10000
+INSERT_ROWS = 1000
+INSERT_COLUMNS = 10
+
+
+def statement(sql):
+    return sql, list(range(len(PLACEHOLDER.findall(sql))))
+
+
+def wide_select():
+    columns = ', '.join(f'"wide"."col{i}"' for i in range(WIDE_COLUMNS))
+    return [statement(f'SELECT {columns} FROM "wide" '
+                      f'WHERE "wide"."col0" = %s ORDER BY "wide"."col1" ASC')]
+
+
+def large_in():
+    values = ', '.join(['%s'] * IN_VALUES)
+    return [statement(f'SELECT "large"."id", "large"."name" FROM "large" '
+                      f'WHERE "large"."id" IN ({values})')]
+
+
+def large_insert():
+    columns = ', '.join(f'"col{i}"' for i in range(INSERT_COLUMNS))
+    row = '({})'.format(', '.join(['%s'] * INSERT_COLUMNS))
+    values = ', '.join([row] * INSERT_ROWS)
+    return [statement(f'INSERT INTO "large" ({columns}) VALUES {values}')]
+
+
+def database():
+    db = mock.MagicMock()
+    # No auto fields, so INSERTs skip the id allocator
+    db['__schema__'].find_one.return_value = {'auto': {'field_names': [], 'seq': 0}}
+    db['__schema__'].find_one_and_update.return_value = {
+        'auto': {'field_names': [], 'seq': 0}}
+    return db
+
+
+def run(db, sql, params):
+    result = Result(None, db, sql, params)
+    if sql.startswith('SELECT'):
+        list(result)
+
+
+def translatable(db, statements):
+    """
+    Drops the corpus statements the translator rejects, so the timings
+    only cover statements that complete.
+    """
+    kept = []
+    logging.disable(logging.ERROR)
+    try:
+        for sql, params in statements:
+            try:
+                run(db, sql, params)
+            except Exception:
+                continue
+            kept.append((sql, params))
+    finally:
+        logging.disable(logging.NOTSET)
+    return kept
+
+
+def percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def measure(db, statements, rounds):
+    for sql, params in statements:
+        run(db, sql, params)
+
+    latencies = []
+    for _ in range(rounds):
+        for sql, params in statements:
+            start = time.perf_counter()
+            run(db, sql, params)
+            latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    allocated = 0
+    for sql, params in statements:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        run(db, sql, params)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'statements': len(statements),
+        'statements_per_sec': len(latencies) / sum(latencies),
+        'p50_us': percentile(latencies, 0.50) * 1e6,
+        'p90_us': percentile(latencies, 0.90) * 1e6,
+        'p99_us': percentile(latencies, 0.99) * 1e6,
+        'peak_kb_per_statement': allocated / len(statements) / 1024,
+    }
+
+
+def bench(scale=1.0):
+    db = database()
+    cases = (
+        ('corpus', translatable(db, [statement(sql) for sql in corpus]), 200),
+        ('wide select', wide_select(), 500),
+        ('large in', large_in(), 20),
+        ('large insert', large_insert(), 20),
+    )
+    return {name: measure(db, statements, max(int(rounds * scale), 1))
+            for name, statements, rounds in cases}
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change of every case against `baseline` and returns the
+    names of the cases that regressed by more than `threshold`.
+    """
+    regressed = []
+    for name, new in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        speed = new['statements_per_sec'] / old['statements_per_sec'] - 1
+        latency = new['p50_us'] / old['p50_us'] - 1
+        memory = new['peak_kb_per_statement'] / old['peak_kb_per_statement'] - 1
+        flag = ''
+        # The median is steadier than the mean across runs
+        if latency > threshold or memory > threshold:
+            regressed.append(name)
+            flag = '  REGRESSED'
+        print(f'{name:>14}: {speed:+7.1%} statements/s, {latency:+7.1%} p50, '
+              f'{memory:+7.1%} KB/statement{flag}')
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--save', metavar='PATH', help='write the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change counted as a regression')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiplies the number of measured rounds')
+    args = parser.parse_args(argv)
+
+    # The corpus module logs every statement at DEBUG
+    logging.getLogger().setLevel(logging.WARNING)
+    results = bench(args.scale)
+
+    print(f'{"case":>14}  {"stmts":>5}  {"stmts/s":>10}  {"p50 us":>9}  '
+          f'{"p90 us":>9}  {"p99 us":>9}  {"KB/stmt":>8}')
+    for name, r in results.items():
+        print(f'{name:>14}  {r["statements"]:5d}  {r["statements_per_sec"]:10.0f}  '
+              f'{r["p50_us"]:9.1f}  {r["p90_us"]:9.1f}  {r["p99_us"]:9.1f}  '
+              f'{r["peak_kb_per_statement"]:8.1f}')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'python': platform.python_version(), 'cases': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline['cases'], args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
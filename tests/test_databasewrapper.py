@@ -1,7 +1,11 @@
+import asyncio
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock
+
+from django.core.exceptions import ImproperlyConfigured
 
 from djongo.base import DatabaseWrapper
+from djongo.pool import AsyncClientPool, ClientPool
 
 
 class TestDatabaseWrapper(unittest.TestCase):
@@ -38,6 +42,31 @@ class TestDatabaseWrapper(unittest.TestCase):
         assert params['port'] is port
         assert params['host'] is host
 
+    def test_client_options(self):
+        '''Check that non djongo OPTIONS are validated and passed to MongoClient'''
+        settings_dict = {
+            'NAME': 'db',
+            'OPTIONS': {
+                'SQL_CACHE_SIZE': 10,
+                'compressors': 'zlib',
+                'readPreference': 'secondaryPreferred',
+                'w': 'majority',
+                'retryWrites': True,
+            }
+        }
+
+        params = DatabaseWrapper(settings_dict).get_connection_params()
+
+        self.assertEqual(params['compressors'], 'zlib')
+        self.assertEqual(params['readPreference'], 'secondaryPreferred')
+        self.assertEqual(params['w'], 'majority')
+        self.assertIs(params['retryWrites'], True)
+        self.assertNotIn('SQL_CACHE_SIZE', params)
+
+        for options in ({'readPreference': 'nearest-ish'}, {'maxPoolSize': -1}, {'wTimeoutMs': 'x'}, {'bogus': 1}):
+            with self.assertRaises(ImproperlyConfigured):
+                DatabaseWrapper({'OPTIONS': options})
+
     @patch('djongo.base.MongoClient')
     def test_connection(self, mocked_mongoclient):
         settings_dict = MagicMock(dict)
@@ -47,5 +76,86 @@ class TestDatabaseWrapper(unittest.TestCase):
 
         mocked_mongoclient.assert_called_once()
 
+
+class TestClientPool(unittest.TestCase):
+    """Test cases for the process wide client pool"""
+
+    @patch('djongo.pool.Database.connect')
+    def test_shared_client(self, mocked_connect):
+        """Same settings share one client, other settings get their own"""
+        mocked_connect.side_effect = lambda **kwargs: MagicMock()
+        pool = ClientPool()
+
+        client = pool.get(host='localhost', port=27017, maxPoolSize=10)
+        self.assertIs(pool.get(port=27017, host='localhost', maxPoolSize=10), client)
+        self.assertIsNot(pool.get(host='localhost', port=27017, maxPoolSize=20), client)
+        self.assertEqual(mocked_connect.call_count, 2)
+        self.assertEqual(pool.info().clients, 2)
+
+        pool.close()
+        client.close.assert_called_once()
+        self.assertEqual(pool.info().clients, 0)
+
+    @patch('djongo.pool.Database.connect')
+    def test_warm_up(self, mocked_connect):
+        pool = ClientPool()
+        client = pool.get(warm_up=True, host='localhost')
+        client.admin.command.assert_called_once_with('ping')
+        mocked_connect.assert_called_once_with(event_listeners=[pool.metrics], host='localhost')
+
+    def test_metrics(self):
+        pool = ClientPool()
+        pool.metrics.connection_check_out_started(None)
+        pool.metrics.connection_checked_out(None)
+        pool.metrics.connection_check_out_started(None)
+        pool.metrics.connection_check_out_failed(None)
+
+        info = pool.info()
+        self.assertEqual(info.checkouts, 1)
+        self.assertEqual(info.failed_checkouts, 1)
+        self.assertGreaterEqual(info.max_wait_time, 0)
+        self.assertGreaterEqual(info.wait_time, info.max_wait_time)
+
+
+class TestAsyncClientPool(unittest.TestCase):
+    """Test cases for the per event loop client pool"""
+
+    @patch('djongo.pool.Database.connect_async')
+    def test_client_per_loop(self, mocked_connect):
+        """Coroutines of a loop share its client, other loops get their own"""
+        mocked_connect.side_effect = lambda **kwargs: MagicMock(close=AsyncMock())
+        pool = AsyncClientPool()
+
+        async def get():
+            client = pool.get(host='localhost', maxPoolSize=10)
+            self.assertIs(pool.get(maxPoolSize=10, host='localhost'), client)
+            return client
+
+        async def close():
+            await pool.close()
+
+        client = asyncio.run(get())
+        self.assertIsNot(asyncio.run(get()), client)
+        self.assertEqual(mocked_connect.call_count, 2)
+
+        with self.assertRaises(RuntimeError):
+            pool.get(host='localhost')
+
+        asyncio.run(close())
+        client.close.assert_not_called()
+
+    @patch('djongo.pool.Database.connect_async')
+    def test_async_cursor(self, mocked_connect):
+        wrapper = DatabaseWrapper({'NAME': 'db', 'HOST': 'localhost',
+                                   'OPTIONS': {'FAST_DECODE': True}})
+
+        async def cursor():
+            return wrapper.async_cursor()
+
+        cursor = asyncio.run(cursor())
+        self.assertEqual(cursor.options, {'FAST_DECODE': True})
+        self.assertEqual(mocked_connect.call_args[1]['host'], 'localhost')
+        mocked_connect.return_value.__getitem__.assert_called_once_with('db')
+
 if __name__ == '__main__':
     unittest.main()
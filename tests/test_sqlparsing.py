@@ -1,10 +1,32 @@
-from unittest import TestCase, mock
+from unittest import IsolatedAsyncioTestCase, TestCase, mock, skipUnless
 
+import os
+from collections import Counter, OrderedDict
 from logging import getLogger, DEBUG, StreamHandler
-from pymongo import MongoClient
+from bson import BSON
+from bson.codec_options import CodecOptions
+from pymongo import DeleteMany, InsertOne, MongoClient, UpdateMany
 from pymongo.cursor import Cursor
-
-from djongo.sql2mongo import Result
+from pymongo.errors import OperationFailure
+from pymongo.monitoring import CommandListener
+from pymongo.read_preferences import Nearest, ReadPreference
+from sqlparse import parse as sqlparse
+from sqlparse.sql import Identifier
+
+from djongo.cursor import AsyncCursor, Cursor
+from djongo.sql2mongo import AsyncResult, Result, SQLToken
+from djongo.mongo2sql import parser
+from djongo.mongo2sql.advisor import (
+    IndexAdvisor, QueryShape, Recommendation, covers, index_advisor, recommend,
+    unused_indexes
+)
+from djongo.mongo2sql.buffer import WriteBuffer
+from djongo.mongo2sql.cache import StatementCache
+from djongo.mongo2sql.errors import SQLDecodeError
+from djongo.mongo2sql.hashjoin import HashJoin, JoinPlanner, hash_join, join_strategy
+from djongo.mongo2sql.indexes import index_builds
+from djongo.mongo2sql.routing import ReadRouter, read_preference
+from djongo.mongo2sql.timing import timings
 
 sql = [
     'UPDATE "auth_user" SET "password" = %s, "last_login" = NULL, "is_superuser" = %s, "username" = %s, "first_name" = %s, "last_name" = %s, "email" = %s, "is_staff" = %s, "is_active" = %s, "date_joined" = %s WHERE "auth_user"."id" = %s',
@@ -162,28 +184,71 @@ class TestParse(TestCase):
 
         # 'SELECT (1) AS "a" FROM "django_session" WHERE "django_session"."session_key" = %(0)s LIMIT 1'
         self.sql = 'SELECT (1) AS "a" FROM "table1" WHERE "table1"."col2" = %s LIMIT 1'
-        find_args = {
-            'filter': {
-                'col2': {
-                    '$eq': 1
-                }
-            },
-            'limit': 1,
-            'projection': []
-        }
+        count_documents = conn.__getitem__().count_documents
+        count_documents.return_value = 1
         self.params = [1]
         ret = self._mock()
         self.assertEqual(ret, [(1,)])
-        find.assert_any_call(**find_args)
+        count_documents.assert_any_call({'col2': {'$eq': 1}}, limit=1)
+        find.assert_not_called()
         conn.reset_mock()
 
         #'SELECT COUNT(*) AS "__count" FROM "auth_user"'
         self.sql = 'SELECT COUNT(*) AS "__count" FROM "table"'
+        estimated_document_count = conn.__getitem__().estimated_document_count
+        estimated_document_count.return_value = 3
+        self.params = []
+        self.assertEqual(self._mock(), [(3,)])
+        find.assert_not_called()
+        conn.reset_mock()
 
-        self._mock()
-        find.assert_any_call()
+        self.sql = ('SELECT COUNT(*) AS "__count" FROM "table1" '
+                    'INNER JOIN "table2" ON ("table1"."col1" = "table2"."col2")')
+        aggregate = conn.__getitem__().aggregate
+        aggregate.return_value = [{'count': 7}]
+        self.assertEqual(self._mock(), [(7,)])
+        self.assertEqual(aggregate.call_args[0][0][-1], {'$count': 'count'})
+        conn.reset_mock()
+
+    def test_group_by(self):
+        conn = self.conn
+        aggregate = conn.__getitem__().aggregate
+        aggregate.return_value = [{'key0': 'a', 'agg0': 3, 'agg1': 2.0}]
+
+        self.sql = ('SELECT "table"."col1", COUNT("table"."col2") AS "n", AVG("table"."col3") AS "col3__avg" '
+                    'FROM "table" WHERE "table"."col4" = %s GROUP BY "table"."col1" '
+                    'HAVING COUNT("table"."col2") > %s ORDER BY "n" DESC')
+        self.params = [1, 2]
+        pipeline = [
+            {'$match': {'col4': {'$eq': 1}}},
+            {
+                '$group': {
+                    '_id': {'key0': '$col1'},
+                    'agg0': {'$sum': {'$cond': [{'$eq': [{'$ifNull': ['$col2', None]}, None]}, 0, 1]}},
+                    'agg1': {'$avg': '$col3'}
+                }
+            },
+            {'$project': {'_id': False, 'key0': '$_id.key0', 'agg0': '$agg0', 'agg1': '$agg1'}},
+            {'$match': {'agg0': {'$gt': 2}}},
+            {'$sort': {'agg0': -1}}
+        ]
+        self.assertEqual(self._mock(), [('a', 3, 2.0)])
+        aggregate.assert_any_call(pipeline)
+        conn.reset_mock()
+
+        self.sql = 'SELECT SUM("table"."col1") AS "col1__sum", COUNT(DISTINCT "table"."col2") AS "n" FROM "table"'
+        self.params = []
+        aggregate.return_value = []
+        self.assertEqual(self._mock(), [(None, 0)])
         conn.reset_mock()
 
+        # Functions are only compared against the aggregates of HAVING
+        for sql in ('SELECT "t"."a" FROM "t" WHERE LOWER("t"."name") = %s',
+                    'UPDATE "t" SET "a" = %s WHERE LOWER("t"."name") = %s',
+                    'DELETE FROM "t" WHERE LOWER("t"."name") = %s'):
+            with self.assertRaises(SQLDecodeError):
+                Result(None, conn, sql, [1, 'x'])
+
     def test_in(self):
         conn = self.conn
         find = self.find
@@ -275,29 +340,60 @@ class TestParse(TestCase):
         conn.reset_mock()
 
         self.sql = f'SELECT {t1c1}, {t1c2} FROM "table1" WHERE ({t1c1} IN (SELECT {t2c1} FROM "table2" U0 WHERE (U0."col2" IN (%s, %s))))'
-        find_args1 = {
-            'projection': ['col1'],
-            'filter': {
-                'col2': {
-                    '$in': [1, 2]
-                }
-            }
-        }
-
-        find_args2 = {
-            'projection': ['col1', 'col2'],
-            'filter': {
-                'col1': {
-                    '$in': [3,4,5]
-                }
+        lookup = {
+            '$lookup': {
+                'from': 'table2',
+                'let': {'value': '$col1'},
+                'pipeline': [
+                    {'$match': {'col2': {'$in': [1, 2]}}},
+                    {'$match': {'$expr': {'$eq': ['$col1', '$$value']}}},
+                    {'$limit': 1}
+                ],
+                'as': '__in0'
             }
         }
-        calls = [mock.call(**find_args1), mock.call(**find_args2)]
+        pipeline = [
+            lookup,
+            {'$match': {'__in0': {'$ne': []}}},
+            {'$project': {'col1': True, 'col2': True}}
+        ]
 
         self.params = [1, 2]
-        iter.return_value = [{'col1': 3},{'col1': 4},{'col1': 5}]
+        aggregate = conn.__getitem__().aggregate
+        aggregate.return_value = [{'col1': 3, 'col2': 1}]
+        self.assertEqual(self._mock(), [(3, 1)])
+        find.assert_not_called()
+        aggregate.assert_called_once_with(pipeline)
+        conn.reset_mock()
+
+        self.sql = f'SELECT {t1c1}, {t1c2} FROM "table1" WHERE ({t1c1} NOT IN (SELECT {t2c1} FROM "table2" U0 WHERE (U0."col2" IN (%s, %s))))'
+        pipeline[1] = {'$match': {'__in0': {'$eq': []}}}
+        self._mock()
+        aggregate.assert_called_once_with(pipeline)
+        conn.reset_mock()
+
+        self.sql = f'DELETE FROM "table1" WHERE ({t1c1} IN (SELECT {t2c1} FROM "table2" U0 WHERE (U0."col2" IN (%s, %s))))'
+        aggregate.return_value = (doc for doc in [{'_id': 1}, {'_id': 2}])
         self._mock()
-        self.assertEqual(find.call_args_list, calls)
+        aggregate.assert_called_once_with(
+            [lookup, {'$match': {'__in0': {'$ne': []}}}, {'$project': {'_id': True}}],
+            batchSize=mock.ANY
+        )
+        conn.__getitem__().delete_many.assert_called_once_with(
+            filter={'_id': {'$in': [1, 2]}})
+        conn.reset_mock()
+
+        # Every matched _id is read before the first chunk is written
+        self.sql = f'UPDATE "table1" SET "col2" = %s WHERE ({t1c1} IN (SELECT {t2c1} FROM "table2" U0 WHERE (U0."col2" IN (%s, %s))))'
+        self.params = [0, 1, 2]
+        read = []
+        aggregate.return_value = (read.append(_id) or {'_id': _id} for _id in (1, 2))
+        update_many = conn.__getitem__().update_many
+        update_many.side_effect = lambda **kwargs: self.assertEqual(read, [1, 2]) or mock.MagicMock(modified_count=1)
+        with mock.patch('djongo.mongo2sql.NESTED_IN_CHUNK_SIZE', 1):
+            self._mock()
+        self.assertEqual([call[1]['filter'] for call in update_many.call_args_list],
+                         [{'_id': {'$in': [1]}}, {'_id': {'$in': [2]}}])
         conn.reset_mock()
 
     def test_not(self):
@@ -563,4 +659,873 @@ class TestParse(TestCase):
         find.assert_any_call(**find_args)
         conn.reset_mock()
 
+    def test_offset(self):
+        conn = self.conn
+        find = self.find
+        self.iter.return_value = []
 
+        self.sql = ('SELECT "table1"."col1" FROM "table1" '
+                    'ORDER BY "table1"."col2" DESC, "table1"."col1" ASC LIMIT 50 OFFSET 10000')
+        self.params = []
+        self._mock()
+        find.assert_called_once_with(projection=['col1'], sort=[('col2', -1), ('col1', 1)],
+                                     skip=10000, limit=50)
+        conn.reset_mock()
+
+        self.sql = 'SELECT "table1"."col1" FROM "table1" OFFSET 10'
+        self._mock()
+        find.assert_called_once_with(projection=['col1'], skip=10)
+        conn.reset_mock()
+
+        aggregate = conn.__getitem__().aggregate
+        aggregate.return_value = []
+        self.sql = ('SELECT "table1"."col1" FROM "table1" '
+                    'INNER JOIN "table2" ON ("table1"."col2" = "table2"."col1") '
+                    'ORDER BY "table2"."col3" ASC LIMIT 50 OFFSET 100')
+        self._mock()
+        pipeline = aggregate.call_args[0][0]
+        self.assertEqual(pipeline[-4:], [
+            {'$sort': OrderedDict([('table2.col3', 1)])},
+            {'$skip': 100},
+            {'$limit': 50},
+            {'$project': {'col1': True}},
+        ])
+        conn.reset_mock()
+
+    def test_update(self):
+        conn = self.conn
+        update_many = conn.__getitem__().update_many
+        update_many.return_value.modified_count = 1
+        # Columns the WHERE proves non-null are updated in place
+        self.sql = ('UPDATE "page" SET "views" = ("page"."views" + %s), "score" = ("page"."score" * %s), '
+                    '"hits" = ("page"."hits" - %s), "title" = %s, "note" = NULL WHERE "page"."id" = %s '
+                    'AND "page"."views" >= %s AND "page"."score" > %s AND "page"."hits" < %s')
+        self.params = [1, 1.5, 2, 'a', 3, 0, 0, 10]
+        self._mock()
+        update_many.assert_called_once_with(filter={'$and': [
+            {'id': {'$eq': 3}}, {'views': {'$gte': 0}}, {'score': {'$gt': 0}}, {'hits': {'$lt': 10}}
+        ]}, update={
+            '$inc': {'views': 1, 'hits': -2},
+            '$mul': {'score': 1.5},
+            '$set': {'title': 'a', 'note': None},
+        })
+        conn.reset_mock()
+
+        # $inc fails on null, a possibly null column goes through a pipeline
+        self.sql = 'UPDATE "page" SET "views" = ("page"."views" + %s) WHERE "page"."id" = %s'
+        self.params = [1, 3]
+        self._mock()
+        update_many.assert_called_once_with(filter={'id': {'$eq': 3}}, update=[
+            {'$set': {'views': {'$add': ['$views', {'$literal': 1}]}}}
+        ])
+        conn.reset_mock()
+
+        # Older servers take every column to be non-null
+        list(Result(self.db, self.conn, self.sql, self.params, {'NULL_SAFE_UPDATES': False}))
+        update_many.assert_called_once_with(filter={'id': {'$eq': 3}}, update={'$inc': {'views': 1}})
+        conn.reset_mock()
+
+        # Other expressions read the old row in a pipeline
+        self.sql = ('UPDATE "page" SET "views" = ("page"."score" + "page"."views" * %s - %s), '
+                    '"title" = %s')
+        self.params = [2, 1, '$title']
+        self._mock()
+        update_many.assert_called_once_with(filter={}, update=[{'$set': {
+            'views': {'$subtract': [
+                {'$add': ['$score', {'$multiply': ['$views', {'$literal': 2}]}]},
+                {'$literal': 1}
+            ]},
+            'title': {'$literal': '$title'},
+        }}])
+        conn.reset_mock()
+
+    def test_joins(self):
+        conn = self.conn
+        aggregate = conn.__getitem__().aggregate
+        aggregate.return_value = []
+        self.sql = ('SELECT "django_admin_log"."action_time", "auth_user"."username", '
+                    '"django_content_type"."model" FROM "django_admin_log" '
+                    'INNER JOIN "auth_user" ON ("django_admin_log"."user_id" = "auth_user"."id") '
+                    'LEFT OUTER JOIN "django_content_type" '
+                    'ON ("django_admin_log"."content_type_id" = "django_content_type"."id") '
+                    'WHERE ("django_admin_log"."user_id" = %s AND "auth_user"."is_active" = %s) '
+                    'ORDER BY "django_admin_log"."action_time" DESC LIMIT 10')
+        self.params = [1, True]
+        self._mock()
+        aggregate.assert_called_once_with([
+            {'$match': {'user_id': {'$eq': 1}}},
+            {'$sort': OrderedDict([('action_time', -1)])},
+            {'$match': {'user_id': {'$ne': None, '$exists': True}}},
+            {'$lookup': {
+                'from': 'auth_user',
+                'let': {'value': '$user_id'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$id', '$$value']}}},
+                    {'$match': {'is_active': {'$eq': True}}},
+                    {'$project': {'is_active': True, 'username': True, '_id': False}}
+                ],
+                'as': 'auth_user'
+            }},
+            {'$unwind': '$auth_user'},
+            {'$limit': 10},
+            {'$lookup': {
+                'from': 'django_content_type',
+                'let': {'value': '$content_type_id'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$id', '$$value']}}},
+                    {'$project': {'model': True, '_id': False}}
+                ],
+                'as': 'django_content_type'
+            }},
+            {'$unwind': {'path': '$django_content_type', 'preserveNullAndEmptyArrays': True}},
+            {'$project': {'action_time': True, 'auth_user.username': True,
+                          'django_content_type.model': True}},
+        ])
+        conn.reset_mock()
+
+        # Outer joins that cannot drop or repeat rows are not counted
+        self.sql = ('SELECT COUNT(*) AS "__count" FROM "django_admin_log" '
+                    'LEFT OUTER JOIN "django_content_type" '
+                    'ON ("django_admin_log"."content_type_id" = "django_content_type"."id") '
+                    'WHERE "django_admin_log"."user_id" = %s')
+        self.params = [1]
+        aggregate.return_value = [{'count': 3}]
+        self.assertEqual(self._mock(), [(3,)])
+        aggregate.assert_called_once_with([{'$match': {'user_id': {'$eq': 1}}}, {'$count': 'count'}])
+        conn.reset_mock()
+
+        # A filter on the joined table keeps the page after the join
+        self.sql = ('SELECT "django_admin_log"."id" FROM "django_admin_log" '
+                    'LEFT OUTER JOIN "django_content_type" '
+                    'ON ("django_admin_log"."content_type_id" = "django_content_type"."id") '
+                    'WHERE "django_content_type"."model" = %s LIMIT 10')
+        self.params = ['user']
+        aggregate.return_value = []
+        self._mock()
+        pipeline = aggregate.call_args[0][0]
+        self.assertEqual(pipeline[-3:], [
+            {'$match': {'django_content_type.model': {'$eq': 'user'}}},
+            {'$limit': 10},
+            {'$project': {'id': True}},
+        ])
+        conn.reset_mock()
+
+    def test_fetchmany(self):
+        conn = self.conn
+        find = self.find
+        self.iter.return_value = [{'col1': i} for i in range(5)]
+        sql = 'SELECT "table1"."col1" FROM "table1"'
+
+        result = Result(self.db, conn, sql, [])
+        self.assertEqual(result.fetchmany(2), [(0,), (1,)])
+        self.assertEqual(result.fetchmany(2), [(2,), (3,)])
+        self.assertEqual(result.fetchmany(2), [(4,)])
+        self.assertEqual(result.fetchmany(2), [])
+        find.assert_called_once_with(projection=['col1'], batch_size=2)
+        conn.reset_mock()
+
+        result = Result(self.db, conn, sql, [], {'FETCH_BATCH_SIZE': 500})
+        self.assertEqual(len(list(result)), 5)
+        find.assert_called_once_with(projection=['col1'], batch_size=500)
+        conn.reset_mock()
+
+    def test_explain(self):
+        db = mock.MagicMock()
+        collection = db.__getitem__.return_value
+        collection.find.return_value.explain.return_value = {
+            'queryPlanner': {
+                'winningPlan': {
+                    'stage': 'FETCH',
+                    'inputStage': {'stage': 'IXSCAN', 'indexName': 'col1_1'}
+                }
+            },
+            'executionStats': {'nReturned': 2, 'totalKeysExamined': 2, 'totalDocsExamined': 2}
+        }
+        sql = 'SELECT "table1"."col1" FROM "table1" WHERE "table1"."col1" = %s'
+
+        explained = Result(self.db, db, sql, [1]).explain()
+        collection.find.assert_called_once_with(filter={'col1': {'$eq': 1}}, projection=['col1'])
+        self.assertEqual(explained['filter'], {'col1': {'$eq': 1}})
+        self.assertEqual(explained['winning_plan'], ['FETCH', 'IXSCAN'])
+        self.assertEqual(explained['indexes'], ['col1_1'])
+        self.assertEqual((explained['docs_examined'], explained['returned']), (2, 2))
+
+        rows = list(Result(self.db, db, 'EXPLAIN ' + sql, [1]))
+        self.assertTrue(all(len(row) == 1 for row in rows))
+        self.assertIn('"IXSCAN"', '\n'.join(row[0] for row in rows))
+        collection.find.return_value.__iter__.assert_not_called()
+
+        db.command.return_value = {
+            'stages': [
+                {'$cursor': {
+                    'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}},
+                    'executionStats': {'nReturned': 1, 'totalKeysExamined': 0, 'totalDocsExamined': 100}
+                }},
+                {'$group': {}}
+            ]
+        }
+        explained = Result(self.db, db, 'SELECT COUNT("table1"."col1") AS "n" FROM "table1"', []).explain()
+        self.assertEqual(explained['pipeline'][0]['$group']['_id'], None)
+        self.assertEqual(explained['winning_plan'], ['COLLSCAN'])
+        self.assertEqual((explained['docs_examined'], explained['returned']), (100, 1))
+
+        with self.assertRaises(NotImplementedError):
+            Result(self.db, db, 'EXPLAIN DELETE FROM "table1"', [])
+        collection.delete_many.assert_not_called()
+
+    def test_fast_decode(self):
+        db = mock.MagicMock()
+        collection = db.__getitem__.return_value
+        collection.codec_options = CodecOptions(document_class=OrderedDict)
+        collection.find_raw_batches.return_value = [
+            BSON.encode({'col2': 1, 'col1': 2}) + BSON.encode({'col1': 3}),
+            BSON.encode({'col2': 4, 'col1': 5}),
+        ]
+        sql = 'SELECT "table1"."col1", "table1"."col2" FROM "table1"'
+
+        result = Result(self.db, db, sql, [], {'FAST_DECODE': True})
+        self.assertEqual(result.fetchmany(2), [(2, 1), (3, None)])
+        self.assertEqual(list(result), [(5, 4)])
+        collection.find_raw_batches.assert_called_once_with(
+            projection={'col1': True, 'col2': True, '_id': False}, batch_size=2)
+        collection.find.assert_not_called()
+
+
+class TestInsert(TestCase):
+
+    def setUp(self):
+        self.collections = {}
+        self.db = mock.MagicMock()
+        self.db.__getitem__.side_effect = lambda name: self.collections.setdefault(name, mock.MagicMock())
+        self.schema = self.db['__schema__']
+        self.schema.find_one_and_update.return_value = {'auto': {'seq': 5, 'field_names': ['id']}}
+        self.table = self.db['t']
+
+    def test_multi_row(self):
+        result = Result(None, self.db, 'INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, NULL)', [1, 2, 3])
+        self.schema.find_one_and_update.assert_called_once()
+        self.assertEqual(self.schema.find_one_and_update.call_args[0][1], {'$inc': {'auto.seq': 2}})
+        self.table.insert_many.assert_called_once_with(
+            [{'id': 4, 'a': 1, 'b': 2}, {'id': 5, 'a': 3, 'b': None}], ordered=True)
+        self.assertEqual(result.inserted_ids, [4, 5])
+        self.assertEqual(result.last_row_id, 5)
+        self.assertEqual(result.count(), 2)
+
+    def test_many(self):
+        self.schema.find_one_and_update.side_effect = [
+            {'auto': {'seq': 2, 'field_names': ['id']}},
+            {'auto': {'seq': 3, 'field_names': ['id']}},
+        ]
+        result = Result(None, self.db, 'INSERT INTO "t" ("a") VALUES (%s)', [[1], [2], [3]],
+                        {'INSERT_BATCH_SIZE': 2, 'ORDERED_INSERTS': False}, many=True)
+        self.table.insert_many.assert_called_once_with([{'id': 1, 'a': 1}, {'id': 2, 'a': 2}], ordered=False)
+        self.table.insert_one.assert_called_once_with({'id': 3, 'a': 3})
+        self.assertEqual(result.inserted_ids, [1, 2, 3])
+
+        cursor = Cursor(None, self.db)
+        cursor.executemany('INSERT INTO "t" ("a") VALUES (%s)', [])
+        self.assertIsNone(cursor.lastrowid)
+        self.assertEqual(cursor.rowcount, 0)
+        self.assertEqual(self.schema.find_one_and_update.call_count, 2)
+
+    def test_id_block(self):
+        self.schema.find_one_and_update.return_value = {'auto': {'seq': 10, 'field_names': ['id']}}
+        options = {'AUTO_ID_BLOCK_SIZE': 10}
+        ids = [Result(None, self.db, 'INSERT INTO "t" ("a") VALUES (%s)', [a], options).last_row_id
+               for a in range(3)]
+        self.assertEqual(ids, [1, 2, 3])
+        self.schema.find_one_and_update.assert_called_once()
+        self.assertEqual(self.schema.find_one_and_update.call_args[0][1], {'$inc': {'auto.seq': 10}})
+
+
+class TestSQLToken(TestCase):
+
+    def _identifiers(self, token):
+        if isinstance(token, Identifier):
+            yield token
+        if token.is_group:
+            for tok in token.tokens:
+                yield from self._identifiers(tok)
+
+    def test_names(self):
+        """Names are resolved up front exactly as the sqlparse getters would"""
+        for statement in TestParser.statements:
+            for tok in self._identifiers(sqlparse(statement)[0]):
+                with self.subTest(identifier=str(tok)):
+                    sql_token = SQLToken(tok, {})
+                    self.assertEqual(sql_token.column, tok.get_real_name())
+                    self.assertEqual(sql_token.table, tok.get_parent_name() or tok.get_real_name())
+                    self.assertEqual(sql_token.alias, tok.get_alias())
+
+
+class TestIndexDDL(TestCase):
+
+    def created(self, collection):
+        return [[index.document for index in call[0][0]]
+                for call in collection.create_indexes.call_args_list]
+
+    def test_create(self):
+        db = mock.MagicMock()
+        collection = db.__getitem__.return_value
+        Result(None, db, 'CREATE INDEX "t_a_b" ON "t" ("a", "b" DESC)', None)
+        Result(None, db, 'CREATE UNIQUE INDEX "t_c" ON "t" ("c") '
+                         'WHERE ("c" > 400 AND "t"."d" = \'it\'\'s\' AND "e" AND "f" IN (1, 2.5))',
+               None)
+        self.assertEqual(self.created(collection), [
+            [{'key': OrderedDict([('a', 1), ('b', -1)]), 'name': 't_a_b'}],
+            [{'key': OrderedDict([('c', 1)]), 'name': 't_c', 'unique': True,
+              'partialFilterExpression': {'$and': [
+                  {'c': {'$gt': 400}}, {'d': {'$eq': "it's"}}, {'e': {'$eq': True}},
+                  {'f': {'$in': [1, 2.5]}}]}}],
+        ])
+
+    def test_batch(self):
+        db = mock.MagicMock()
+        db.name = 'db'
+        collection = db.__getitem__.return_value
+        collection.database.name = 'db'
+        collection.name = 't'
+        with index_builds.batch():
+            Result(None, db, 'CREATE INDEX "t_a" ON "t" ("a")', None)
+            Result(None, db, 'CREATE INDEX "t_b" ON "t" ("b")', None)
+            Result(None, db, 'CREATE INDEX "t_c" ON "t" ("c")', None)
+            Result(None, db, 'DROP INDEX "t_b"', None)
+            self.assertFalse(collection.create_indexes.called)
+
+        self.assertEqual(self.created(collection), [
+            [{'key': OrderedDict([('a', 1)]), 'name': 't_a'},
+             {'key': OrderedDict([('c', 1)]), 'name': 't_c'}],
+        ])
+        self.assertFalse(collection.drop_index.called)
+
+        with self.assertRaises(ValueError):
+            with index_builds.batch():
+                Result(None, db, 'CREATE INDEX "t_d" ON "t" ("d")', None)
+                raise ValueError
+        self.assertEqual(collection.create_indexes.call_count, 1)
+
+    def test_drop(self):
+        db = mock.MagicMock()
+        Result(None, db, 'DROP INDEX "t_a" ON "t"', None)
+        db.__getitem__.assert_called_with('t')
+        db['t'].drop_index.assert_called_once_with('t_a')
+
+        db = mock.MagicMock()
+        db.list_collection_names.return_value = ['t', 'u']
+        db.__getitem__.side_effect = lambda name: {'t': t, 'u': u}[name]
+        t, u = mock.MagicMock(), mock.MagicMock()
+        t.index_information.return_value = {'_id_': {}}
+        u.index_information.return_value = {'_id_': {}, 'u_a': {}}
+        Result(None, db, 'DROP INDEX "u_a"', None)
+        u.drop_index.assert_called_once_with('u_a')
+        self.assertFalse(t.drop_index.called)
+
+
+class TestStatementCache(TestCase):
+
+    def test_lru(self):
+        cache = StatementCache(maxsize=2)
+        statement = cache.parse('SELECT "t"."a" FROM "t"')
+        self.assertIs(cache.parse('SELECT "t"."a" FROM "t"'), statement)
+
+        cache.parse('SELECT "t"."b" FROM "t"')
+        cache.parse('SELECT "t"."c" FROM "t"')
+        info = cache.info()
+        self.assertEqual((info.hits, info.misses, info.evictions, info.currsize), (1, 3, 1, 2))
+
+        cache.resize(0)
+        cache.parse('SELECT "t"."a" FROM "t"')
+        self.assertEqual(cache.info().currsize, 0)
+
+
+class TestTimings(TestCase):
+
+    def test_stages(self):
+        db = mock.MagicMock()
+        db.__getitem__.return_value.find.return_value = [{'col1': 1}, {'col1': 2}]
+        recorded = []
+
+        def record(stage, seconds, collection, statement):
+            self.assertGreaterEqual(seconds, 0)
+            recorded.append((stage, collection, statement))
+
+        timings.subscribe(record)
+        try:
+            self.assertTrue(timings.enabled)
+            rows = list(Result(None, db, 'SELECT "table1"."col1" FROM "table1"', []))
+            self.assertEqual(rows, [(1,), (2,)])
+            Result(None, db, 'DELETE FROM "table1" WHERE "table1"."col1" = %s', [1])
+        finally:
+            timings.unsubscribe(record)
+
+        self.assertFalse(timings.enabled)
+        self.assertEqual(recorded, [
+            ('parse', 'table1', 'SELECT'),
+            ('translate', 'table1', 'SELECT'),
+            ('execute', 'table1', 'SELECT'),
+            ('decode', 'table1', 'SELECT'),
+            ('parse', 'table1', 'DELETE'),
+            ('translate', 'table1', 'DELETE'),
+            ('execute', 'table1', 'DELETE'),
+        ])
+
+        Result(None, db, 'SELECT "table1"."col1" FROM "table1"', [])
+        self.assertEqual(len(recorded), 7)
+
+
+class TestIndexAdvisor(TestCase):
+
+    def test_record(self):
+        db = mock.MagicMock()
+        db.name = 'db'
+        select = ('SELECT "t"."a" FROM "t" WHERE "t"."b" = %s AND "t"."c" > %s '
+                  'ORDER BY "t"."d" DESC')
+        join = ('SELECT "t"."a" FROM "t" INNER JOIN "u" ON ("t"."u_id" = "u"."id") '
+                'WHERE "t"."b" IN (%s, %s)')
+
+        with mock.patch.object(index_advisor, '_pending', Counter()) as pending:
+            Result(None, db, select, [1, 2], {'INDEX_ADVISOR': True})
+            Result(None, db, select, [3, 4], {'INDEX_ADVISOR': True})
+            Result(None, db, select, [3, 4])
+            Result(None, db, join, [1, 2], {'INDEX_ADVISOR': True})
+            Result(None, db, 'DELETE FROM "t" WHERE NOT ("t"."b" = %s)', [1],
+                   {'INDEX_ADVISOR': True})
+
+        self.assertEqual(pending, {
+            ('db', 't', (('b',), ('c',), (('d', -1),))): 2,
+            ('db', 't', (('b',), (), ())): 1,
+            ('db', 'u', (('id',), (), ())): 1,
+            ('db', 't', ((), ('b',), ())): 1,
+        })
+
+    def test_flush_error(self):
+        db = mock.MagicMock()
+        db.name = 'db'
+        db.__getitem__.return_value.bulk_write.side_effect = OperationFailure('not authorized')
+        advisor = IndexAdvisor(flush_every=1)
+        shape = QueryShape()
+        shape.equality.append('a')
+        with self.assertLogs('djongo.mongo2sql.advisor', 'WARNING'):
+            advisor.record(db, 't', shape)
+        db.__getitem__.return_value.bulk_write.assert_called_once()
+
+    def test_recommend(self):
+        shapes = {
+            ('t', (('b',), ('c',), (('d', -1),))): 5,
+            ('t', (('b',), (), ())): 3,
+            ('t', ((), ('c',), ())): 2,
+            ('t', (('_id',), (), ())): 9,
+            ('u', (('x',), (), ())): 1,
+        }
+        existing = {'u': [(('x', 1), ('y', 1))]}
+        self.assertEqual(recommend(shapes, existing), [
+            Recommendation('t', (('b', 1), ('d', -1), ('c', 1)), 8),
+            Recommendation('t', (('c', 1),), 2),
+        ])
+
+        shape = (('b',), ('c',), (('d', -1), ('e', 1)))
+        self.assertTrue(covers((('b', 1), ('d', 1), ('e', -1), ('c', 1)), shape))
+        self.assertFalse(covers((('b', 1), ('d', 1), ('e', 1), ('c', 1)), shape))
+        self.assertFalse(covers((('c', 1), ('b', 1), ('d', -1), ('e', 1)), shape))
+
+    def test_unused(self):
+        db = mock.MagicMock()
+        db.__getitem__.return_value.aggregate.return_value = [
+            {'name': '_id_', 'key': {'_id': 1}, 'accesses': {'ops': 0}},
+            {'name': 'b_1', 'key': {'b': 1}, 'accesses': {'ops': 0, 'since': 1}},
+            {'name': 'c_1', 'key': {'c': 1}, 'accesses': {'ops': 3, 'since': 1}},
+            {'name': 'd_1', 'key': {'d': 1}, 'accesses': {'ops': 0, 'since': 1},
+             'spec': {'unique': True}},
+        ]
+        unused = unused_indexes(db, ['t'])
+        self.assertEqual([(index.collection, index.name, index.keys) for index in unused],
+                         [('t', 'b_1', (('b', 1),))])
+
+
+class TestReadRouter(TestCase):
+
+    def test_route(self):
+        router = ReadRouter()
+        collection = mock.MagicMock()
+        collection.name = 'table'
+        self.assertIs(router.route(collection, 5), collection)
+
+        router.set_table('table', 'secondaryPreferred')
+        router.route(collection, 5)
+        collection.with_options.assert_called_with(read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+        with router.read_preference('nearest', max_staleness=120):
+            router.route(collection, 5)
+            collection.with_options.assert_called_with(read_preference=Nearest(max_staleness=120))
+
+        router.wrote()
+        router.route(collection, 5)
+        collection.with_options.assert_called_with(read_preference=ReadPreference.PRIMARY)
+
+        router.route(collection, 0)
+        collection.with_options.assert_called_with(read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+        with router.read_preference('nearest'):
+            router.clear()
+            router.route(collection, 0)
+            collection.with_options.assert_called_with(read_preference=ReadPreference.NEAREST)
+        self.assertIs(router.route(collection, 5), collection)
+
+        # The recent write of the thread outlives clear()
+        router.set_table('table', 'secondary')
+        router.route(collection, 5)
+        collection.with_options.assert_called_with(read_preference=ReadPreference.PRIMARY)
+
+    @skipUnless(os.environ.get('DJONGO_REPLICA_SET_URI'), 'needs a replica set')
+    def test_replica_set(self):
+        class Finds(CommandListener):
+            commands = []
+
+            def started(self, event):
+                if event.command_name == 'find':
+                    self.commands.append(event.command)
+
+            def succeeded(self, event):
+                pass
+
+            def failed(self, event):
+                pass
+
+        client = MongoClient(os.environ['DJONGO_REPLICA_SET_URI'], event_listeners=[Finds()])
+        db = client['djongo_test_routing']
+        db['table'].insert_one({'col1': 1})
+        sql = 'SELECT "table"."col1" FROM "table"'
+        options = {'READ_AFTER_WRITE_PIN': 0}
+        try:
+            with read_preference('secondaryPreferred'):
+                self.assertEqual(list(Result(client, db, sql, [], options)), [(1,)])
+            self.assertEqual(Finds.commands[-1]['$readPreference'], {'mode': 'secondaryPreferred'})
+
+            list(Result(client, db, sql, []))
+            self.assertNotIn('$readPreference', Finds.commands[-1])
+        finally:
+            client.drop_database(db)
+            client.close()
+
+
+class TestParser(TestCase):
+    """The fast parser must build the exact tree sqlparse builds"""
+
+    statements = sql + [
+        'SELECT "t"."a" FROM "t" WHERE "t"."a" IN (%(0)s, NULL) ORDER BY "t"."a" DESC LIMIT 21',
+        'SELECT COUNT(*) AS "__count" FROM "t" WHERE NOT ("t"."a" <= %(0)s OR "t"."b" = NULL)',
+        'INSERT INTO "t" ("a", "b") VALUES (%(0)s, %(1)s)',
+        'INSERT INTO "t" ("a") VALUES (%(0)s), (NULL), (%(1)s)',
+        'UPDATE "t" SET "a" = ("t"."a" + %(0)s), "b" = NULL WHERE "t"."id" = %(1)s',
+        '(NOT ("t"."a" = %(0)s) AND "t"."b" <= %(1)s)',
+        'SELECT "t"."a", COUNT(DISTINCT "t"."b") AS "n" FROM "t" GROUP BY "t"."a" '
+        'HAVING (MAX("t"."c") > %(0)s AND COUNT(*) >= %(1)s) ORDER BY "n" DESC',
+    ]
+
+    def _tree(self, token):
+        if token.is_group:
+            return type(token).__name__, token.value, [self._tree(tok) for tok in token.tokens]
+        return token.ttype, token.value, token.normalized
+
+    @skipUnless(parser.ENABLED, 'grouping rules mirror sqlparse 0.2')
+    def test_parity(self):
+        for statement in self.statements:
+            fast = parser.parse(statement)
+            if fast is None:
+                continue
+
+            with self.subTest(statement=statement):
+                self.assertEqual(self._tree(fast), self._tree(sqlparse(statement)[0]))
+
+    def test_fallback(self):
+        self.assertIsNone(parser.parse(sql[1]))
+        self.assertIsNone(parser.parse('SELECT "t"."a" FROM "t" -- comment'))
+        self.assertIsNone(parser.parse('SELECT "t"."a" FROM "t" WHERE ("t"."a" = %s'))
+
+
+def collection_of(docs):
+    """
+    A mocked collection whose find() keeps the documents matching the
+    `$in` filter of a hash join, and returns them all otherwise.
+    """
+    collection = mock.MagicMock()
+
+    def find(filter_=None, projection=None, **kwargs):
+        if filter_ is None:
+            return [dict(doc) for doc in docs]
+        (field, cond), = filter_.items()
+        return [doc for doc in docs if doc.get(field) in cond['$in']]
+
+    collection.find.side_effect = find
+    return collection
+
+
+class TestHashJoin(TestCase):
+
+    def test_hash_join(self):
+        rows = collection_of([{'id': 1, 'name': 'a'}, {'id': 1, 'name': 'b'},
+                              {'id': 2, 'name': 'c'}])
+        docs = [{'fk': 2}, {'fk': 1}, {'fk': 3}, {'fk': None}]
+        inner = HashJoin(rows, 'fk', 'id', 'rows', outer=False)
+        self.assertEqual(list(hash_join([dict(doc) for doc in docs], [inner], batch_size=2)), [
+            {'fk': 2, 'rows': {'id': 2, 'name': 'c'}},
+            {'fk': 1, 'rows': {'id': 1, 'name': 'a'}},
+            {'fk': 1, 'rows': {'id': 1, 'name': 'b'}},
+        ])
+        # One $in query per batch, none for a batch without keys
+        self.assertEqual([each[0][0] for each in rows.find.call_args_list], [
+            {'id': {'$in': [2, 1]}}, {'id': {'$in': [3]}}])
+
+        outer = inner._replace(outer=True)
+        self.assertEqual(list(hash_join([dict(doc) for doc in docs], [outer]))[3:],
+                         [{'fk': 3}, {'fk': None}])
+
+    def test_select(self):
+        db = mock.MagicMock()
+        collections = {
+            'log': collection_of([{'id': 1, 'user_id': 1, 'ct_id': 5},
+                                  {'id': 2, 'user_id': 9, 'ct_id': 5},
+                                  {'id': 3, 'user_id': 2, 'ct_id': 6}]),
+            'user': collection_of([{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}]),
+            'ct': collection_of([{'id': 5, 'model': 'm'}]),
+        }
+        db.__getitem__.side_effect = collections.__getitem__
+        sql = ('SELECT "log"."id", "user"."name", "ct"."model" FROM "log" '
+               'INNER JOIN "user" ON ("log"."user_id" = "user"."id") '
+               'LEFT OUTER JOIN "ct" ON ("log"."ct_id" = "ct"."id") '
+               'WHERE "log"."id" > %s ORDER BY "log"."id" ASC LIMIT 5')
+        options = {'JOIN_STRATEGY': 'hash'}
+        self.assertEqual(list(Result(None, db, sql, [0], options)),
+                         [(1, 'a', 'm'), (3, 'b', None)])
+        collections['log'].find.assert_called_once_with(
+            batch_size=1000, filter={'id': {'$gt': 0}},
+            projection={'ct_id': True, 'id': True, 'user_id': True, '_id': False},
+            sort=[('id', 1)])
+        collections['user'].find.assert_called_once_with(
+            {'id': {'$in': [1, 9, 2]}}, {'id': True, 'name': True, '_id': False})
+        collections['log'].aggregate.assert_not_called()
+
+        # Counts stay on the server
+        count = 'SELECT COUNT(*) AS "__count" FROM "log" INNER JOIN "user" ON ("log"."user_id" = "user"."id")'
+        collections['log'].aggregate.return_value = [{'count': 2}]
+        self.assertEqual(list(Result(None, db, count, [], options)), [(2,)])
+        self.assertEqual(collections['log'].aggregate.call_args[0][0][-1], {'$count': 'count'})
+        self.assertEqual(collections['log'].find.call_count, 1)
+        collections['log'].aggregate.reset_mock()
+
+        # Filters on joined tables that cannot run inside the join keep $lookup
+        with join_strategy('hash'):
+            sql = ('SELECT "log"."id" FROM "log" LEFT OUTER JOIN "ct" ON ("log"."ct_id" = "ct"."id") '
+                   'WHERE "ct"."model" = %s')
+            collections['log'].aggregate.return_value = []
+            list(Result(None, db, sql, ['m']))
+            collections['log'].aggregate.assert_called_once()
+
+    def test_planner(self):
+        planner = JoinPlanner()
+        collection = mock.MagicMock()
+        collection.estimated_document_count.return_value = 5000
+        collection.index_information.return_value = {'_id_': {'key': [('_id', 1)]}}
+        self.assertTrue(planner.hash_join_pays([(collection, 'fk')]))
+
+        collection.estimated_document_count.return_value = 10
+        self.assertTrue(planner.hash_join_pays([(collection, 'fk')]))
+        planner.clear()
+        self.assertFalse(planner.hash_join_pays([(collection, 'fk')]))
+
+        collection.estimated_document_count.return_value = 5000
+        collection.index_information.return_value = {'fk_1': {'key': [('fk', 1), ('a', 1)]}}
+        planner.clear()
+        self.assertFalse(planner.hash_join_pays([(collection, 'fk')]))
+
+        self.assertEqual(planner.strategy('lookup'), 'lookup')
+        with planner.join_strategy('auto'):
+            self.assertEqual(planner.strategy('lookup'), 'auto')
+            planner.clear()
+            self.assertEqual(planner.strategy('lookup'), 'auto')
+        with self.assertRaises(ValueError):
+            planner.strategy('nested')
+
+
+class TestWriteBuffer(TestCase):
+
+    def setUp(self):
+        self.collections = {}
+        self.db = mock.MagicMock()
+        self.db.__getitem__.side_effect = lambda name: self.collections.setdefault(name, mock.MagicMock())
+        self.db['__schema__'].find_one_and_update.return_value = {'auto': {'seq': 5, 'field_names': ['id']}}
+        self.buffer = WriteBuffer(mock.MagicMock())
+        self.buffer.begin()
+
+    def execute(self, sql, params):
+        return Result(None, self.db, sql, params, write_buffer=self.buffer)
+
+    def test_flush(self):
+        self.execute('INSERT INTO "u" ("a") VALUES (%s)', [3])
+        result = self.execute('INSERT INTO "t" ("a") VALUES (%s), (%s)', [1, 2])
+        self.assertEqual(result.last_row_id, 5)
+        table = self.db['t']
+        table.insert_many.assert_not_called()
+        self.assertTrue(self.buffer.pending)
+
+        # The update joins the queued writes to its collection
+        table.bulk_write.return_value.modified_count = 2
+        result = self.execute('UPDATE "t" SET "a" = %s', [0])
+        self.assertEqual(result.count(), 2)
+        requests = self.db['u'].bulk_write.call_args[0][0]
+        self.assertEqual(requests, [InsertOne({'id': 5, 'a': 3, '_id': requests[0]._doc['_id']})])
+        requests = table.bulk_write.call_args[0][0]
+        self.assertEqual([type(each) for each in requests], [InsertOne, InsertOne, UpdateMany])
+        self.assertEqual(requests[2], UpdateMany({}, {'$set': {'a': 0}}))
+        self.assertFalse(self.buffer.pending)
+
+        self.execute('INSERT INTO "t" ("a") VALUES (%s)', [4])
+        table.find.return_value = []
+        list(self.execute('SELECT "t"."a" FROM "t"', []))
+        self.assertEqual(table.bulk_write.call_count, 2)
+
+        self.buffer.commit()
+        self.buffer.end()
+        self.execute('DELETE FROM "t"', [])
+        table.delete_many.assert_called_once_with(filter={})
+
+    def test_rollback(self):
+        self.execute('INSERT INTO "t" ("a") VALUES (%s)', [1])
+        self.assertTrue(self.buffer.rollback())
+        self.buffer.end()
+        self.db['t'].bulk_write.assert_not_called()
+
+        self.buffer.begin()
+        self.execute('DELETE FROM "t"', [])
+        self.db['t'].bulk_write.assert_called_once_with([DeleteMany({})], ordered=True, session=None)
+        self.assertFalse(self.buffer.rollback())
+
+
+class AsyncDocs:
+    """
+    An in-process stand-in for the cursors of AsyncMongoClient.
+    """
+
+    def __init__(self, docs):
+        self._docs = iter([dict(doc) for doc in docs])
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._docs)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self):
+        return list(self._docs)
+
+    async def distinct(self, key):
+        return list(dict.fromkeys(doc[key] for doc in self._docs))
+
+    async def close(self):
+        self.closed = True
+
+
+class TestAsyncResult(IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.collections = {}
+        self.db = mock.MagicMock()
+        self.db.__getitem__.side_effect = lambda name: self.collections.setdefault(name, mock.MagicMock())
+        self.docs = [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}, {'a': 3, 'b': 'x'}]
+        self.table = self.db['t']
+        self.table.find.side_effect = lambda **kwargs: AsyncDocs(self.docs)
+        self.table.aggregate = mock.AsyncMock(side_effect=lambda pipeline, **kwargs: AsyncDocs(self.docs))
+        self.table.count_documents = mock.AsyncMock(return_value=2)
+        for method in ('insert_one', 'insert_many', 'update_many', 'delete_many'):
+            setattr(self.table, method, mock.AsyncMock(return_value=mock.MagicMock()))
+        self.schema = self.db['__schema__']
+        self.schema.find_one_and_update = mock.AsyncMock(
+            return_value={'auto': {'seq': 5, 'field_names': ['id']}})
+        self.cursor = AsyncCursor(None, self.db)
+
+    async def test_select(self):
+        await self.cursor.execute('SELECT "t"."a", "t"."b" FROM "t" WHERE "t"."a" > %s', [0])
+        self.table.find.assert_not_called()
+        self.assertEqual(await self.cursor.fetchone(), (1, 'x'))
+        self.assertEqual([row async for row in self.cursor], [(2, 'y'), (3, 'x')])
+        self.assertEqual(await self.cursor.fetchone(), [])
+        self.table.find.assert_called_once_with(filter={'a': {'$gt': 0}},
+                                                projection=['a', 'b'])
+        self.assertEqual(self.cursor.rowcount, -1)
+
+        await self.cursor.execute('SELECT COUNT(*) AS "__count" FROM "t" WHERE "t"."a" > %s', [1])
+        self.assertEqual(await self.cursor.fetchall(), [(2,)])
+        self.table.count_documents.assert_awaited_once_with({'a': {'$gt': 1}})
+
+        await self.cursor.execute('SELECT DISTINCT "t"."b" FROM "t"')
+        self.assertEqual(await self.cursor.fetchmany(5), [('x',), ('y',)])
+
+        await self.cursor.execute('SELECT "t"."b", COUNT("t"."a") AS "n" FROM "t" GROUP BY "t"."b"')
+        self.table.aggregate.side_effect = lambda pipeline, **kwargs: AsyncDocs(
+            [{'key0': 'x', 'agg0': 2}, {'key0': 'y', 'agg0': 1}])
+        self.assertEqual(await self.cursor.fetchall(), [('x', 2), ('y', 1)])
+        self.table.aggregate.assert_awaited_once()
+        await self.cursor.close()
+        self.assertTrue(self.cursor.result._query._cursor.closed)
+
+    async def test_write(self):
+        await self.cursor.executemany('INSERT INTO "t" ("a") VALUES (%s)', [])
+        self.assertIsNone(self.cursor.lastrowid)
+        self.schema.find_one_and_update.assert_not_awaited()
+
+        await self.cursor.execute('INSERT INTO "t" ("a") VALUES (%s), (%s)', [1, 2])
+        self.table.insert_many.assert_awaited_once_with(
+            [{'id': 4, 'a': 1}, {'id': 5, 'a': 2}], ordered=True)
+        self.assertEqual(self.cursor.lastrowid, 5)
+        self.assertEqual(self.cursor.rowcount, 2)
+
+        self.table.update_many.return_value.modified_count = 3
+        await self.cursor.execute('UPDATE "t" SET "a" = %s WHERE "t"."b" = %s', [0, 'x'])
+        self.table.update_many.assert_awaited_once_with(
+            filter={'b': {'$eq': 'x'}}, update={'$set': {'a': 0}})
+        self.assertEqual(self.cursor.rowcount, 3)
+
+        self.table.delete_many.return_value.deleted_count = 1
+        await self.cursor.execute('DELETE FROM "t" WHERE "t"."a" IN (%s)', [2])
+        self.table.delete_many.assert_awaited_once()
+        self.assertEqual(self.cursor.rowcount, 1)
+
+        # Query shapes are saved through the blocking handle, if any
+        advisor_db = mock.MagicMock()
+        advisor_db.name = 'db'
+        delete = 'DELETE FROM "t" WHERE "t"."a" = %s'
+        with mock.patch.object(index_advisor, '_pending', Counter()) as pending, \
+                mock.patch.object(index_advisor, '_databases', {}) as databases, \
+                mock.patch.object(index_advisor, '_recorded', 0):
+            AsyncResult(None, self.db, delete, [1], {'INDEX_ADVISOR': True}, advisor_db=advisor_db)
+            AsyncResult(None, self.db, delete, [1], {'INDEX_ADVISOR': True})
+        self.assertEqual(sum(pending.values()), 1)
+        self.assertIs(databases['db'], advisor_db)
+
+        with self.assertRaises(NotImplementedError):
+            AsyncResult(None, self.db, 'CREATE TABLE "u" ("id" int)', [])
+        with self.assertRaises(NotImplementedError):
+            AsyncResult(None, self.db, 'UPDATE "t" SET "a" = %s', [[1], [2]], many=True)
+
+    @skipUnless(os.environ.get('DJONGO_MONGODB_URI'), 'needs a mongod')
+    async def test_mongod(self):
+        from pymongo import AsyncMongoClient
+
+        client = AsyncMongoClient(os.environ['DJONGO_MONGODB_URI'])
+        db = client['djongo_test_async']
+        cursor = AsyncCursor(client, db)
+        try:
+            await cursor.executemany('INSERT INTO "t" ("a") VALUES (%s)', [])
+            self.assertIsNone(cursor.lastrowid)
+            await cursor.executemany('INSERT INTO "t" ("a") VALUES (%s)', [[1], [2], [3]])
+            await cursor.execute('UPDATE "t" SET "a" = %s WHERE "t"."a" = %s', [4, 3])
+            await cursor.execute('SELECT "t"."a" FROM "t" ORDER BY "t"."a" DESC')
+            self.assertEqual([row async for row in cursor], [(4,), (2,), (1,)])
+            self.assertEqual(await cursor.acount(), 3)
+        finally:
+            await client.drop_database(db)
+            await client.close()